@@ -0,0 +1,3 @@
+''' Benchmarks of the handler. They replay whole executions of the processes
+in ``xml/`` against in-memory versions of mongo, redis and rabbit, run them
+with ``python -m benchmarks`` '''
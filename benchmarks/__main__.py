@@ -0,0 +1,104 @@
+import argparse
+import logging
+import simplejson as json
+import sys
+
+from benchmarks.replay import make_config, run
+
+COLUMNS = (
+    ('finished', '{:>8}'),
+    ('steps', '{:>7}'),
+    ('errors', '{:>7}'),
+    ('steps_per_second', '{:>9.1f}'),
+    ('p50_ms', '{:>8.2f}'),
+    ('p99_ms', '{:>8.2f}'),
+    ('mongo_per_step', '{:>7.2f}'),
+    ('redis_per_step', '{:>7.2f}'),
+    ('rabbit_per_step', '{:>7.2f}'),
+)
+HEADER = '{:<40} {:>8} {:>7} {:>7} {:>9} {:>8} {:>8} {:>7} {:>7} ' \
+    '{:>7}'.format(
+        'process', 'finished', 'steps', 'errors', 'steps/s', 'p50 ms',
+        'p99 ms', 'mongo', 'redis', 'rabbit',
+    )
+
+
+def format_row(name, summary):
+    cells = []
+
+    for key, template in COLUMNS:
+        if summary[key] is None:
+            cells.append(' ' * len(template.format(0)))
+        else:
+            cells.append(template.format(summary[key]))
+
+    return '{:<40} '.format(name) + ' '.join(cells)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Replay executions of processes through the handler',
+    )
+
+    parser.add_argument(
+        'processes', metavar='PROCESS', nargs='*',
+        help='process files to replay, all of the ones in the xml path by '
+             'default',
+    )
+    parser.add_argument(
+        '-n', '--executions', type=int, default=10,
+        help='executions to replay of each process',
+    )
+    parser.add_argument(
+        '--seed', type=int, default=0,
+        help='seed for the values filled in forms',
+    )
+    parser.add_argument(
+        '--reject-rate', type=float, default=0,
+        help='probability of rejecting a validation, rejections invalidate '
+             'the nodes the validation depends on',
+    )
+    parser.add_argument(
+        '--xml-path', help='directory of the process files, like the ones '
+                           'made by python -m benchmarks.generator',
+    )
+    parser.add_argument(
+        '--json', metavar='FILE',
+        help='also write the report as json to this file, - for stdout',
+    )
+
+    args = parser.parse_args()
+
+    # commands that fail are counted in the report
+    logging.basicConfig(level=logging.CRITICAL)
+
+    report = run(
+        make_config(args.xml_path),
+        args.processes,
+        args.executions,
+        args.seed,
+        args.reject_rate,
+    )
+
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+        return
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    print(HEADER)
+
+    for name, summary in sorted(report['processes'].items()):
+        print(format_row(name, summary))
+
+    print(format_row('total', report['total']))
+
+    for name, reason in sorted(report['skipped'].items()):
+        print('skipped {}: {}'.format(name, reason))
+
+
+if __name__ == '__main__':
+    main()
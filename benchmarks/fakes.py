@@ -0,0 +1,70 @@
+''' In-memory stand-ins for the services the handler talks to '''
+from collections import deque
+from requests.adapters import BaseAdapter
+from requests.models import Response
+import fakeredis
+import mongomock
+import redis
+
+from cacahuate.metrics import CountingConnection
+
+
+class FakeChannel:
+    ''' captures what the handler publishes. Messages for the process queues
+    are kept in order so they can be handled later, the rest are counted '''
+
+    def __init__(self, config):
+        self.config = config
+        self.messages = deque()
+        self.notifications = 0
+
+    def queue_declare(self, queue, durable=False, arguments=None):
+        pass
+
+    def exchange_declare(self, exchange, exchange_type='direct'):
+        pass
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        if exchange:
+            self.notifications += 1
+        else:
+            self.messages.append(body)
+
+    def basic_ack(self, delivery_tag):
+        pass
+
+
+class CountingFakeConnection(CountingConnection, fakeredis.FakeConnection):
+    ''' counts the requests sent to the fake server like the real connection
+    does '''
+
+
+def make_redis_pool():
+    ''' a connection pool to a fresh in-memory redis '''
+    return redis.ConnectionPool(
+        connection_class=CountingFakeConnection,
+        server=fakeredis.FakeServer(),
+    )
+
+
+def make_mongo(config):
+    ''' a fresh in-memory mongo database '''
+    return mongomock.MongoClient()[config['MONGO_DBNAME']]
+
+
+class LocalAdapter(BaseAdapter):
+    ''' answers the http calls of request nodes without leaving the process
+    '''
+
+    def send(self, request, **kwargs):
+        response = Response()
+        response.status_code = 200
+        response._content = b'{"data": "ok"}'
+        response.encoding = 'utf-8'
+        response.request = request
+        response.url = request.url
+
+        return response
+
+    def close(self):
+        pass
@@ -0,0 +1,248 @@
+''' Generates synthetic processes of any size, to see how the handler scales
+with the number of nodes. The output passes ``xml_validate`` '''
+from random import Random
+from xml.dom.minidom import Document
+import argparse
+import os
+
+VERSION = '2019-01-01'
+
+
+class ProcessGenerator:
+    ''' builds a process with about the given number of nodes. Conditionals
+    are nested up to depth levels, dependency_density is the probability of
+    each visible input being a dependency of a later input or validation '''
+
+    def __init__(self, nodes=20, depth=1, forms=1, inputs=2,
+                 dependency_density=.2, validations=.2, conditionals=.2,
+                 seed=0):
+        self.nodes = nodes
+        self.depth = depth
+        self.forms = forms
+        self.inputs = inputs
+        self.dependency_density = dependency_density
+        self.validations = validations
+        self.conditionals = conditionals
+        self.random = Random(seed)
+
+        self.doc = Document()
+        self.count = 0
+
+    def generate(self, name):
+        ''' the process document as a string '''
+        root = self.doc.createElement('process-spec')
+        self.doc.appendChild(root)
+
+        info = self.element(root, 'process-info')
+        self.text(info, 'author', 'cacahuate')
+        self.text(info, 'date', VERSION)
+        self.text(info, 'name', name)
+        self.text(info, 'public', 'false')
+        self.text(info, 'description', 'Synthetic process of {} nodes'.format(
+            self.nodes,
+        ))
+
+        process = self.element(root, 'process')
+
+        # the forms visible at this point, as (form id, input name)
+        scope = []
+        self.action(process, scope, first=True)
+        self.block(process, scope, self.nodes - 1, 0)
+
+        return self.doc.toprettyxml(indent='  ', encoding='UTF-8').decode()
+
+    def element(self, parent, tag, **attrs):
+        element = self.doc.createElement(tag)
+
+        for key, value in attrs.items():
+            element.setAttribute(key.replace('_', '-'), str(value))
+
+        parent.appendChild(element)
+
+        return element
+
+    def text(self, parent, tag, value, **attrs):
+        element = self.element(parent, tag, **attrs)
+        element.appendChild(self.doc.createTextNode(value))
+
+        return element
+
+    def next_id(self, prefix):
+        self.count += 1
+
+        return '{}{}'.format(prefix, self.count)
+
+    def block(self, parent, scope, budget, level, grow=True):
+        ''' adds nodes to parent until budget is spent. If grow is False the
+        forms added are not used by later nodes '''
+        scope = list(scope)
+
+        while budget > 0:
+            roll = self.random.random()
+
+            if level < self.depth and budget >= 6 and scope and \
+                    roll < self.conditionals:
+                budget -= self.conditional(
+                    parent, scope, budget, level, grow,
+                )
+            elif scope and roll < self.conditionals + self.validations:
+                self.validation(parent, scope)
+                budget -= 1
+            else:
+                self.action(parent, scope if grow else list(scope))
+                budget -= 1
+
+    def conditional(self, parent, scope, budget, level, grow=True):
+        ''' adds an if/elif/else group, returns the nodes used. Each branch
+        gets at least one node '''
+        inner = self.random.randint(6, max(6, budget // 2))
+        # if, elif and else count as nodes too
+        per_branch = (inner - 3) // 3
+        extra = (inner - 3) % 3
+
+        form_id, input_name = self.random.choice(scope)
+        variable = '{}.{}'.format(form_id, input_name)
+
+        for i, tag in enumerate(('if', 'elif', 'else')):
+            element = self.element(parent, tag, id=self.next_id(tag))
+
+            if tag == 'if':
+                self.text(element, 'condition', '{} == "yes"'.format(variable))
+            elif tag == 'elif':
+                self.text(element, 'condition', '{} == "no"'.format(variable))
+
+            # the forms of a branch are not visible after the group.
+            # xml_validate checks the nodes of elif and else blocks all at
+            # once, so inside them only the forms from before can be used
+            block = self.element(element, 'block')
+            self.block(
+                block, scope, per_branch + (1 if i < extra else 0), level + 1,
+                grow and tag == 'if',
+            )
+
+        return inner
+
+    def dependencies(self, parent, scope):
+        deps = [
+            ref for ref in scope
+            if self.random.random() < self.dependency_density
+        ]
+
+        if not deps:
+            return []
+
+        element = self.element(parent, 'dependencies')
+
+        for form_id, input_name in deps:
+            self.text(element, 'dep', '{}.{}'.format(form_id, input_name))
+
+        return deps
+
+    def user_attached(self, parent, tag, first):
+        node = self.element(parent, tag, id=self.next_id(tag))
+
+        info = self.element(node, 'node-info')
+        self.text(info, 'name', 'Node {}'.format(self.count))
+        self.text(info, 'description', 'Synthetic {}'.format(tag))
+
+        if first:
+            self.element(node, 'auth-filter', backend='anyone')
+        else:
+            auth = self.element(node, 'auth-filter', backend='backref')
+            self.text(auth, 'param', 'user#action1', name='identifier',
+                      type='ref')
+
+        return node
+
+    def action(self, parent, scope, first=False):
+        node = self.user_attached(parent, 'action', first)
+        form_array = self.element(node, 'form-array')
+
+        new_refs = []
+
+        for _ in range(self.forms):
+            form_id = self.next_id('form')
+            form = self.element(form_array, 'form', id=form_id)
+
+            for i in range(self.inputs):
+                input_name = 'input{}'.format(i)
+                input = self.element(
+                    form, 'input', type='text', name=input_name,
+                    label=input_name,
+                )
+                self.dependencies(input, scope)
+                new_refs.append((form_id, input_name))
+
+        scope += new_refs
+
+    def validation(self, parent, scope):
+        node = self.user_attached(parent, 'validation', False)
+
+        if not self.dependencies(node, scope):
+            element = self.element(node, 'dependencies')
+            form_id, input_name = self.random.choice(scope)
+            self.text(element, 'dep', '{}.{}'.format(form_id, input_name))
+
+
+def generate(name='synthetic', **kwargs):
+    ''' a process document named name, see ProcessGenerator for the options
+    '''
+    return ProcessGenerator(**kwargs).generate(name)
+
+
+def write(path, name='synthetic', **kwargs):
+    ''' writes the process to the given directory and returns the file's
+    path '''
+    filename = os.path.join(path, '{}.{}.xml'.format(name, VERSION))
+
+    with open(filename, 'w') as f:
+        f.write(generate(name, **kwargs))
+
+    return filename
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generate synthetic processes for the benchmarks',
+    )
+
+    parser.add_argument(
+        '-n', '--nodes', type=int, nargs='+', default=[20],
+        help='number of nodes, one process is generated for each number',
+    )
+    parser.add_argument(
+        '--depth', type=int, default=1,
+        help='how deep if/elif/else groups are nested',
+    )
+    parser.add_argument(
+        '--forms', type=int, default=1, help='forms of each action',
+    )
+    parser.add_argument(
+        '--inputs', type=int, default=2, help='inputs of each form',
+    )
+    parser.add_argument(
+        '--dependency-density', type=float, default=.2,
+        help='probability of each previous input being a dependency',
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '-o', '--output', default='.', help='directory to write to',
+    )
+
+    args = parser.parse_args()
+
+    for nodes in args.nodes:
+        print(write(
+            args.output,
+            'synthetic_{}'.format(nodes),
+            nodes=nodes,
+            depth=args.depth,
+            forms=args.forms,
+            inputs=args.inputs,
+            dependency_density=args.dependency_density,
+            seed=args.seed,
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+''' Hierarchy providers for the benchmarks, every node is assigned to the same
+user so executions never stop for lack of candidates '''
+from cacahuate.auth.base import BaseHierarchyProvider
+
+BENCH_USER = 'bench'
+
+
+class BenchHierarchyProvider(BaseHierarchyProvider):
+
+    def validate_user(self, user, **params):
+        pass
+
+    def find_users(self, **params):
+        return [
+            (BENCH_USER, {
+                'identifier': BENCH_USER,
+                'email': 'bench@example.com',
+                'fullname': 'Bench',
+            }),
+        ]
+
+
+# the names of the backends used by the processes in xml/
+AnyoneHierarchyProvider = BenchHierarchyProvider
+BackrefHierarchyProvider = BenchHierarchyProvider
+HardcodedHierarchyProvider = BenchHierarchyProvider
+NoparamHierarchyProvider = BenchHierarchyProvider
@@ -0,0 +1,349 @@
+''' Replays complete executions of processes through the handler and measures
+how long each step takes and how many requests it sends to each service '''
+from itacate import Config
+from random import Random
+import math
+import os
+import simplejson as json
+import time
+
+from coralillo import Engine
+from cacahuate.handler import Handler
+from cacahuate.metrics import COMMAND_ERRORS, RABBIT_OPERATIONS
+from cacahuate.metrics import REDIS_ROUND_TRIPS
+from cacahuate.models import Execution, Pointer, User, bind_models
+from cacahuate.node import Action, Validation, make_node
+from cacahuate.sessions import get_session
+from cacahuate.utils import stamp_message
+from cacahuate.xml import Xml
+
+from benchmarks.fakes import FakeChannel, LocalAdapter, make_mongo
+from benchmarks.fakes import make_redis_pool
+from benchmarks.hierarchy import BENCH_USER
+
+# executions stuck in a cycle are abandoned after this many steps
+MAX_STEPS = 1000
+
+
+def make_config(xml_path=None):
+    config = Config(os.path.dirname(os.path.realpath(__file__)))
+    config.from_object('cacahuate.settings')
+
+    config['CUSTOM_HIERARCHY_PROVIDERS'] = {
+        name: 'benchmarks.hierarchy'
+        for name in ('anyone', 'backref', 'hardcoded', 'noparam')
+    }
+
+    if xml_path is not None:
+        config['XML_PATH'] = xml_path
+
+    return config
+
+
+def list_processes(config):
+    ''' the process files found in XML_PATH '''
+    return sorted(
+        name for name in os.listdir(config['XML_PATH'])
+        if name.endswith('.xml') and name.count('.') == 2
+    )
+
+
+class InputMaker:
+    ''' fills the forms of nodes with values chosen by a seeded random
+    generator, so the same seed always walks the same paths. Validations are
+    rejected with probability reject_rate '''
+
+    def __init__(self, seed=0, reject_rate=0):
+        self.random = Random(seed)
+        self.reject_rate = reject_rate
+        # process file -> form id -> id of the node with the form
+        self.owners = dict()
+
+    def node_input(self, node, xml):
+        if isinstance(node, Validation):
+            return node.validate_input(self.validation_data(node, xml))
+
+        if isinstance(node, Action):
+            return node.validate_input({
+                'form_array': [
+                    {
+                        'ref': form.ref,
+                        'data': {
+                            input.name: self.value(input)
+                            for input in form.inputs
+                        },
+                    }
+                    for form in node.form_array
+                    for _ in range(self.form_count(form))
+                ],
+            })
+
+        return []
+
+    def validation_data(self, node, xml):
+        if self.random.random() >= self.reject_rate:
+            return {
+                'response': 'accept',
+                'comment': '',
+            }
+
+        owners = self.form_owners(xml)
+
+        return {
+            'response': 'reject',
+            'comment': '',
+            'inputs': [
+                {
+                    'ref': '{}.{}.0:{}'.format(
+                        owners[dep.split('.')[0]], BENCH_USER, dep,
+                    ),
+                }
+                for dep in node.dependencies
+                if dep.split('.')[0] in owners
+            ],
+        }
+
+    def form_owners(self, xml):
+        if xml.filename not in self.owners:
+            self.owners[xml.filename] = {
+                form.getAttribute('id'): element.getAttribute('id')
+                for element in xml
+                if element.tagName == 'action'
+                for form in element.getElementsByTagName('form')
+            }
+
+        return self.owners[xml.filename]
+
+    def form_count(self, form):
+        low, high = form.multiple
+
+        return int(min(max(low, 1), high))
+
+    def value(self, input):
+        options = [opt.value for opt in getattr(input, 'options', [])]
+
+        if input.type in ('text', 'password'):
+            return input.default or self.random.choice(['yes', 'no', 'abc'])
+        elif input.type == 'int':
+            return self.random.randint(0, 100)
+        elif input.type == 'float':
+            return round(self.random.uniform(0, 100), 2)
+        elif input.type in ('radio', 'select'):
+            return self.random.choice(options) if options else None
+        elif input.type == 'checkbox':
+            return [opt for opt in options if self.random.random() < .5]
+        elif input.type in ('datetime', 'date'):
+            return '2018-05-04T10:{:02}:00.000000Z'.format(
+                self.random.randint(0, 59),
+            )
+        elif input.type == 'file':
+            return {
+                'id': self.random.randint(1, 1000),
+                'mime': 'text/plain',
+                'name': 'file.txt',
+                'type': 'file',
+            }
+        elif input.type == 'link':
+            return {
+                'label': 'cacahuate',
+                'href': 'http://example.com',
+            }
+
+
+class Replay:
+    ''' drives executions through the handler, handling every queued message
+    in order and answering the tasks of users as soon as they appear '''
+
+    def __init__(self, config, seed=0, reject_rate=0):
+        self.config = config
+        self.inputs = InputMaker(seed, reject_rate)
+
+        self.mongo = make_mongo(config)
+        bind_models(Engine(connection_pool=make_redis_pool()))
+
+        # request nodes are answered locally
+        get_session().mount('http://', LocalAdapter())
+        get_session().mount('https://', LocalAdapter())
+
+        self.channel = FakeChannel(config)
+        self.handler = Handler(config)
+        self.handler.mongo = self.mongo
+
+        self.user = User(identifier=BENCH_USER, fullname='Bench').save()
+
+    def run(self, process_name, executions=1):
+        ''' replays the given number of executions of the process, returns
+        the measures of each handled message '''
+        steps = []
+        finished = 0
+
+        for _ in range(executions):
+            execution = self.start(process_name)
+            steps += self.drive()
+
+            if Execution.get(execution.id) is None:
+                finished += 1
+
+            self.clear()
+
+        return steps, finished
+
+    def start(self, process_name):
+        xml = Xml.load(self.config, process_name, direct=True)
+        xmliter = iter(xml)
+        node = make_node(next(xmliter), xmliter)
+
+        return xml.start(
+            node,
+            self.inputs.node_input(node, xml),
+            self.mongo,
+            self.channel,
+            self.user.identifier,
+        )
+
+    def drive(self):
+        steps = []
+
+        while len(steps) < MAX_STEPS:
+            if not self.channel.messages:
+                if not self.answer_tasks():
+                    break
+
+                continue
+
+            steps.append(self.handle(json.loads(
+                self.channel.messages.popleft()
+            )))
+
+        return steps
+
+    def handle(self, message):
+        ''' handles the message and measures it '''
+        redis_before = REDIS_ROUND_TRIPS.get()
+        rabbit_before = self.rabbit_operations()
+        errors_before = COMMAND_ERRORS.get(command=message['command'])
+
+        start = time.perf_counter()
+        self.handler.handle(message, self.channel)
+        elapsed = time.perf_counter() - start
+
+        return {
+            'seconds': elapsed,
+            'mongo': self.handler.round_trips,
+            'redis': REDIS_ROUND_TRIPS.get() - redis_before,
+            'rabbit': self.rabbit_operations() - rabbit_before,
+            'error': COMMAND_ERRORS.get(
+                command=message['command'],
+            ) != errors_before,
+        }
+
+    def rabbit_operations(self):
+        return sum(
+            RABBIT_OPERATIONS.get(operation=operation)
+            for operation in (
+                'basic_publish', 'queue_declare', 'exchange_declare',
+            )
+        )
+
+    def answer_tasks(self):
+        ''' queues the user input of every live pointer, like the api would
+        do. Returns False if there was nothing to answer '''
+        answered = False
+
+        for pointer in Pointer.get_all():
+            execution = pointer.proxy.execution.get()
+            xml = Xml.load(self.config, execution.process_name, direct=True)
+            node = xml.get_node(pointer.node_id)
+
+            self.channel.messages.append(json.dumps(stamp_message({
+                'command': 'step',
+                'execution_id': execution.id,
+                'pointer_id': pointer.id,
+                'user_identifier': self.user.identifier,
+                'input': self.inputs.node_input(node, xml),
+            })))
+            answered = True
+
+        return answered
+
+    def clear(self):
+        ''' removes what is left of abandoned executions '''
+        self.channel.messages.clear()
+
+        for pointer in Pointer.get_all():
+            pointer.delete()
+
+        for execution in Execution.get_all():
+            execution.delete()
+
+
+def percentile(values, percent):
+    ''' nearest-rank percentile of the given values '''
+    if not values:
+        return None
+
+    values = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(values)), 1)
+
+    return values[rank - 1]
+
+
+def to_ms(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+def summarize(steps, executions, finished):
+    seconds = [step['seconds'] for step in steps]
+    count = len(steps) or 1
+
+    return {
+        'executions': executions,
+        'finished': finished,
+        'steps': len(steps),
+        'errors': sum(1 for step in steps if step['error']),
+        'steps_per_second': len(steps) / sum(seconds) if steps else None,
+        'p50_ms': to_ms(percentile(seconds, 50)),
+        'p99_ms': to_ms(percentile(seconds, 99)),
+        'mongo_per_step': sum(step['mongo'] for step in steps) / count,
+        'redis_per_step': sum(step['redis'] for step in steps) / count,
+        'rabbit_per_step': sum(step['rabbit'] for step in steps) / count,
+    }
+
+
+def run(config, processes=None, executions=1, seed=0, reject_rate=0):
+    ''' replays the given processes, all the ones in XML_PATH by default, and
+    returns a report of each one along with the totals '''
+    replay = Replay(config, seed, reject_rate)
+    report = {
+        'seed': seed,
+        'reject_rate': reject_rate,
+        'processes': dict(),
+        'skipped': dict(),
+    }
+    all_steps = []
+    all_finished = 0
+
+    for process_name in processes or list_processes(config):
+        try:
+            steps, finished = replay.run(process_name, executions)
+        except Exception as e:
+            # processes made to test failures can't be replayed
+            report['skipped'][process_name] = '{}: {}'.format(
+                type(e).__name__, str(e).strip().split('\n')[0],
+            )
+            replay.clear()
+            continue
+
+        report['processes'][process_name] = summarize(
+            steps, executions, finished,
+        )
+        all_steps += steps
+        all_finished += finished
+
+    report['total'] = summarize(
+        all_steps,
+        executions * len(report['processes']),
+        all_finished,
+    )
+
+    return report
@@ -0,0 +1,64 @@
+''' Coalescing of the mongo writes made by the handler during a step. Writes
+are collected per collection and sent with one bulk_write each when the
+batch is flushed. Operations on the same collection keep their order,
+operations on different collections are independent of each other. '''
+from collections import OrderedDict
+from copy import deepcopy
+from pymongo import InsertOne, UpdateMany, UpdateOne
+
+
+class WriteBatch:
+    ''' Stands for a mongo database, queueing the writes made through its
+    collections until flush() is called. Reads send the pending writes first
+    so they always see them. '''
+
+    def __init__(self, db):
+        self.db = db
+        self.operations = OrderedDict()
+        # requests sent to mongo through this batch
+        self.round_trips = 0
+
+    def __getitem__(self, name):
+        return BatchedCollection(self, name)
+
+    def add(self, name, operation):
+        self.operations.setdefault(name, []).append(operation)
+
+    def flush(self):
+        operations = self.operations
+        self.operations = OrderedDict()
+
+        for name, collection_operations in operations.items():
+            self.db[name].bulk_write(collection_operations, ordered=True)
+            self.round_trips += 1
+
+
+class BatchedCollection:
+
+    def __init__(self, batch, name):
+        self.batch = batch
+        self.name = name
+
+    # documents are copied when queued, just like they would be serialized
+    # at this point if sent right away
+
+    def insert_one(self, document):
+        self.batch.add(self.name, InsertOne(deepcopy(document)))
+
+    def update_one(self, filter, update):
+        self.batch.add(self.name, UpdateOne(filter, deepcopy(update)))
+
+    def update_many(self, filter, update):
+        self.batch.add(self.name, UpdateMany(filter, deepcopy(update)))
+
+    def find(self, *args, **kwargs):
+        self.batch.flush()
+        self.batch.round_trips += 1
+
+        return self.batch.db[self.name].find(*args, **kwargs)
+
+    def find_one(self, *args, **kwargs):
+        self.batch.flush()
+        self.batch.round_trips += 1
+
+        return self.batch.db[self.name].find_one(*args, **kwargs)
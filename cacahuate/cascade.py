@@ -1,11 +1,15 @@
 ''' Logic on how information is invalidated in cascade. It is used by
 validation-type nodes and patch requests '''
+from heapq import heappop, heappush
+
 from cacahuate.errors import EndOfProcess
+from cacahuate.utils import apply_updates
 
 
 def cascade_invalidate(xml, state, mongo, config, invalidated, comment):
     ''' computes a set of fields to be marked as invalid given the
-    original `invalidated` set of fields. '''
+    original `invalidated` set of fields. The given state is updated in place
+    along with the database '''
     # because this could cause a recursive import
     from cacahuate.node import make_node
 
@@ -22,13 +26,34 @@ def cascade_invalidate(xml, state, mongo, config, invalidated, comment):
         i['ref']
         for i in invalidated
     )
+    process = xml.process
     xmliter = iter(xml)
 
-    for element in xmliter:
-        node = make_node(element, xmliter)
-        more_fields = node.get_invalidated_fields(invalid_refs, state)
+    # positions of the nodes to visit. They are visited in document order and
+    # a node only sees the fields invalidated by the nodes before it
+    pending = []
+    queued = set()
+
+    def add_dependents(refs, after):
+        for ref in refs:
+            field = ref.split(':')[1]
+
+            for position in process.get_dependents(field):
+                if position > after and position not in queued:
+                    queued.add(position)
+                    heappush(pending, position)
+
+    add_dependents(invalid_refs, -1)
+
+    while pending:
+        position = heappop(pending)
+        node = make_node(process.elements[position].element, xmliter)
+        more_fields = set(
+            node.get_invalidated_fields(invalid_refs, state)
+        ) - invalid_refs
 
         invalid_refs.update(more_fields)
+        add_dependents(more_fields, position)
 
     # computes the keys and values to be used in a mongodb update to set the
     # fields as invalid
@@ -100,6 +125,8 @@ def cascade_invalidate(xml, state, mongo, config, invalidated, comment):
         '$set': updates,
     })
 
+    apply_updates(state, updates)
+
 
 def track_next_node(xml, state, mongo, config):
     ''' given an xml and the current state, returns the first invalid or
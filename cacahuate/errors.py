@@ -71,6 +71,15 @@ class InconsistentState(Exception):
     pass
 
 
+class TransientError(Exception):
+    ''' the work of a node failed in a way that may succeed if tried again
+    later. input is what the work produced anyway '''
+
+    def __init__(self, input):
+        super().__init__('Transient failure')
+        self.input = input
+
+
 class NoPointerAlive(BadField):
     message = '{field} does not have a live pointer'
     errorcode = 'no_live_pointer'
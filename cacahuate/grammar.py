@@ -1,28 +1,51 @@
+from functools import lru_cache
 from lark import Lark, Transformer
 import operator
 import os
+import threading
+
+# the parser is built once and shared by every Condition
+_PARSER = None
+_PARSER_LOCK = threading.Lock()
+
+
+def get_parser():
+    global _PARSER
+
+    with _PARSER_LOCK:
+        if _PARSER is None:
+            filename = os.path.join(
+                os.path.dirname(__file__),
+                'grammars/condition.g'
+            )
+
+            with open(filename) as grammar_file:
+                _PARSER = Lark(
+                    grammar_file.read(),
+                    start='or_test',
+                    parser='lalr',
+                )
+
+    return _PARSER
 
 
 class Condition:
 
     def __init__(self):
-        filename = os.path.join(
-            os.path.dirname(__file__),
-            'grammars/condition.g'
-        )
-
-        with open(filename) as grammar_file:
-            self.parser = Lark(
-                grammar_file.read(),
-                start='or_test',
-                parser='lalr',
-            )
+        self.parser = get_parser()
 
     def parse(self, string):
         ''' returns the tree '''
         return self.parser.parse(string)
 
 
+@lru_cache(maxsize=1024)
+def compile_condition(string):
+    ''' returns a function that evaluates the given condition against the
+    values of an execution. Each distinct condition is parsed only once '''
+    return ConditionCompiler().transform(Condition().parse(string))
+
+
 class ConditionTransformer(Transformer):
     ''' can be used to transform a tree like this:
 
@@ -102,3 +125,99 @@ class ConditionTransformer(Transformer):
 
     def atom_expr(self, tokens):
         return self.test_aux(tokens)
+
+
+class ConditionCompiler(Transformer):
+    ''' can be used to turn a tree into a function like this:
+
+    ConditionCompiler().transform(tree)(values)
+
+    where values is taken from the state of the execution. Unlike
+    ConditionTransformer the right side of AND and OR is only evaluated when
+    needed '''
+
+    def op_eq(self, _):
+        return operator.eq
+
+    def op_ne(self, _):
+        return operator.ne
+
+    def op_lt(self, _):
+        return operator.lt
+
+    def op_lte(self, _):
+        return operator.le
+
+    def op_gt(self, _):
+        return operator.gt
+
+    def op_gte(self, _):
+        return operator.ge
+
+    def variable(self, tokens):
+        # just copy the token as string
+        return tokens[0][:]
+
+    def ref(self, tokens):
+        obj_id, member = tokens
+
+        return lambda values: values[obj_id][member]
+
+    def string(self, tokens):
+        value = tokens[0][1:-1]
+
+        return lambda values: value
+
+    def number(self, tokens):
+        value = float(tokens[0])
+
+        return lambda values: value
+
+    def or_test(self, tokens):
+        operands = tokens[::2]
+
+        if len(operands) == 1:
+            return operands[0]
+
+        return lambda values: any(operand(values) for operand in operands)
+
+    def and_test(self, tokens):
+        operands = tokens[::2]
+
+        if len(operands) == 1:
+            return operands[0]
+
+        return lambda values: all(operand(values) for operand in operands)
+
+    def not_test(self, tokens):
+        if len(tokens) == 1:
+            return tokens[0]
+
+        _, operand = tokens
+
+        return lambda values: not operand(values)
+
+    def comparison(self, tokens):
+        if len(tokens) == 1:
+            return tokens[0]
+
+        first = tokens[0]
+        pairs = list(zip(tokens[1::2], tokens[2::2]))
+
+        def compare(values):
+            left = first(values)
+
+            for op, operand in pairs:
+                right = operand(values)
+
+                if not op(left, right):
+                    return False
+
+                left = right
+
+            return True
+
+        return compare
+
+    def atom_expr(self, tokens):
+        return tokens[0]
@@ -1,18 +1,32 @@
+from contextlib import contextmanager
+from copy import deepcopy
+from functools import partial
 from coralillo.errors import ModelNotFoundError
 from datetime import datetime
 from pymongo import MongoClient
 import logging
 import pika
 import simplejson as json
-from jinja2 import Template, TemplateError
+import time
+from jinja2 import TemplateError
 
+from cacahuate.batch import WriteBatch
 from cacahuate.errors import CannotMove, ElementNotFound, InconsistentState
 from cacahuate.errors import MisconfiguredProvider, EndOfProcess
+from cacahuate.errors import TransientError
+from cacahuate.metrics import COMMAND_SECONDS, COMMAND_ERRORS, PHASE_SECONDS
+from cacahuate.metrics import MONGO_ROUND_TRIPS, CountingChannel, node_type
+from cacahuate.metrics import QUEUE_WAIT_SECONDS, TOTAL_SECONDS
 from cacahuate.models import Execution, Pointer, User
 from cacahuate.xml import Xml
-from cacahuate.node import make_node, UserAttachedNode
+from cacahuate.node import UserAttachedNode
+from cacahuate.offload import get_offloader
+from cacahuate.retry import publish_retry
 from cacahuate.jsontypes import Map
 from cacahuate.cascade import cascade_invalidate, track_next_node
+from cacahuate.templates import get_template
+from cacahuate.utils import apply_updates, get_queue, is_latest_pointer
+from cacahuate.utils import stamp_message
 
 LOGGER = logging.getLogger(__name__)
 
@@ -24,94 +38,227 @@ class Handler:
     def __init__(self, config):
         self.config = config
         self.mongo = None
+        self.batch = None
+        # work waiting for the writes of the command to be done
+        self.jobs = []
+        # the message being handled, the offloader acknowledges it if its
+        # work was offloaded
+        self.delivery_tag = None
+        self.offloaded = False
+        # mongo requests made by the last command
+        self.round_trips = 0
+        # trace of the message being handled and when it was received
+        self.trace_id = None
+        self.received_at = None
 
     def __call__(self, channel, method, properties, body: bytes):
         ''' the main callback of cacahuate '''
-        message = json.loads(body)
+        offloaded = self.handle(
+            json.loads(body), channel, method.delivery_tag,
+        )
+
+        if not offloaded and not self.config['RABBIT_NO_ACK']:
+            channel.basic_ack(delivery_tag=method.delivery_tag)
+
+    def handle(self, message: dict, channel, delivery_tag=None):
+        ''' runs the command given in the message, channel is used to
+        publish new messages. Returns True if the message's work was
+        offloaded, the offloader then acknowledges it once the work is done
+        '''
+        command = message['command']
+
+        if command in self.config['COMMANDS']:
+            self.round_trips = 0
+            self.delivery_tag = delivery_tag
+            self.offloaded = False
+            self.trace_id = message.get('trace_id')
+            self.received_at = time.time()
+            channel = CountingChannel(channel)
 
-        if message['command'] in self.config['COMMANDS']:
             try:
-                if message['command'] == 'cancel':
-                    self.cancel_execution(message)
-                elif message['command'] == 'step':
-                    self.call(message, channel)
-                elif message['command'] == 'patch':
-                    self.patch(message, channel)
+                with COMMAND_SECONDS.time(command=command):
+                    if command == 'cancel':
+                        self.cancel(message)
+                    elif command == 'step':
+                        self.call(message, channel)
+                    elif command == 'patch':
+                        self.patch(message, channel)
+                    elif command == 'retry':
+                        self.retry(message, channel)
             except (ModelNotFoundError, CannotMove, ElementNotFound,
                     MisconfiguredProvider, InconsistentState) as e:
+                COMMAND_ERRORS.inc(command=command)
                 LOGGER.error(str(e))
+            except Exception:
+                COMMAND_ERRORS.inc(command=command)
+                raise
+            finally:
+                MONGO_ROUND_TRIPS.inc(self.round_trips, command=command)
+                self.observe_latency(message)
+
+            return self.offloaded
         else:
             LOGGER.warning(
                 'Unrecognized command {}'.format(message['command'])
             )
 
-        if not self.config['RABBIT_NO_ACK']:
-            channel.basic_ack(delivery_tag=method.delivery_tag)
+        return False
+
+    def observe_latency(self, message):
+        ''' records the time the message waited in the queue and the time
+        since it was queued '''
+        if 'enqueued_at' not in message:
+            return
+
+        # clocks of different hosts may differ a bit
+        wait = max(self.received_at - message['enqueued_at'], 0)
+        total = max(time.time() - message['enqueued_at'], 0)
+
+        QUEUE_WAIT_SECONDS.observe(wait, command=message['command'])
+        TOTAL_SECONDS.observe(total, command=message['command'])
 
     def call(self, message: dict, channel):
         pointer, user, input = self.recover_step(message)
+
+        with self.batched_writes():
+            self.step(pointer, user, input, channel)
+
+            if self.config['POINTER_TIMINGS']:
+                self.store_timings(pointer, message)
+
+    def store_timings(self, pointer, message):
+        ''' stores in the pointer document the latency of the step that
+        finished it '''
+        timings = {
+            'trace_id': message.get('trace_id'),
+            'processing': time.time() - self.received_at,
+        }
+
+        if 'enqueued_at' in message:
+            timings['enqueued_at'] = datetime.fromtimestamp(
+                message['enqueued_at'],
+            )
+            timings['queue_wait'] = max(
+                self.received_at - message['enqueued_at'], 0,
+            )
+
+        collection = self.get_mongo()[self.config['POINTER_COLLECTION']]
+        collection.update_one({
+            'id': pointer.id,
+        }, {
+            '$set': {
+                'timings': timings,
+            },
+        })
+
+        # the step may have already replaced the latest pointer
+        collection = self.get_mongo()[self.config['EXECUTION_COLLECTION']]
+        collection.update_one({
+            'pointer.id': pointer.id,
+        }, {
+            '$set': {
+                'pointer.timings': timings,
+            },
+        })
+
+    def step(self, pointer, user, input, channel, chain_length=0,
+             state=None):
+        ''' moves the given pointer using the input provided by user.
+        chain_length counts the sync nodes executed in a row before this one
+        without going through the queue, state is the current execution
+        document if it is already known '''
         execution = pointer.proxy.execution.get()
 
         xml = Xml.load(self.config, execution.process_name, direct=True)
-        xmliter = iter(xml)
+        node = xml.get_node(pointer.node_id)
 
-        node = make_node(xmliter.find(
-            lambda e: e.getAttribute('id') == pointer.node_id
-        ), xmliter)
+        if state is None:
+            collection = self.get_mongo()[
+                self.config['EXECUTION_COLLECTION']
+            ]
+            state = next(collection.find({'id': execution.id}))
 
         # node's lifetime ends here
-        self.teardown(node, pointer, user, input)
+        with PHASE_SECONDS.time(phase='teardown', node_type=node_type(node)):
+            self.teardown(node, pointer, user, input, state)
 
         # compute the next node in the sequence
         try:
-            next_node, state = self.next(xml, node, execution)
+            with PHASE_SECONDS.time(phase='next', node_type=node_type(node)):
+                next_node = self.next(xml, node, state)
         except EndOfProcess:
             # finish the execution
             return self.finish_execution(execution)
 
-        self.wakeup_and_notify(next_node, execution, channel, state)
+        self.wakeup_and_notify(
+            next_node, execution, channel, state, chain_length
+        )
 
-    def wakeup_and_notify(self, node, execution, channel, state):
-        ''' Calls wakeup on the given node and notifies if it is a sync node
-        '''
+    def wakeup_and_notify(self, node, execution, channel, state,
+                          chain_length=0):
+        ''' Calls wakeup on the given node and notifies if it is a sync node.
+        Up to SYNC_CHAIN_LIMIT sync nodes in a row are executed right away
+        instead of being queued '''
         # node's begining of life
-        qdata = self.wakeup(node, execution, channel, state)
+        with PHASE_SECONDS.time(phase='wakeup', node_type=node_type(node)):
+            qdata = self.wakeup(node, execution, channel, state)
 
-        # Sync nodes are queued immediatly
         if qdata:
             new_pointer, new_input = qdata
 
-            channel.queue_declare(
-                queue=self.config['RABBIT_QUEUE'],
-                durable=True
+            self.proceed(
+                new_pointer, new_input, execution, channel, state,
+                chain_length,
             )
 
-            channel.basic_publish(
-                exchange='',
-                routing_key=self.config['RABBIT_QUEUE'],
-                body=json.dumps({
-                    'command': 'step',
-                    'pointer_id': new_pointer.id,
-                    'user_identifier': '__system__',
-                    'input': new_input,
-                }),
-                properties=pika.BasicProperties(
-                    delivery_mode=2,
-                ),
+    def proceed(self, pointer, input, execution, channel, state,
+                chain_length=0):
+        ''' moves the pointer of a sync node whose work is done, either right
+        away or through the queue '''
+        if chain_length < self.config['SYNC_CHAIN_LIMIT']:
+            return self.step(
+                pointer,
+                self.get_system_user(),
+                input,
+                channel,
+                chain_length + 1,
+                state,
             )
 
-    def next(self, xml, node, execution):
+        # whoever takes the message must find this step's writes
+        self.flush_writes()
+
+        # Sync nodes are queued immediatly
+        queue = get_queue(self.config, execution.id)
+
+        channel.queue_declare(
+            queue=queue,
+            durable=True
+        )
+
+        channel.basic_publish(
+            exchange='',
+            routing_key=queue,
+            body=json.dumps(stamp_message({
+                'command': 'step',
+                'execution_id': execution.id,
+                'pointer_id': pointer.id,
+                'user_identifier': '__system__',
+                'input': input,
+            }, self.trace_id)),
+            properties=pika.BasicProperties(
+                delivery_mode=2,
+            ),
+        )
+
+    def next(self, xml, node, state):
         ''' Given a position in the script, return the next position '''
         # Return next node by simple adjacency, works for actions and accepted
         # validations
-
-        collection = self.get_mongo()[
-            self.config['EXECUTION_COLLECTION']
-        ]
-        state = next(collection.find({'id': execution.id}))
-
         try:
             while True:
+                # nodes that change the state (like rejected validations)
+                # update it in place, so there is no need to read it again
                 node = node.next(
                     xml,
                     state,
@@ -119,14 +266,11 @@ class Handler:
                     self.config,
                 )
 
-                # refresh state because previous call might have changed it
-                state = next(collection.find({'id': execution.id}))
-
                 if node.id in state['state']['items']:
                     if state['state']['items'][node.id]['state'] == 'valid':
                         continue
 
-                return node, state
+                return node
         except StopIteration:
             # End of process
             raise EndOfProcess
@@ -141,22 +285,22 @@ class Handler:
         exc_col = self.get_mongo()[self.config['EXECUTION_COLLECTION']]
         ptr_col = self.get_mongo()[self.config['POINTER_COLLECTION']]
 
-        # get currect execution context
-        exc_doc = next(exc_col.find({'id': execution.id}))
-
+        # get currect execution context, state is up to date at this point
         try:
-            context = exc_doc['values']
+            context = state['values']
         except KeyError:
             context = {}
 
         # interpolate
         try:
-            rendered_name = Template(node.name).render(**context)
+            rendered_name = get_template(node.name).render(**context)
         except TemplateError:
             rendered_name = node.name
 
         try:
-            rendered_description = Template(node.description).render(**context)
+            rendered_description = get_template(node.description).render(
+                **context
+            )
         except TemplateError:
             rendered_description = node.description
 
@@ -173,45 +317,140 @@ class Handler:
             execution.id,
         ))
 
+        # the execution keeps a copy of its latest pointer for the listings
+        pointer_entry = node.pointer_entry(execution, pointer)
+
         # mark this node as ongoing
+        ongoing = {
+            'state.items.{}.state'.format(node.id): 'ongoing',
+            'pointer': pointer_entry,
+        }
         exc_col.update_one({
             'id': execution.id,
         }, {
-            '$set': {
-                'state.items.{}.state'.format(node.id): 'ongoing',
-            },
+            '$set': ongoing,
         })
 
         # update registry about this pointer
-        ptr_col.insert_one(node.pointer_entry(execution, pointer))
+        ptr_col.insert_one(deepcopy(pointer_entry))
 
         # notify someone (can raise an exception
         if isinstance(node, UserAttachedNode):
-            notified_users = self.notify_users(node, pointer, channel, state)
+            with PHASE_SECONDS.time(
+                phase='notify_users', node_type=node_type(node),
+            ):
+                notified_users = self.notify_users(
+                    node, pointer, channel, state,
+                )
         else:
             notified_users = []
 
         # do some work (can raise an exception
-        if not node.is_async():
-            input = node.work(self.config, state, channel, self.get_mongo())
-        else:
+        if node.is_async():
             input = []
+        else:
+            input = self.work(node, pointer, execution, state, channel)
+
+        apply_updates(state, ongoing)
 
         # set actors to this pointer (means everything succeeded)
+        candidates = {
+            'notified_users': notified_users,
+            'candidate_list': [user['identifier'] for user in notified_users],
+        }
+
         ptr_col.update_one({
             'id': pointer.id,
         }, {
-            '$set': {
-                'notified_users': notified_users,
-            },
+            '$set': candidates,
         })
 
-        # nodes with forms are not queued
-        if not node.is_async():
+        if notified_users:
+            self.update_latest_pointer(execution, pointer, state, candidates)
+
+        # nodes with forms are not queued, neither offloaded or retried
+        # nodes
+        if input is not None and not node.is_async():
             return pointer, input
 
-    def teardown(self, node, pointer, user, input):
-        ''' finishes the node's lifecycle '''
+    def work(self, node, pointer, execution, state, channel, attempt=0,
+             queued=False):
+        ''' does the work of a sync node and returns its input. Returns None
+        if the work was offloaded or failed and will be tried again later,
+        attempt counts the retries made so far. queued is set if the message
+        being handled asked for this work '''
+        offloader = get_offloader(self.config)
+
+        if node.is_slow() and offloader is not None:
+            if queued:
+                # the step message comes from the offloader once the work is
+                # done
+                self.jobs.append(partial(
+                    self.offload, offloader, node, pointer.id, execution.id,
+                    deepcopy(state), attempt, self.trace_id,
+                ))
+            else:
+                # offloaded work starts from a message of its own, which is
+                # only acknowledged once the work is done. If this process
+                # dies meanwhile rabbit delivers it again
+                self.jobs.append(partial(
+                    publish_retry, self.config, channel, node, pointer.id,
+                    execution.id, 0, self.trace_id,
+                ))
+
+            if self.batch is None:
+                self.submit_jobs()
+
+            return None
+
+        try:
+            # work can reach other systems so they must find the writes made
+            # so far
+            with PHASE_SECONDS.time(phase='work', node_type=node_type(node)):
+                return node.work(
+                    self.config, state, channel, self.flush_writes(),
+                )
+        except TransientError as e:
+            if attempt >= node.get_retries(self.config):
+                return e.input
+
+        LOGGER.info('Work of n:{} failed, retry {} e:{}'.format(
+            node.id,
+            attempt + 1,
+            execution.id,
+        ))
+
+        publish_retry(
+            self.config, channel, node, pointer.id, execution.id, attempt + 1,
+            self.trace_id,
+        )
+
+    def retry(self, message, channel):
+        ''' does the work of a sync node that is offloaded or failed before
+        '''
+        pointer = Pointer.get_or_exception(message['pointer_id'])
+
+        with self.batched_writes():
+            execution = pointer.proxy.execution.get()
+            xml = Xml.load(self.config, execution.process_name, direct=True)
+            node = xml.get_node(pointer.node_id)
+
+            collection = self.get_mongo()[
+                self.config['EXECUTION_COLLECTION']
+            ]
+            state = next(collection.find({'id': execution.id}))
+
+            input = self.work(
+                node, pointer, execution, state, channel, message['attempt'],
+                queued=True,
+            )
+
+            if input is not None:
+                self.proceed(pointer, input, execution, channel, state)
+
+    def teardown(self, node, pointer, user, input, state):
+        ''' finishes the node's lifecycle, updating the given execution state
+        along with the database '''
         execution = pointer.proxy.execution.get()
         execution.proxy.actors.add(user)
 
@@ -227,39 +466,63 @@ class Handler:
         }
 
         # update pointer
+        pointer_updates = {
+            'state': 'finished',
+            'finished_at': datetime.now(),
+            'candidate_list': [],
+            'actors': Map(
+                [actor_json],
+                key=lambda a: a['user']['identifier']
+            ).to_json(),
+        }
+
         collection = self.get_mongo()[self.config['POINTER_COLLECTION']]
         collection.update_one({
             'id': pointer.id,
         }, {
-            '$set': {
-                'state': 'finished',
-                'finished_at': datetime.now(),
-                'actors': Map(
-                    [actor_json],
-                    key=lambda a: a['user']['identifier']
-                ).to_json(),
-            },
+            '$set': pointer_updates,
         })
 
         values = self.compact_values(input)
 
+        # executions started before the index existed keep going without it
+        if 'form_index' in state:
+            form_index = self.index_forms(node, user, input)
+        else:
+            form_index = {}
+
         # update state
+        updates = {**{
+            'state.items.{node}.state'.format(node=node.id): 'valid',
+            'state.items.{node}.actors.items.{identifier}'.format(
+                node=node.id,
+                identifier=user.identifier,
+            ): actor_json,
+            'actors.{}'.format(node.id): user.identifier,
+        }, **values, **form_index}
+
+        if user.identifier not in state.get('actor_list', []):
+            updates['actor_list'] = state.get('actor_list', []) + [
+                user.identifier,
+            ]
+
+        if is_latest_pointer(state, pointer):
+            updates.update(
+                ('pointer.{}'.format(key), value)
+                for key, value in pointer_updates.items()
+            )
+
         collection = self.get_mongo()[
             self.config['EXECUTION_COLLECTION']
         ]
         collection.update_one({
             'id': execution.id,
         }, {
-            '$set': {**{
-                'state.items.{node}.state'.format(node=node.id): 'valid',
-                'state.items.{node}.actors.items.{identifier}'.format(
-                    node=node.id,
-                    identifier=user.identifier,
-                ): actor_json,
-                'actors.{}'.format(node.id): user.identifier,
-            }, **values},
+            '$set': updates,
         })
 
+        apply_updates(state, updates)
+
         LOGGER.debug('Deleted pointer p:{} n:{} e:{}'.format(
             pointer.id,
             pointer.node_id,
@@ -268,6 +531,26 @@ class Handler:
 
         pointer.delete()
 
+    def update_latest_pointer(self, execution, pointer, state, values):
+        ''' copies to the execution the values set in the pointer's document
+        if it is still the latest pointer of the execution '''
+        if not is_latest_pointer(state, pointer):
+            return
+
+        updates = {
+            'pointer.{}'.format(key): value
+            for key, value in values.items()
+        }
+
+        collection = self.get_mongo()[self.config['EXECUTION_COLLECTION']]
+        collection.update_one({
+            'id': execution.id,
+        }, {
+            '$set': updates,
+        })
+
+        apply_updates(state, updates)
+
     def finish_execution(self, execution):
         """ shuts down this execution and every related object """
         mongo = self.get_mongo()
@@ -277,7 +560,9 @@ class Handler:
         }, {
             '$set': {
                 'status': 'finished',
-                'finished_at': datetime.now()
+                'finished_at': datetime.now(),
+                # it no longer shows up in the listings of its actors
+                'actor_list': [],
             }
         })
 
@@ -296,6 +581,20 @@ class Handler:
 
         return compact
 
+    def index_forms(self, node, user, input):
+        ''' positions of the forms filled by this actor, by form ref. Used to
+        find the fields of validation nodes without a scan of the state '''
+        index = {}
+
+        for ix, form in enumerate(input):
+            index.setdefault('form_index.{}.{}.{}'.format(
+                form['ref'],
+                node.id,
+                user.identifier,
+            ), []).append(ix)
+
+        return index
+
     def get_invalid_users(self, node_state):
         users = [
             identifier
@@ -365,7 +664,59 @@ class Handler:
 
         return notified_users
 
+    @contextmanager
+    def batched_writes(self):
+        ''' collects the mongo writes made inside this block and sends them
+        once it ends, one bulk_write per collection '''
+        if self.batch is not None:
+            yield self.batch
+            return
+
+        self.batch = WriteBatch(self.get_mongo())
+
+        try:
+            yield self.batch
+        except Exception:
+            self.jobs = []
+            raise
+        finally:
+            batch, self.batch = self.batch, None
+            batch.flush()
+
+            self.round_trips = batch.round_trips
+            LOGGER.debug('Command took {} mongo round trips'.format(
+                self.round_trips,
+            ))
+
+        # offloaded jobs publish a step, so they start once the writes are
+        # done
+        self.submit_jobs()
+
+    def submit_jobs(self):
+        jobs, self.jobs = self.jobs, []
+
+        for job in jobs:
+            job()
+
+    def offload(self, offloader, *job):
+        offloader.submit(*job, delivery_tag=self.delivery_tag)
+        self.offloaded = True
+
+    def flush_writes(self):
+        ''' sends the writes collected so far and returns the database '''
+        if self.batch is None:
+            return self.get_mongo()
+
+        self.batch.flush()
+
+        return self.batch.db
+
     def get_mongo(self):
+        ''' returns the database, or the batch that collects the writes of
+        the current command '''
+        if self.batch is not None:
+            return self.batch
+
         if self.mongo is None:
             client = MongoClient(self.config['MONGO_URI'])
             db = client[self.config['MONGO_DBNAME']]
@@ -402,13 +753,13 @@ class Handler:
         except ModelNotFoundError:
             raise InconsistentState('Queued dead pointer')
 
-        user = User.get_by('identifier', message.get('user_identifier'))
+        if message.get('user_identifier') == '__system__':
+            user = self.get_system_user()
+        else:
+            user = User.get_by('identifier', message.get('user_identifier'))
 
         if user is None:
-            if message.get('user_identifier') == '__system__':
-                user = User(identifier='__system__', fullname='System').save()
-            else:
-                raise InconsistentState('sent identifier of unexisten user')
+            raise InconsistentState('sent identifier of unexisten user')
 
         return (
             pointer,
@@ -416,7 +767,20 @@ class Handler:
             message['input'],
         )
 
+    def get_system_user(self):
+        ''' the user that provides the input of sync nodes '''
+        user = User.get_by('identifier', '__system__')
+
+        if user is None:
+            user = User(identifier='__system__', fullname='System').save()
+
+        return user
+
     def patch(self, message, channel):
+        with self.batched_writes():
+            self.patch_execution(message, channel)
+
+    def patch_execution(self, message, channel):
         execution = Execution.get_or_exception(message['execution_id'])
         xml = Xml.load(self.config, execution.process_name, direct=True)
         mongo = self.get_mongo()
@@ -427,6 +791,9 @@ class Handler:
             self.config['POINTER_COLLECTION']
         ]
 
+        # retrieve current state
+        state = next(execution_collection.find({'id': execution.id}))
+
         # set nodes with pointers as unfilled, delete pointers
         updates = {}
 
@@ -434,12 +801,18 @@ class Handler:
             updates['state.items.{node}.state'.format(
                 node=pointer.node_id,
             )] = 'unfilled'
+
+            if is_latest_pointer(state, pointer):
+                updates['pointer.state'] = 'cancelled'
+                updates['pointer.candidate_list'] = []
+
             pointer.delete()
             pointer_collection.update_one({
                 'id': pointer.id,
             }, {
                 '$set': {
                     'state': 'cancelled',
+                    'candidate_list': [],
                 },
             })
 
@@ -449,8 +822,7 @@ class Handler:
             '$set': updates,
         })
 
-        # retrieve updated state
-        state = next(execution_collection.find({'id': execution.id}))
+        apply_updates(state, updates)
 
         cascade_invalidate(
             xml,
@@ -461,9 +833,7 @@ class Handler:
             message['comment']
         )
 
-        # retrieve updated state
-        state = next(execution_collection.find({'id': execution.id}))
-
+        # state was updated in place by cascade_invalidate
         first_invalid_node = track_next_node(
             xml, state, self.get_mongo(), self.config
         )
@@ -471,22 +841,51 @@ class Handler:
         # wakeup and start execution from the found invalid node
         self.wakeup_and_notify(first_invalid_node, execution, channel, state)
 
+    def cancel(self, message):
+        with self.batched_writes():
+            self.cancel_execution(message)
+
     def cancel_execution(self, message):
         execution = Execution.get_or_exception(message['execution_id'])
 
+        pointer_ids = []
+
         for pointer in execution.proxy.pointers.get():
+            pointer_ids.append(pointer.id)
             pointer.delete()
 
         collection = self.get_mongo()[
             self.config['EXECUTION_COLLECTION']
         ]
 
+        # the live pointers stop being tasks of their candidates
+        if pointer_ids:
+            self.get_mongo()[self.config['POINTER_COLLECTION']].update_many({
+                'id': {'$in': pointer_ids},
+            }, {
+                '$set': {
+                    'state': 'cancelled',
+                    'candidate_list': [],
+                },
+            })
+
+            collection.update_one({
+                'id': execution.id,
+                'pointer.id': {'$in': pointer_ids},
+            }, {
+                '$set': {
+                    'pointer.state': 'cancelled',
+                    'pointer.candidate_list': [],
+                },
+            })
+
         collection.update_one({
             'id': execution.id,
         }, {
             '$set': {
                 'status': 'cancelled',
-                'finished_at': datetime.now()
+                'finished_at': datetime.now(),
+                'actor_list': [],
             }
         })
 
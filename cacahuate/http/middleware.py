@@ -1,9 +1,13 @@
+from bson import json_util
+from datetime import datetime, timezone
 from flask import jsonify, request
 from functools import wraps
+import base64
+import binascii
 from werkzeug.exceptions import BadRequest as WBadRequest
 from flask import g
 from cacahuate.http.errors import BadRequest, Unauthorized
-from cacahuate.models import User, Token
+from cacahuate.tokens import get_user
 from cacahuate.http.wsgi import app
 
 
@@ -43,16 +47,12 @@ def requires_auth(view):
                 'where': 'request.authorization',
             }])
 
-        identifier = request.authorization['username']
-        token = request.authorization['password']
-
-        user = User.get_by('identifier', identifier)
-        token = Token.get_by('token', token)
+        user = get_user(
+            request.authorization['username'],
+            request.authorization['password'],
+        )
 
-        if (
-            user is None or token is None or
-            token.proxy.user.get().id != user.id
-        ):
+        if user is None:
             raise Unauthorized([{
                 'detail': 'Your credentials are invalid, sorry',
                 'where': 'request.authorization',
@@ -83,5 +83,44 @@ def pagination(view):
         g.offset = int(offset)
         g.limit = int(limit)
 
+        # keyset pagination is used instead of the offset when the cursor is
+        # given. It is empty for the first page
+        g.keyset = 'cursor' in request.args
+        g.cursor = None
+
+        if request.args.get('cursor'):
+            g.cursor = decode_cursor(request.args['cursor'])
+
         return view(*args, **kwargs)
     return wrapper
+
+
+def encode_cursor(value, id):
+    ''' the opaque token of the page that starts after the document with the
+    given sort value and id '''
+    return base64.urlsafe_b64encode(
+        json_util.dumps([value, id]).encode()
+    ).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        value, id = json_util.loads(base64.urlsafe_b64decode(cursor.encode()))
+
+        # both end up in the query, they must not carry operators
+        if value is not None and not isinstance(value, datetime):
+            raise ValueError(value)
+
+        if not isinstance(id, str):
+            raise ValueError(id)
+    except (ValueError, TypeError, binascii.Error):
+        raise BadRequest([{
+            'detail': 'cursor is not valid',
+            'where': 'request.args.cursor',
+        }])
+
+    # dates are stored without timezone
+    if hasattr(value, 'tzinfo') and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return value, id
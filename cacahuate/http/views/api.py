@@ -14,13 +14,14 @@ from cacahuate.errors import ProcessNotFound, ElementNotFound, MalformedProcess
 from cacahuate.http.errors import BadRequest, NotFound, UnprocessableEntity
 from cacahuate.http.errors import Forbidden
 from cacahuate.http.middleware import requires_json, requires_auth, pagination
+from cacahuate.http.middleware import encode_cursor
 from cacahuate.http.validation import validate_json, validate_auth
 from cacahuate.http.wsgi import app, mongo
 from cacahuate.models import Execution, Pointer, User
 from cacahuate.node import make_node
 from cacahuate.rabbit import get_channel
-from cacahuate.xml import Xml, form_to_dict, get_text, get_element_by
-from cacahuate.node import make_input
+from cacahuate.utils import get_queue, stamp_message
+from cacahuate.xml import Xml, form_to_dict, get_catalog, get_text
 
 
 DATE_FIELDS = [
@@ -40,6 +41,115 @@ def json_prepare(obj):
     return obj
 
 
+def find_forms(state, form_ref):
+    ''' yields (node id, actor identifier, form index) of the forms filled
+    in the execution that may have the given ref. Executions started before
+    the form index existed are scanned whole '''
+    if 'form_index' in state:
+        nodes = state['form_index'].get(form_ref, {})
+
+        for node_id, actors in nodes.items():
+            for identifier, indexes in actors.items():
+                for form_ix in indexes:
+                    yield node_id, identifier, form_ix
+
+        return
+
+    for node in state['state']['items'].values():
+        for identifier, actor in node['actors']['items'].items():
+            for form_ix in range(len(actor['forms'])):
+                yield node['id'], identifier, form_ix
+
+
+def get_path(obj, path):
+    for key in path.split('.'):
+        obj = obj.get(key)
+
+        if obj is None:
+            return None
+
+    return obj
+
+
+def find_page(collection, query, field, id_field='id', projection=None):
+    ''' the documents of the requested page, sorted by field and id_field
+    from the newest, and the cursor of the next page. With a cursor the
+    query starts right after the last document of the previous page instead
+    of skipping all of them '''
+    if not g.keyset:
+        return list(collection.find(query, projection).sort([
+            (field, pymongo.DESCENDING),
+        ]).skip(g.offset).limit(g.limit)), None
+
+    # ties are broken by id so every document has its place
+    sort = [
+        (field, pymongo.DESCENDING),
+        (id_field, pymongo.DESCENDING),
+    ]
+
+    docs = list(collection.find(
+        after_cursor(query, field, id_field), projection,
+    ).sort(sort).limit(g.limit))
+
+    return docs, page_cursor(docs, field, id_field)
+
+
+def aggregate_page(collection, pipeline, field, id_field='id'):
+    ''' like find_page, for the documents that come out of the pipeline '''
+    if not g.keyset:
+        return list(collection.aggregate(pipeline + [
+            {'$sort': {field: pymongo.DESCENDING}},
+            {'$skip': g.offset},
+            {'$limit': g.limit},
+        ])), None
+
+    docs = list(collection.aggregate(pipeline + [
+        {'$match': after_cursor({}, field, id_field)},
+        {'$sort': {
+            field: pymongo.DESCENDING,
+            id_field: pymongo.DESCENDING,
+        }},
+        {'$limit': g.limit},
+    ]))
+
+    return docs, page_cursor(docs, field, id_field)
+
+
+def after_cursor(query, field, id_field):
+    ''' restricts the query to the documents after the requested cursor '''
+    if g.cursor is None:
+        return query
+
+    value, id = g.cursor
+
+    return {'$and': [query, {'$or': [
+        {field: {'$lt': value}},
+        {field: value, id_field: {'$lt': id}},
+    ]}]}
+
+
+def page_cursor(docs, field, id_field):
+    ''' the cursor of the page that follows docs, None if it is the last '''
+    if not docs or len(docs) < g.limit:
+        return None
+
+    return encode_cursor(
+        get_path(docs[-1], field),
+        get_path(docs[-1], id_field),
+    )
+
+
+def page_response(data, next_cursor):
+    body = {
+        'data': data,
+    }
+
+    if g.keyset:
+        body['next'] = next_cursor
+
+    return jsonify(body)
+
+
 @app.route('/', methods=['GET', 'POST'])
 @requires_json
 def index():
@@ -63,26 +173,14 @@ def execution_list():
         if k not in app.config['INVALID_FILTERS']
     )
 
-    # filter for user_identifier
+    # filter for user_identifier, the executions the user has worked on
     user_identifier = query.pop('user_identifier', None)
     if user_identifier is not None:
-        user = User.get_by('identifier', user_identifier)
-        if user is not None:
-            execution_list = [item.id for item in user.proxy.activities.get()]
-        else:
-            execution_list = []
-        query['id'] = {
-            '$in': execution_list,
-        }
+        query['actor_list'] = user_identifier
 
-    return jsonify({
-        "data": list(map(
-            json_prepare,
-            collection.find(query).sort([
-                ('started_at', pymongo.DESCENDING)
-            ]).skip(g.offset).limit(g.limit)
-        )),
-    })
+    docs, next_cursor = find_page(collection, query, 'started_at')
+
+    return page_response(list(map(json_prepare, docs)), next_cursor)
 
 
 @app.route('/v1/execution/<id>', methods=['GET'])
@@ -110,7 +208,6 @@ def execution_patch(id):
     validate_json(request.json, ['comment', 'inputs'])
 
     xml = Xml.load(app.config, execution.process_name, direct=True)
-    dom = xml.get_dom()
 
     if type(request.json['inputs']) != list:
         raise RequiredListError('inputs', 'request.body.inputs')
@@ -155,8 +252,8 @@ def execution_patch(id):
 
         processed_ref.append(node_id)
 
-        # node xml element
-        node = get_element_by(dom, 'action', 'id', node_id)
+        # built node
+        node = xml.get_node(node_id)
 
         if len(node_state['actors']['items']) == 1:
             only_key = list(node_state['actors']['items'].keys())[0]
@@ -220,8 +317,8 @@ def execution_patch(id):
 
         processed_ref.append(str(form_index) + ':' + form_state['ref'])
 
-        # form xml element
-        form = get_element_by(node, 'form', 'id', form_state['ref'])
+        # built form
+        form = node.forms_by_ref[form_state['ref']]
 
         try:
             input_name = pieces.pop(0)
@@ -244,12 +341,11 @@ def execution_patch(id):
             'ref': '.'.join(processed_ref),
         })
 
-        # input xml element
-        input_el = get_element_by(form, 'input', 'name', input_name)
+        # built input
+        input_obj = form.inputs_by_name[input_name]
 
         if 'value' in field:
             try:
-                input_obj = make_input(input_el)
                 value = input_obj.validate(field['value'], 0)
                 caption = input_obj.make_caption(value)
 
@@ -264,13 +360,13 @@ def execution_patch(id):
     channel = get_channel()
     channel.basic_publish(
         exchange='',
-        routing_key=app.config['RABBIT_QUEUE'],
-        body=json.dumps({
+        routing_key=get_queue(app.config, execution.id),
+        body=json.dumps(stamp_message({
             'command': 'patch',
             'execution_id': execution.id,
             'comment': request.json['comment'],
             'inputs': processed_inputs,
-        }),
+        })),
         properties=pika.BasicProperties(
             delivery_mode=2,
         ),
@@ -325,9 +421,27 @@ def execution_add_user(id):
     if user_json not in notified_users:
         notified_users.append(user.to_json())
 
+    candidate_list = db_pointer.get('candidate_list', [])
+
+    if user.identifier not in candidate_list:
+        candidate_list.append(user.identifier)
+
     collection.update_one(
         {'id': pointer.id},
-        {'$set': {'notified_users': notified_users}},
+        {'$set': {
+            'notified_users': notified_users,
+            'candidate_list': candidate_list,
+        }},
+    )
+
+    # along with the copy of the latest pointer in the execution
+    collection = mongo.db[app.config['EXECUTION_COLLECTION']]
+    collection.update_one(
+        {'id': execution.id, 'pointer.id': pointer.id},
+        {'$set': {
+            'pointer.notified_users': notified_users,
+            'pointer.candidate_list': candidate_list,
+        }},
     )
 
     return jsonify(user_json), 200
@@ -341,11 +455,11 @@ def delete_process(id):
     channel = get_channel()
     channel.basic_publish(
         exchange='',
-        routing_key=app.config['RABBIT_QUEUE'],
-        body=json.dumps({
+        routing_key=get_queue(app.config, execution.id),
+        body=json.dumps(stamp_message({
             'command': 'cancel',
             'execution_id': execution.id,
-        }),
+        })),
         properties=pika.BasicProperties(
             delivery_mode=2,
         ),
@@ -414,13 +528,9 @@ def continue_process():
         }])
 
     xml = Xml.load(app.config, execution.process_name, direct=True)
-    xmliter = iter(xml)
 
     try:
-        continue_point = make_node(
-            xmliter.find(lambda e: e.getAttribute('id') == node_id),
-            xmliter
-        )
+        continue_point = xml.get_node(node_id)
     except ElementNotFound:
         raise BadRequest([{
             'detail': 'node_id is not a valid node',
@@ -451,13 +561,14 @@ def continue_process():
     channel = get_channel()
     channel.basic_publish(
         exchange='',
-        routing_key=app.config['RABBIT_QUEUE'],
-        body=json.dumps({
+        routing_key=get_queue(app.config, execution.id),
+        body=json.dumps(stamp_message({
             'command': 'step',
+            'execution_id': execution.id,
             'pointer_id': pointer.id,
             'user_identifier': g.user.identifier,
             'input': collected_input,
-        }),
+        })),
         properties=pika.BasicProperties(
             delivery_mode=2,
         ),
@@ -470,28 +581,8 @@ def continue_process():
 
 @app.route('/v1/process', methods=['GET'])
 def list_process():
-    def add_form(xml):
-        json_xml = xml.to_json()
-        forms = []
-        xmliter = iter(xml)
-        first_node = next(xmliter)
-        xmliter.parser.expandNode(first_node)
-
-        for form in first_node.getElementsByTagName('form'):
-            forms.append(form_to_dict(form))
-
-        json_xml['form_array'] = forms
-
-        return json_xml
-
     return jsonify({
-        'data': list(filter(
-            lambda x: x,
-            map(
-                add_form,
-                Xml.list(app.config),
-            )
-        )),
+        'data': get_catalog(app.config).get_process_list(),
     })
 
 
@@ -587,10 +678,7 @@ def task_read(id):
         execution.process_name,
         direct=True
     )
-    xmliter = iter(xml)
-    node = xmliter.find(lambda e: e.getAttribute('id') == pointer.node_id)
-
-    xmliter.parser.expandNode(node)
+    node = xml.get_element(pointer.node_id)
 
     # Response body
     json_data = pointer.to_json(include=['*', 'execution'])
@@ -625,43 +713,45 @@ def task_read(id):
         for dep in deps:
             form_ref, input_name = dep.split('.')
 
-            # TODO this could be done in O(log N + K)
-            for node in state['state']['items'].values():
+            for node_id, identifier, form_ix in find_forms(state, form_ref):
+                node = state['state']['items'][node_id]
                 if node['state'] != 'valid':
                     continue
 
-                for identifier in node['actors']['items']:
-                    actor = node['actors']['items'][identifier]
-                    if actor['state'] != 'valid':
-                        continue
+                actor = node['actors']['items'].get(identifier)
+                if actor is None or actor['state'] != 'valid':
+                    continue
+
+                if form_ix >= len(actor['forms']):
+                    continue
 
-                    for form_ix, form in enumerate(actor['forms']):
-                        if form['state'] != 'valid':
-                            continue
+                form = actor['forms'][form_ix]
+                if form['state'] != 'valid':
+                    continue
 
-                        if form['ref'] != form_ref:
-                            continue
+                if form['ref'] != form_ref:
+                    continue
 
-                        if input_name not in form['inputs']['items']:
-                            continue
+                if input_name not in form['inputs']['items']:
+                    continue
 
-                        input = form['inputs']['items'][input_name]
+                input = form['inputs']['items'][input_name]
 
-                        state_ref = [
-                            node['id'],
-                            identifier,
-                            str(form_ix),
-                        ]
-                        state_ref = '.'.join(state_ref)
-                        state_ref = state_ref + ':' + dep
+                state_ref = [
+                    node_id,
+                    identifier,
+                    str(form_ix),
+                ]
+                state_ref = '.'.join(state_ref)
+                state_ref = state_ref + ':' + dep
 
-                        field = {
-                            'ref': state_ref,
-                            **input,
-                        }
-                        del field['state']
+                field = {
+                    'ref': state_ref,
+                    **input,
+                }
+                del field['state']
 
-                        fields.append(field)
+                fields.append(field)
 
         json_data['fields'] = fields
 
@@ -701,122 +791,74 @@ def data_mix():
 
     prjct = {**include_map} or {**exclude_map}
 
-    # filter for user_identifier
+    # filter for user_identifier, the executions the user has worked on or
+    # has a task in
     user_identifier = exe_query.pop('user_identifier', None)
     if user_identifier is not None:
-        user = User.get_by('identifier', user_identifier)
-        if user is not None:
-            execution_list = [item.id for item in user.proxy.activities.get()]
-
-            for item in user.proxy.tasks.get():
-                execution_list.append(item.execution)
-        else:
-            execution_list = []
-
-        exe_query['id'] = {
-            '$in': execution_list,
-        }
-
-    # pipeline
-    # all special cases should be handled before this
-
-    # execution's case
-    exe_pipeline = [
-        {'$match': exe_query},
-    ]
-
+        exe_query['$or'] = [
+            {'actor_list': user_identifier},
+            {'pointer.candidate_list': user_identifier},
+        ]
+
+    # the next cursor is made of these fields, they are hidden later if they
+    # were not requested
+    hidden = []
+
+    if g.keyset and prjct:
+        for key in ('started_at', 'id'):
+            if include_map and key not in prjct:
+                prjct[key] = 1
+                hidden.append(key)
+            elif key in exclude_map:
+                del prjct[key]
+                hidden.append(key)
+
+    # the latest pointer is kept in the execution's document
     exe_collection = mongo.db[app.config['EXECUTION_COLLECTION']]
-    exe_cursor = exe_collection.aggregate(exe_pipeline)
-
-    exe_ids = list(map(
-        lambda item: item['id'],
-        exe_cursor,
-    ))
-
-    # pointer's case
-    ptr_pipeline = [
-        {'$match': ptr_query},
-        {'$group': {
-            '_id': None,
-            'executions': {'$push': '$execution.id'},
-        }},
-    ]
-
-    ptr_collection = mongo.db[app.config['POINTER_COLLECTION']]
-    ptr_cursor = ptr_collection.aggregate(ptr_pipeline)
-
-    ptr_ids = []
-    for item in ptr_cursor:
-        ptr_ids += item['executions']
-
-    # mix both lists
 
-    def intersection(lst1, lst2):
-        temp = set(lst2)
-        lst3 = [value for value in lst1 if value in temp]
-        return lst3
-
-    if exe_ids and ptr_ids:
-        execution_ids = intersection(exe_ids, ptr_ids)
+    if ptr_query:
+        # filters on pointer.* match any pointer of the execution, they are
+        # looked up through the index on execution.id
+        if include_map:
+            ptr_prjct = prjct
+        else:
+            ptr_prjct = {**prjct, 'matched_pointers': 0}
+
+        docs, next_cursor = aggregate_page(exe_collection, [
+            {'$match': exe_query},
+            {'$lookup': {
+                'from': app.config['POINTER_COLLECTION'],
+                'localField': 'id',
+                'foreignField': 'execution.id',
+                'as': 'matched_pointers',
+            }},
+            {'$match': {'matched_pointers': {'$elemMatch': ptr_query}}},
+            {'$project': ptr_prjct},
+        ], 'started_at')
     else:
-        execution_ids = exe_ids or ptr_ids
-
-    # build results
-    ptr_pipeline = [
-        {'$match': {'execution.id': {'$in': execution_ids}}},
-        {'$sort': {'started_at': -1}},
-        {'$group': {
-            '_id': '$execution.id',
-            'latest': {'$first': '$$ROOT'},
-        }},
-        {'$replaceRoot': {'newRoot': '$latest'}},
-        # TODO: DO NOT CREATE COLLECTION
-        {'$out': 'ptr_aux_collection'},
-    ]
-
-    ptr_collection.aggregate(ptr_pipeline)
-
-    exe_pipeline = [
-        {'$match': {'id': {'$in': execution_ids}}},
-        # TODO: FIND ANOTHER WAY TO ADD POINTER
-        {'$lookup': {
-            'from': 'ptr_aux_collection',
-            'localField': 'id',
-            'foreignField': 'execution.id',
-            'as': 'pointer',
-        }},
-        {'$sort': {'started_at': -1}},
-        {'$skip': g.offset},
-        {'$limit': g.limit},
-    ]
-
-    if prjct:
-        # TODO: THE ABOVE LOOKUP IS REQUIRED TO USE include/exclude=pointer.foo
-        exe_pipeline.append({'$project': prjct})
+        docs, next_cursor = find_page(
+            exe_collection, exe_query, 'started_at',
+            projection=prjct or None,
+        )
 
     def data_mix_json_prepare(obj):
         if obj.get('pointer') is not None:
-            try:
-                obj['pointer'] = obj['pointer'][0]
-                obj['pointer'].pop('execution', {})
-                obj['pointer'] = json_prepare(obj['pointer'])
-            except IndexError:
-                obj['pointer'] = None
+            obj['pointer'].pop('execution', {})
+            obj['pointer'] = json_prepare(obj['pointer'])
+        elif not include_map and 'pointer' not in exclude_map:
+            obj['pointer'] = None
+
+        for key in hidden:
+            obj.pop(key, None)
+
         return json_prepare(obj)
 
-    return jsonify({
-        'data': list(map(
-            data_mix_json_prepare,
-            exe_collection.aggregate(exe_pipeline),
-        ))
-    })
+    return page_response(list(map(data_mix_json_prepare, docs)), next_cursor)
 
 
 @app.route('/v1/log', methods=['GET'])
 @pagination
 def all_logs():
-    collection = mongo.db[app.config['POINTER_COLLECTION']]
-
     dict_args = request.args.to_dict()
 
     query = dict(
@@ -824,37 +866,46 @@ def all_logs():
         if k not in app.config['INVALID_FILTERS']
     )
 
-    # filter for user_identifier
+    # filter for user_identifier, the pointers that are tasks of the user
     user_identifier = query.pop('user_identifier', None)
+
+    if query:
+        # the latest pointer of each execution among the ones that match
+        if user_identifier is not None:
+            query['candidate_list'] = user_identifier
+
+        collection = mongo.db[app.config['POINTER_COLLECTION']]
+        docs, next_cursor = aggregate_page(collection, [
+            {'$match': query},
+            {'$sort': {'started_at': -1}},
+            {'$group': {
+                '_id': '$execution.id',
+                'latest': {'$first': '$$ROOT'},
+            }},
+            {'$replaceRoot': {'newRoot': '$latest'}},
+        ], 'started_at')
+
+        return page_response(list(map(json_prepare, docs)), next_cursor)
+
+    # without filters the latest pointer is the one kept in the execution's
+    # document
+    query = {
+        'pointer': {'$ne': None},
+    }
+
     if user_identifier is not None:
-        user = User.get_by('identifier', user_identifier)
-        if user is not None:
-            pointer_list = [item.id for item in user.proxy.tasks.get()]
-        else:
-            pointer_list = []
-        query['id'] = {
-            '$in': pointer_list,
-        }
+        query['pointer.candidate_list'] = user_identifier
 
-    pipeline = [
-        {'$match': query},
-        {'$sort': {'started_at': -1}},
-        {'$group': {
-            '_id': '$execution.id',
-            'latest': {'$first': '$$ROOT'},
-        }},
-        {'$replaceRoot': {'newRoot': '$latest'}},
-        {'$sort': {'started_at': -1}},
-        {'$skip': g.offset},
-        {'$limit': g.limit},
-    ]
+    collection = mongo.db[app.config['EXECUTION_COLLECTION']]
+    docs, next_cursor = find_page(
+        collection, query, 'pointer.started_at',
+        projection={'pointer': 1, 'id': 1},
+    )
 
-    return jsonify({
-        'data': list(map(
-            json_prepare,
-            collection.aggregate(pipeline),
-        )),
-    })
+    return page_response(list(map(
+        lambda item: json_prepare(item['pointer']),
+        docs,
+    )), next_cursor)
 
 
 @app.route('/v1/log/<id>', methods=['GET'])
@@ -867,14 +918,9 @@ def list_logs(id):
     if node_id:
         query['node.id'] = node_id
 
-    return jsonify({
-        "data": list(map(
-            json_prepare,
-            collection.find(query).skip(g.offset).limit(g.limit).sort([
-                ('started_at', pymongo.DESCENDING)
-            ])
-        )),
-    })
+    docs, next_cursor = find_page(collection, query, 'started_at')
+
+    return page_response(list(map(json_prepare, docs)), next_cursor)
 
 
 @app.route('/v1/process/<id>/statistics', methods=['GET'])
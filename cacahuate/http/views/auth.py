@@ -4,7 +4,7 @@ from string import ascii_letters
 
 from cacahuate.http.errors import Unauthorized
 from cacahuate.http.wsgi import app
-from cacahuate.models import User, Token
+from cacahuate.tokens import create_token, get_user
 from cacahuate.utils import get_or_create
 
 
@@ -19,9 +19,9 @@ def signin(backend):
     if user.proxy.tokens.count() > 0:
         token = user.proxy.tokens.get()[0]
     else:
-        token = ''.join(choice(ascii_letters) for _ in range(32))
-        token = Token(token=token).save()
-        token.proxy.user.set(user)
+        token = create_token(
+            user, ''.join(choice(ascii_letters) for _ in range(32)),
+        )
 
     return jsonify({
         'data': {
@@ -34,15 +34,12 @@ def signin(backend):
 
 @app.route('/v1/auth/whoami')
 def whoami():
-    identifier = request.authorization['username']
-    token = request.authorization['password']
+    user = get_user(
+        request.authorization['username'],
+        request.authorization['password'],
+    )
 
-    user = User.get_by('identifier', identifier)
-    token = Token.get_by('token', token)
-
-    if user is None or \
-       token is None or \
-       token.proxy.user.get().id != user.id:
+    if user is None:
         raise Unauthorized([{
             'detail': 'Your credentials are invalid, sorry',
             'where': 'request.authorization',
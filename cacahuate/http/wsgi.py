@@ -11,6 +11,8 @@ import time
 
 from cacahuate.indexes import create_indexes
 from cacahuate.models import bind_models
+from cacahuate.templates import bind_templates
+from cacahuate.tokens import bind_token_cache
 
 # The flask application
 app = Flask(__name__)
@@ -32,6 +34,12 @@ time.tzset()
 cora = Coralillo(app, id_function=yuid)
 bind_models(cora._engine)
 
+# The template cache
+bind_templates(app.config)
+
+# The cache of validated credentials
+bind_token_cache(app.config)
+
 # The database
 mongo = PyMongo(app)
 create_indexes(app.config)
@@ -1,4 +1,4 @@
-from pymongo import MongoClient
+from pymongo import ASCENDING, DESCENDING, MongoClient
 
 
 def create_indexes(config):
@@ -10,8 +10,133 @@ def create_indexes(config):
     db.execution.create_index("status")
     db.execution.create_index("started_at")
     db.execution.create_index("finished_at")
+    db.execution.create_index("pointer.id")
+    db.execution.create_index("pointer.started_at")
+    db.execution.create_index("actor_list")
+    db.execution.create_index("pointer.candidate_list")
+    db.execution.create_index([
+        ("started_at", DESCENDING),
+        ("id", DESCENDING),
+    ])
+    db.execution.create_index([
+        ("pointer.started_at", DESCENDING),
+        ("id", DESCENDING),
+    ])
 
     db.pointer.create_index("status")
+    db.pointer.create_index("candidate_list")
     db.pointer.create_index("execution.id")
     db.pointer.create_index("started_at")
     db.pointer.create_index("finished_at")
+    db.pointer.create_index([
+        ("execution.id", ASCENDING),
+        ("started_at", DESCENDING),
+        ("id", DESCENDING),
+    ])
+
+    # the daemon forks its consumers after this, they must not share
+    # pymongo's connections and threads
+    mongo.close()
+
+
+def copy_latest_pointers(config):
+    ''' copies to the documents of the executions started before they kept
+    their latest pointer the last one found in the pointer collection '''
+    mongo = MongoClient(config['MONGO_URI'])
+    db = getattr(mongo, config['MONGO_DBNAME'])
+    executions = db[config['EXECUTION_COLLECTION']]
+    pointers = db[config['POINTER_COLLECTION']]
+
+    for execution in executions.find({
+        'pointer': {'$exists': False},
+    }, {
+        'id': 1,
+    }):
+        pointer = pointers.find_one({
+            'execution.id': execution['id'],
+        }, {
+            '_id': 0,
+        }, sort=[('started_at', DESCENDING)])
+
+        executions.update_one({
+            'id': execution['id'],
+            'pointer': {'$exists': False},
+        }, {
+            '$set': {
+                'pointer': pointer,
+            },
+        })
+
+    mongo.close()
+
+
+def copy_user_lists(config):
+    ''' fills the lists of actors and candidates used by the user filters in
+    the execution and pointer documents written before they existed '''
+    mongo = MongoClient(config['MONGO_URI'])
+    db = getattr(mongo, config['MONGO_DBNAME'])
+    executions = db[config['EXECUTION_COLLECTION']]
+    pointers = db[config['POINTER_COLLECTION']]
+
+    for execution in executions.find({
+        'actor_list': {'$exists': False},
+    }, {
+        'id': 1,
+        'status': 1,
+        'actors': 1,
+        'pointer': 1,
+    }):
+        # finished and cancelled executions are not listed for their actors
+        if execution.get('status') == 'ongoing':
+            actor_list = sorted(set(
+                (execution.get('actors') or {}).values()
+            ))
+        else:
+            actor_list = []
+
+        updates = {
+            'actor_list': actor_list,
+        }
+
+        pointer = execution.get('pointer')
+
+        if pointer is not None and 'candidate_list' not in pointer:
+            if pointer.get('state') == 'ongoing':
+                updates['pointer.candidate_list'] = [
+                    user['identifier']
+                    for user in pointer.get('notified_users', [])
+                ]
+            else:
+                updates['pointer.candidate_list'] = []
+
+        executions.update_one({
+            'id': execution['id'],
+        }, {
+            '$set': updates,
+        })
+
+    # the pointers themselves, used when the logs are filtered
+    for pointer in pointers.find({
+        'candidate_list': {'$exists': False},
+    }, {
+        'id': 1,
+        'state': 1,
+        'notified_users': 1,
+    }):
+        if pointer.get('state') == 'ongoing':
+            candidate_list = [
+                user['identifier']
+                for user in pointer.get('notified_users') or []
+            ]
+        else:
+            candidate_list = []
+
+        pointers.update_one({
+            'id': pointer['id'],
+        }, {
+            '$set': {
+                'candidate_list': candidate_list,
+            },
+        })
+
+    mongo.close()
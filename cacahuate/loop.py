@@ -1,17 +1,28 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import logging
 import pika
+import simplejson as json
+import threading
 import traceback
 
 from .handler import Handler
+from .models import Pointer
+from .offload import get_offloader
+from .utils import get_queues
 
 LOGGER = logging.getLogger(__name__)
 
 
 class Loop:
 
-    def __init__(self, config: dict):
+    def __init__(self, config: dict, shard: int = 0):
         self.config = config
         self.handler = Handler(config)
+        # the queue this loop consumes, see RABBIT_QUEUE_SHARDS
+        self.shard = shard
+        self.queue = get_queues(config)[shard]
 
     def start(self):
         connection = pika.BlockingConnection(pika.ConnectionParameters(
@@ -20,16 +31,41 @@ class Loop:
         channel = connection.channel()
 
         channel.queue_declare(
-            queue=self.config['RABBIT_QUEUE'],
+            queue=self.queue,
             durable=True,
         )
-        LOGGER.info('Declared queue {}'.format(self.config['RABBIT_QUEUE']))
+        LOGGER.info('Declared queue {}'.format(self.queue))
+
+        if self.config['HANDLER_WORKERS'] > 1:
+            consumer = WorkerPool(self.config, connection, channel)
+        else:
+            consumer = self.handler
+
+        offloader = get_offloader(self.config)
+
+        if offloader is not None:
+            offloader.channel = ThreadsafeChannel(connection, channel)
+
+        if not self.config['RABBIT_NO_ACK']:
+            channel.basic_qos(prefetch_count=self.prefetch_count())
+
+        if self.config['RABBIT_QUEUE_SHARDS'] > 1:
+            # a single consumer per shard keeps the order of its executions
+            consumer_tag = '{}.{}'.format(
+                self.config['RABBIT_CONSUMER_TAG'],
+                self.shard,
+            )
+            exclusive = True
+        else:
+            consumer_tag = self.config['RABBIT_CONSUMER_TAG']
+            exclusive = False
 
         channel.basic_consume(
-            self.handler,
-            queue=self.config['RABBIT_QUEUE'],
-            consumer_tag=self.config['RABBIT_CONSUMER_TAG'],
+            consumer,
+            queue=self.queue,
+            consumer_tag=consumer_tag,
             no_ack=self.config['RABBIT_NO_ACK'],
+            exclusive=exclusive,
         )
 
         LOGGER.info('cacahuate started')
@@ -40,3 +76,167 @@ class Loop:
             LOGGER.info('cacahuate stopped')
         except Exception:
             LOGGER.error(traceback.format_exc())
+
+        if consumer is not self.handler:
+            consumer.shutdown()
+
+        if offloader is not None:
+            offloader.shutdown()
+
+            # send what the offloaded jobs published
+            if connection.is_open:
+                connection.process_data_events()
+
+    def prefetch_count(self):
+        count = self.config['HANDLER_WORKERS']
+
+        # offloaded work keeps its message until it is done
+        if self.config['OFFLOAD_WORKERS']:
+            count += self.config['OFFLOAD_WORKERS']
+            count += self.config['OFFLOAD_BACKLOG']
+
+        return self.config['RABBIT_PREFETCH_COUNT'] or count
+
+
+def execution_key(message):
+    ''' finds the execution the message refers to, messages with the same key
+    must be processed in order '''
+    if 'execution_id' in message:
+        return message['execution_id']
+
+    # step messages published by older versions only have the pointer
+    pointer = Pointer.get(message.get('pointer_id') or '')
+
+    if pointer is not None and pointer.execution is not None:
+        return pointer.execution
+
+    return message.get('pointer_id')
+
+
+class WorkerPool:
+    ''' Consumer that processes messages in a pool of threads. Messages of the
+    same execution wait in a lane and are processed one after the other in
+    the order they arrived, messages of different executions run in parallel.
+    Messages are acknowledged once processed '''
+
+    def __init__(self, config, connection, channel):
+        self.config = config
+        self.connection = connection
+        self.channel = channel
+        self.executor = ThreadPoolExecutor(
+            max_workers=config['HANDLER_WORKERS'],
+        )
+        # publishing is done by the connection's thread, its heartbeats
+        # keep the connection open while workers are idle
+        self.publisher = ThreadsafeChannel(connection, channel)
+        self.lanes = dict()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.stopped = False
+
+    def __call__(self, channel, method, properties, body: bytes):
+        ''' runs in the connection's thread, hands the message to a lane '''
+        message = json.loads(body)
+        key = execution_key(message)
+        item = (message, method.delivery_tag)
+
+        with self.lock:
+            if self.stopped:
+                # not acknowledged, rabbit will deliver it again
+                return
+
+            if key in self.lanes:
+                self.lanes[key].append(item)
+                return
+
+            self.lanes[key] = deque([item])
+
+        self.executor.submit(self.run_lane, key)
+
+    def run_lane(self, key):
+        ''' processes the messages of a lane until it is empty '''
+        while True:
+            with self.lock:
+                lane = self.lanes[key]
+
+                if not lane or self.stopped:
+                    del self.lanes[key]
+                    return
+
+                message, delivery_tag = lane.popleft()
+
+            try:
+                offloaded = self.get_handler().handle(
+                    message, self.publisher, delivery_tag,
+                )
+            except Exception:
+                LOGGER.error(traceback.format_exc())
+
+                # like the single threaded loop, an unexpected error stops
+                # the daemon. The message is not acknowledged so rabbit
+                # delivers it again
+                self.stop()
+                continue
+
+            if not offloaded:
+                self.acknowledge(delivery_tag)
+
+    def get_handler(self):
+        ''' each thread has its own handler '''
+        handler = getattr(self.local, 'handler', None)
+
+        if handler is None:
+            handler = self.local.handler = Handler(self.config)
+
+        return handler
+
+    def acknowledge(self, delivery_tag):
+        if self.config['RABBIT_NO_ACK']:
+            return
+
+        self.publisher.basic_ack(delivery_tag=delivery_tag)
+
+    def stop(self):
+        with self.lock:
+            self.stopped = True
+
+        self.connection.add_callback_threadsafe(self.channel.stop_consuming)
+
+    def shutdown(self):
+        ''' waits for the messages already received and sends their
+        acknowledgements '''
+        self.executor.shutdown(wait=True)
+
+        with self.lock:
+            self.stopped = True
+
+        if self.connection.is_open:
+            self.connection.process_data_events()
+
+
+class ThreadsafeChannel:
+    ''' The part of pika's channel used by the handler, for threads other
+    than the connection's. Operations are sent to the connection's thread,
+    which runs them in the order they were made, so the messages published
+    while handling a message go out before its acknowledgement '''
+
+    def __init__(self, connection, channel):
+        self.connection = connection
+        self.channel = channel
+
+    def run(self, method, *args, **kwargs):
+        self.connection.add_callback_threadsafe(partial(
+            getattr(self.channel, method), *args, **kwargs
+        ))
+
+    def queue_declare(self, *args, **kwargs):
+        self.run('queue_declare', *args, **kwargs)
+
+    def exchange_declare(self, *args, **kwargs):
+        self.run('exchange_declare', *args, **kwargs)
+
+    def basic_publish(self, *args, **kwargs):
+        self.run('basic_publish', *args, **kwargs)
+
+    def basic_ack(self, *args, **kwargs):
+        self.run('basic_ack', *args, **kwargs)
@@ -11,16 +11,25 @@ import logging
 import logging.config
 import os
 import re
+import redis
+import signal
 import sys
 import time
+import traceback
 
 from cacahuate.errors import MalformedProcess
 from cacahuate.grammar import Condition
+from cacahuate.indexes import copy_latest_pointers, copy_user_lists
 from cacahuate.indexes import create_indexes
 from cacahuate.loop import Loop
+from cacahuate.metrics import CountingConnection, start_server
 from cacahuate.models import bind_models
+from cacahuate.sessions import bind_session
+from cacahuate.templates import bind_templates
 from cacahuate.xml import NODES, get_text
 
+LOGGER = logging.getLogger(__name__)
+
 
 def main():
     # Load the config
@@ -36,20 +45,144 @@ def main():
     logging.config.dictConfig(config['LOGGING'])
 
     # Load the models
-    eng = Engine(
-        host=config['REDIS_HOST'],
-        port=config['REDIS_PORT'],
-        db=config['REDIS_DB'],
-        id_function=yuid,
-    )
+    redis_config = {
+        'host': config['REDIS_HOST'],
+        'port': config['REDIS_PORT'],
+        'db': config['REDIS_DB'],
+    }
+
+    if config['METRICS_PORT'] is not None:
+        # count the round trips to redis
+        redis_config = {
+            'connection_pool': redis.ConnectionPool(
+                connection_class=CountingConnection,
+                **redis_config
+            ),
+        }
+
+    eng = Engine(id_function=yuid, **redis_config)
     bind_models(eng)
 
+    # Setup the template cache
+    bind_templates(config)
+
+    # Setup the connection pool of request nodes
+    bind_session(config)
+
     # Create mongo indexes
     create_indexes(config)
 
-    # start the loop
-    loop = Loop(config)
-    loop.start()
+    # start the loop, or one for each shard of the queue
+    if config['RABBIT_CONSUMED_SHARDS'] is None:
+        shards = list(range(config['RABBIT_QUEUE_SHARDS']))
+    else:
+        shards = config['RABBIT_CONSUMED_SHARDS']
+
+    if len(shards) == 1:
+        serve_metrics(config, shards[0])
+
+        loop = Loop(config, shards[0])
+        loop.start()
+    else:
+        supervise(config, shards)
+
+
+def migrate():
+    ''' fills the fields the api reads from the execution documents written
+    by older versions. Run it once after upgrading '''
+    config = Config(os.path.dirname(os.path.realpath(__file__)))
+    config.from_object('cacahuate.settings')
+    config.from_envvar('CACAHUATE_SETTINGS', silent=True)
+
+    logging.config.dictConfig(config['LOGGING'])
+
+    create_indexes(config)
+    copy_latest_pointers(config)
+    copy_user_lists(config)
+
+
+def supervise(config, shards, loop_class=Loop):
+    ''' forks a consumer process for each of the given shards and starts it
+    again if it exits. SIGINT or SIGTERM stop all of them '''
+    children = dict()
+
+    def start(shard):
+        pid = os.fork()
+
+        if pid == 0:
+            code = 1
+
+            try:
+                serve_metrics(config, shard)
+                loop_class(config, shard).start()
+                code = 0
+            except KeyboardInterrupt:
+                code = 0
+            except Exception:
+                LOGGER.error(traceback.format_exc())
+            finally:
+                # never return to the supervisor's code
+                os._exit(code)
+
+        children[pid] = shard
+
+    stopping = []
+
+    def stop(signum, frame):
+        # the exception is lost if it happens inside fork's handlers, the
+        # flag stops the loop anyway
+        stopping.append(signum)
+        raise KeyboardInterrupt
+
+    # children inherit these, so they stop gracefully too
+    previous_handlers = {
+        signum: signal.signal(signum, stop)
+        for signum in (signal.SIGINT, signal.SIGTERM)
+    }
+
+    try:
+        for shard in shards:
+            start(shard)
+
+        while not stopping:
+            pid, status = os.wait()
+            shard = children.pop(pid, None)
+
+            if shard is None:
+                continue
+
+            LOGGER.warning('Consumer of shard {} exited, restarting'.format(
+                shard,
+            ))
+            time.sleep(1)
+            start(shard)
+    except KeyboardInterrupt:
+        pass
+
+    for pid in children:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    for pid in children:
+        os.waitpid(pid, 0)
+
+    for signum, handler in previous_handlers.items():
+        signal.signal(signum, handler)
+
+
+def serve_metrics(config, shard=0):
+    ''' starts the metrics server of this process, if enabled '''
+    if config['METRICS_PORT'] is None:
+        return
+
+    port = config['METRICS_PORT'] + shard
+    start_server(port, config['METRICS_HOST'])
+
+    LOGGER.info('Serving metrics on {}:{}'.format(
+        config['METRICS_HOST'], port,
+    ))
 
 
 def rng_path():
@@ -169,6 +302,25 @@ def _validate_file(filename):
         if node.tagName == 'if':
             continue
 
+        if node.tagName == 'request':
+            numbers = (
+                ('connect-timeout', float),
+                ('read-timeout', float),
+                ('retry-delay', float),
+                ('retries', int),
+            )
+
+            for attr, number in numbers:
+                try:
+                    number(node.getAttribute(attr) or 0)
+                except ValueError:
+                    raise MalformedProcess(
+                        '{}:{} {} must be a number'.format(
+                            filename, sw.lineno,
+                            attr,
+                        )
+                    )
+
         # Expand and check this node. <if> nodes are not expanded
         doc.expandNode(node)
 
@@ -0,0 +1,251 @@
+''' Counters and latency histograms of the daemon's hot path, exposed in
+prometheus' text format by a small http server started by cacahuated when
+METRICS_PORT is set '''
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+import redis
+import threading
+import time
+
+REGISTRY = []
+
+DEFAULT_BUCKETS = (
+    .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10,
+)
+
+
+class Metric:
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = dict()
+        self.lock = threading.Lock()
+
+        REGISTRY.append(self)
+
+    def key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def format_labels(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+
+        if not pairs:
+            return ''
+
+        return '{' + ','.join(
+            '{}="{}"'.format(
+                name,
+                value.replace('\\', r'\\').replace('"', r'\"'),
+            ) for name, value in pairs
+        ) + '}'
+
+    def expose(self):
+        lines = [
+            '# HELP {} {}'.format(self.name, self.documentation),
+            '# TYPE {} {}'.format(self.name, self.type),
+        ]
+
+        with self.lock:
+            values = sorted(self.values.items())
+
+        for key, value in values:
+            lines += self.expose_value(key, value)
+
+        return lines
+
+
+class Counter(Metric):
+
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(self.key(labels), 0)
+
+    def expose_value(self, key, value):
+        return ['{}{} {}'.format(self.name, self.format_labels(key), value)]
+
+
+class Histogram(Metric):
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+
+        with self.lock:
+            if key not in self.values:
+                # one count per bucket plus +Inf, then the sum
+                self.values[key] = [0] * (len(self.buckets) + 1) + [0]
+
+            counts = self.values[key]
+
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[len(self.buckets)] += 1
+
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        ''' observes the time spent in the block '''
+        start = time.monotonic()
+
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def get_count(self, **labels):
+        return sum(self.values.get(self.key(labels), [0])[:-1])
+
+    def expose_value(self, key, counts):
+        lines = []
+        total = 0
+
+        for bound, count in zip(self.buckets + ('+Inf',), counts):
+            total += count
+            lines.append('{}_bucket{} {}'.format(
+                self.name,
+                self.format_labels(key, [('le', str(bound))]),
+                total,
+            ))
+
+        lines.append('{}_sum{} {}'.format(
+            self.name, self.format_labels(key), counts[-1],
+        ))
+        lines.append('{}_count{} {}'.format(
+            self.name, self.format_labels(key), total,
+        ))
+
+        return lines
+
+
+def expose():
+    ''' all the metrics in prometheus' text format '''
+    lines = []
+
+    for metric in REGISTRY:
+        lines += metric.expose()
+
+    return '\n'.join(lines) + '\n'
+
+
+COMMAND_SECONDS = Histogram(
+    'cacahuate_command_seconds',
+    'Time spent handling a command, without the time in the queue',
+    ['command'],
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    'cacahuate_queue_wait_seconds',
+    'Time commands wait in the queue before being handled',
+    ['command'],
+)
+TOTAL_SECONDS = Histogram(
+    'cacahuate_total_seconds',
+    'Time from a command being queued to it being handled',
+    ['command'],
+)
+COMMAND_ERRORS = Counter(
+    'cacahuate_command_errors_total',
+    'Commands that failed',
+    ['command'],
+)
+PHASE_SECONDS = Histogram(
+    'cacahuate_phase_seconds',
+    'Time spent in each phase of a node\'s lifecycle',
+    ['phase', 'node_type'],
+)
+MONGO_ROUND_TRIPS = Counter(
+    'cacahuate_mongo_round_trips_total',
+    'Requests sent to mongo while handling commands',
+    ['command'],
+)
+REDIS_ROUND_TRIPS = Counter(
+    'cacahuate_redis_round_trips_total',
+    'Requests sent to redis, a pipeline counts as one',
+)
+RABBIT_OPERATIONS = Counter(
+    'cacahuate_rabbit_operations_total',
+    'Operations made on rabbit channels while handling commands',
+    ['operation'],
+)
+
+
+def node_type(node):
+    return type(node).__name__.lower()
+
+
+class CountingConnection(redis.Connection):
+    ''' redis connection that counts the requests sent through it '''
+
+    def send_packed_command(self, *args, **kwargs):
+        REDIS_ROUND_TRIPS.inc()
+
+        return super().send_packed_command(*args, **kwargs)
+
+
+class CountingChannel:
+    ''' wraps a rabbit channel counting the operations made with it '''
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    def __getattr__(self, name):
+        attr = getattr(self.channel, name)
+
+        if name in ('basic_publish', 'queue_declare', 'exchange_declare'):
+            def counted(*args, **kwargs):
+                RABBIT_OPERATIONS.inc(operation=name)
+
+                return attr(*args, **kwargs)
+
+            return counted
+
+        return attr
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        body = expose().encode()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def start_server(port, host='127.0.0.1'):
+    ''' serves the metrics from a thread '''
+    server = MetricsServer((host, port), MetricsRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    return server
@@ -1,20 +1,25 @@
 ''' This file defines some basic classes that map the behaviour of the
 equivalent xml nodes '''
 from case_conversion import pascalcase
+from copy import copy
 from datetime import datetime
-from jinja2 import Template, TemplateError
+from jinja2 import TemplateError
 import logging
 import re
 import requests
+import time
 
 from cacahuate.errors import InconsistentState, MisconfiguredProvider
+from cacahuate.errors import TransientError
 from cacahuate.errors import InvalidInputError, InputError, RequiredListError
 from cacahuate.errors import RequiredDictError
 from cacahuate.errors import ValidationErrors, RequiredInputError, EndOfProcess
-from cacahuate.grammar import Condition, ConditionTransformer
+from cacahuate.grammar import compile_condition
 from cacahuate.http.errors import BadRequest
 from cacahuate.inputs import make_input
 from cacahuate.jsontypes import Map, SortedMap
+from cacahuate.sessions import get_session
+from cacahuate.templates import get_template
 from cacahuate.utils import get_or_create, user_import
 from cacahuate.xml import get_text, NODES, Xml
 from cacahuate.cascade import cascade_invalidate, track_next_node
@@ -38,9 +43,13 @@ class Form:
 
         # Load inputs
         self.inputs = []
+        self.inputs_by_name = dict()
 
         for input_el in element.getElementsByTagName('input'):
-            self.inputs.append(make_input(input_el))
+            input = make_input(input_el)
+
+            self.inputs.append(input)
+            self.inputs_by_name.setdefault(input.name, input)
 
     def calc_range(self, attr):
         range = (1, 1)
@@ -103,15 +112,17 @@ class Node:
     def is_async(self):
         raise NotImplementedError('Must be implemented in subclass')
 
+    def is_slow(self):
+        ''' slow sync nodes are worked outside of the handler if
+        OFFLOAD_WORKERS is set '''
+        return False
+
     def validate_input(self, json_data):
         raise NotImplementedError('Must be implemented in subclass')
 
     def next(self, xml, state, mongo, config, *, skip_reverse=False):
         # Return next node by simple adjacency
-        xmliter = iter(xml)
-        xmliter.find(lambda e: e.getAttribute('id') == self.id)
-
-        return make_node(xmliter.next_skipping_elifelse(), xmliter)
+        return make_successor(xml, xml.process.successors[self.id])
 
     def dependent_refs(self, invalidated, node_state):
         raise NotImplementedError('Must be implemented in subclass')
@@ -159,6 +170,10 @@ class Node:
             'actors': Map([], key='identifier').to_json(),
             'process_id': execution.process_name,
             'notified_users': notified_users or [],
+            # identifiers of the users that have this pointer as a task
+            'candidate_list': [
+                user['identifier'] for user in notified_users or []
+            ],
             'state': 'ongoing',
         }
 
@@ -189,11 +204,6 @@ class FullyContainedNode(Node):
     to nodes that contain blocks of nodes, thus not being able of loading
     themselves to memory from the begining '''
 
-    def __init__(self, element, xmliter):
-        super().__init__(element, xmliter)
-
-        xmliter.parser.expandNode(element)
-
 
 class UserAttachedNode(FullyContainedNode):
     ''' Types of nodes that require human interaction, thus being asyncronous
@@ -302,12 +312,24 @@ class Action(UserAttachedNode):
 
         # Form resolving
         self.form_array = []
+        self.forms_by_ref = dict()
+        # form.input -> (form ref, input name) of the fields depending on it
+        self.dependents = dict()
 
         form_array = element.getElementsByTagName('form-array')
 
         if len(form_array) > 0:
             for form_el in form_array[0].getElementsByTagName('form'):
-                self.form_array.append(Form(form_el))
+                form = Form(form_el)
+
+                self.form_array.append(form)
+                self.forms_by_ref.setdefault(form.ref, form)
+
+                for field in form.inputs:
+                    for dep in field.dependencies:
+                        self.dependents.setdefault(dep, []).append(
+                            (form.ref, field.name)
+                        )
 
     def is_async(self):
         return True
@@ -320,16 +342,13 @@ class Action(UserAttachedNode):
         for dep in invalidated:
             _, depref = dep.split(':')
 
-            for form in self.form_array:
-                for field in form.inputs:
-                    for dep in field.dependencies:
-                        if depref == dep:
-                            refs.add('{node}.{actor}.0:{form}.{input}'.format(
-                                node=self.id,
-                                actor=actor,
-                                form=form.ref,
-                                input=field.name,
-                            ))
+            for form_ref, input_name in self.dependents.get(depref, []):
+                refs.add('{node}.{actor}.0:{form}.{input}'.format(
+                    node=self.id,
+                    actor=actor,
+                    form=form_ref,
+                    input=input_name,
+                ))
 
         return refs
 
@@ -456,12 +475,7 @@ class Validation(UserAttachedNode):
             state['values'][self.id]['comment']
         )
 
-        # reload state
-        collection = mongo[
-            config['EXECUTION_COLLECTION']
-        ]
-        state = next(collection.find({'id': state['id']}))
-
+        # state was updated in place by cascade_invalidate
         first_invalid_node = track_next_node(xml, state, mongo, config)
 
         return first_invalid_node
@@ -670,27 +684,22 @@ class Conditional(Node):
         self.name = type + ' ' + self.id
         self.description = type + ' ' + self.id
 
-        self.condition = xmliter.get_next_condition()
+        self.condition = get_text(element.getElementsByTagName('condition')[0])
 
     def is_async(self):
         return False
 
     def next(self, xml, state, mongo, config, *, skip_reverse=False):
-        xmliter = iter(xml)
-
-        # consume up to this node
-        ifnode = xmliter.find(lambda e: e.getAttribute('id') == self.id)
-
-        if not state['values'][self.id]['condition']:
-            xmliter.expand(ifnode)
+        if state['values'][self.id]['condition']:
+            successors = xml.process.successors
+        else:
+            successors = xml.process.skip_successors
 
-        return make_node(xmliter.next_skipping_elifelse(), xmliter)
+        return make_successor(xml, successors[self.id])
 
     def work(self, config, state, channel, mongo):
-        tree = Condition().parse(self.condition)
-
         try:
-            value = ConditionTransformer(state['values']).transform(tree)
+            value = compile_condition(self.condition)(state['values'])
         except ValueError as e:
             raise InconsistentState('Could not evaluate condition: {}'.format(
                 str(e)
@@ -742,6 +751,9 @@ class Else(Node):
             },
         ])]
 
+    def dependent_refs(self, invalidated, node_state):
+        return set()
+
 
 class Request(FullyContainedNode):
     ''' A node that makes a TCP Request '''
@@ -765,43 +777,120 @@ class Request(FullyContainedNode):
                 (header.getAttribute('name'), get_text(header))
             )
 
-    def make_request(self, context):
+        # None means the value from settings
+        self.connect_timeout = self.parse_timeout(
+            element.getAttribute('connect-timeout')
+        )
+        self.read_timeout = self.parse_timeout(
+            element.getAttribute('read-timeout')
+        )
+
+        # retry policy, None means the value from settings
+        if element.getAttribute('retries'):
+            self.retries = int(element.getAttribute('retries'))
+        else:
+            self.retries = None
+
+        self.retry_delay = self.parse_timeout(
+            element.getAttribute('retry-delay')
+        )
+
+    @staticmethod
+    def parse_timeout(attr):
+        if not attr:
+            return None
+
+        return float(attr)
+
+    def get_timeout(self, config):
+        ''' the (connect, read) timeout of this node's request '''
+        if self.connect_timeout is not None:
+            connect_timeout = self.connect_timeout
+        else:
+            connect_timeout = config['REQUEST_CONNECT_TIMEOUT']
+
+        if self.read_timeout is not None:
+            read_timeout = self.read_timeout
+        else:
+            read_timeout = config['REQUEST_READ_TIMEOUT']
+
+        return connect_timeout, read_timeout
+
+    def get_retries(self, config):
+        ''' how many times to try again a failed request '''
+        if self.retries is None:
+            return config['REQUEST_RETRIES']
+
+        return self.retries
+
+    def get_retry_delay(self, config, attempt):
+        ''' seconds to wait before the given retry, starting at 1 '''
+        if self.retry_delay is not None:
+            delay = self.retry_delay
+        else:
+            delay = config['REQUEST_RETRY_DELAY']
+
+        return min(
+            delay * 2 ** (attempt - 1),
+            config['REQUEST_RETRY_MAX_DELAY'],
+        )
+
+    def make_request(self, context, timeout=None):
+        start = time.monotonic()
+
         try:
-            url = Template(self.url).render(**context)
-            body = Template(self.body).render(**context)
+            url = get_template(self.url).render(**context)
+            body = get_template(self.body).render(**context)
             headers = dict(map(
-                lambda t: (t[0], Template(t[1]).render(**context)),
+                lambda t: (t[0], get_template(t[1]).render(**context)),
                 self.headers
             ))
 
-            response = requests.request(
+            response = get_session().request(
                 self.method,
                 url,
                 headers=headers,
-                data=body
+                data=body,
+                timeout=timeout,
             )
 
             res_dict = {
                 'status_code': response.status_code,
                 'response': response.text,
+                'transient': response.status_code >= 500,
             }
         except TemplateError:
             res_dict = {
                 'status_code': 0,
                 'response': 'Jinja error prevented this request',
+                'transient': False,
             }
-        except requests.exceptions.ConnectionError as e:
+        except (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+        ) as e:
             res_dict = {
                 'status_code': 0,
                 'response': str(e),
+                'transient': True,
             }
 
+        res_dict['elapsed'] = time.monotonic() - start
+
         return res_dict
 
     def work(self, config, state, channel, mongo):
-        response = self.make_request(state['values'])
+        response = self.make_request(
+            state['values'],
+            self.get_timeout(config),
+        )
 
-        return [Form.state_json(self.id, [
+        LOGGER.debug('Request n:{} took {:.3f}s'.format(
+            self.id,
+            response['elapsed'],
+        ))
+
+        input = [Form.state_json(self.id, [
             {
                 'name': 'status_code',
                 'state': 'valid',
@@ -820,23 +909,57 @@ class Request(FullyContainedNode):
                 'value_caption': response['response'],
                 'hidden': False,
             },
+            {
+                'name': 'elapsed',
+                'state': 'valid',
+                'type': 'float',
+                'value': response['elapsed'],
+                'label': 'Elapsed seconds',
+                'value_caption': '{:.3f}'.format(response['elapsed']),
+                'hidden': True,
+            },
         ])]
 
+        if response['transient']:
+            raise TransientError(input)
+
+        return input
+
     def is_async(self):
         return False
 
+    def is_slow(self):
+        return True
+
     def dependent_refs(self, invalidated, node_state):
         return set()
 
 
 def make_node(element, xmliter) -> Node:
-    ''' returns a build Node object given an Element object '''
+    ''' returns a build Node object given an Element object. Nodes are built
+    once per compiled process and copied afterwards '''
     if element.tagName not in NODES:
         raise ValueError(
             'Class definition not found for node: {}'.format(element.tagName)
         )
 
-    class_name = pascalcase(element.tagName)
-    available_classes = __import__(__name__).node
+    nodes = xmliter.process.nodes
+
+    if element not in nodes:
+        class_name = pascalcase(element.tagName)
+        available_classes = __import__(__name__).node
+
+        nodes[element] = getattr(available_classes, class_name)(
+            element, xmliter
+        )
+
+    return copy(nodes[element])
+
+
+def make_successor(xml, element) -> Node:
+    ''' builds the node found in the successor table of a process, raises
+    StopIteration if the process ends there '''
+    if element is None:
+        raise StopIteration
 
-    return getattr(available_classes, class_name)(element, xmliter)
+    return make_node(element, iter(xml))
@@ -0,0 +1,130 @@
+''' Runs the work of slow sync nodes, like requests, in a pool of threads so
+the handler can keep processing other messages meanwhile. Once the work is
+done its result is published as a step message for the node's pointer, and
+the message that asked for the work is acknowledged '''
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import pika
+import simplejson as json
+import threading
+import traceback
+
+from cacahuate.errors import TransientError
+from cacahuate.metrics import PHASE_SECONDS, node_type
+from cacahuate.retry import publish_retry
+from cacahuate.utils import get_queue, stamp_message
+
+LOGGER = logging.getLogger(__name__)
+
+_OFFLOADER = None
+_OFFLOADER_LOCK = threading.Lock()
+
+
+class Offloader:
+
+    def __init__(self, config):
+        self.config = config
+        self.executor = ThreadPoolExecutor(
+            max_workers=config['OFFLOAD_WORKERS'],
+        )
+        # submit() blocks once this many jobs are waiting or running
+        self.slots = threading.BoundedSemaphore(
+            config['OFFLOAD_WORKERS'] + config['OFFLOAD_BACKLOG'],
+        )
+        # set by the loop, jobs publish and acknowledge through it so it must
+        # be safe to use from any thread
+        self.channel = None
+
+    def submit(self, node, pointer_id, execution_id, state, attempt=0,
+               trace_id=None, delivery_tag=None):
+        ''' state must not change while the job runs, pass a copy. attempt
+        counts the retries of the work made so far, trace_id is the trace the
+        published messages belong to and delivery_tag the message that asked
+        for the work '''
+        self.slots.acquire()
+
+        try:
+            self.executor.submit(
+                self.run, node, pointer_id, execution_id, state, attempt,
+                trace_id, delivery_tag,
+            )
+        except Exception:
+            self.slots.release()
+            raise
+
+    def run(self, node, pointer_id, execution_id, state, attempt,
+            trace_id=None, delivery_tag=None):
+        try:
+            try:
+                with PHASE_SECONDS.time(
+                    phase='work', node_type=node_type(node),
+                ):
+                    input = node.work(self.config, state, None, None)
+            except TransientError as e:
+                if attempt < node.get_retries(self.config):
+                    publish_retry(
+                        self.config, self.channel, node, pointer_id,
+                        execution_id, attempt + 1, trace_id,
+                    )
+                else:
+                    self.publish(pointer_id, execution_id, e.input, trace_id)
+            else:
+                self.publish(pointer_id, execution_id, input, trace_id)
+
+            # the result is queued, the work won't be lost anymore
+            self.acknowledge(delivery_tag)
+        except Exception:
+            # the message is not acknowledged, rabbit delivers it again once
+            # the connection is closed
+            LOGGER.error(traceback.format_exc())
+        finally:
+            self.slots.release()
+
+    def publish(self, pointer_id, execution_id, input, trace_id=None):
+        channel = self.channel
+        queue = get_queue(self.config, execution_id)
+
+        channel.queue_declare(
+            queue=queue,
+            durable=True,
+        )
+
+        channel.basic_publish(
+            exchange='',
+            routing_key=queue,
+            body=json.dumps(stamp_message({
+                'command': 'step',
+                'execution_id': execution_id,
+                'pointer_id': pointer_id,
+                'user_identifier': '__system__',
+                'input': input,
+            }, trace_id)),
+            properties=pika.BasicProperties(
+                delivery_mode=2,
+            ),
+        )
+
+    def acknowledge(self, delivery_tag):
+        if delivery_tag is None or self.config['RABBIT_NO_ACK']:
+            return
+
+        self.channel.basic_ack(delivery_tag=delivery_tag)
+
+    def shutdown(self):
+        ''' waits for the jobs in progress '''
+        self.executor.shutdown(wait=True)
+
+
+def get_offloader(config):
+    ''' the offloader shared by the handlers of this process, None if
+    OFFLOAD_WORKERS is 0 '''
+    global _OFFLOADER
+
+    if not config['OFFLOAD_WORKERS']:
+        return None
+
+    with _OFFLOADER_LOCK:
+        if _OFFLOADER is None:
+            _OFFLOADER = Offloader(config)
+
+    return _OFFLOADER
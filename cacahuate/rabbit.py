@@ -2,6 +2,7 @@ import pika
 from flask import g
 
 from cacahuate.http.wsgi import app
+from cacahuate.utils import get_queues
 
 
 def get_channel():
@@ -13,10 +14,11 @@ def get_channel():
         ))
         channel = connection.channel()
 
-        channel.queue_declare(
-            queue=app.config['RABBIT_QUEUE'],
-            durable=True,
-        )
+        for queue in get_queues(app.config):
+            channel.queue_declare(
+                queue=queue,
+                durable=True,
+            )
 
         g._channel = channel
 
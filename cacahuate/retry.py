@@ -0,0 +1,52 @@
+''' Delayed retries for the work of sync nodes. A retry message waits in a
+queue whose messages expire after the delay, rabbit then moves it to the
+execution's queue where the handler tries the work again '''
+import pika
+import simplejson as json
+
+from cacahuate.utils import get_queue, stamp_message
+
+
+def publish_retry(config, channel, node, pointer_id, execution_id, attempt,
+                  trace_id=None):
+    ''' schedules the given retry, starting at 1, of the node's work.
+    Attempt 0 is the first try of offloaded work, which is queued right away
+    '''
+    queue = get_queue(config, execution_id)
+
+    if attempt == 0:
+        routing_key = queue
+
+        channel.queue_declare(
+            queue=queue,
+            durable=True,
+        )
+    else:
+        delay = int(node.get_retry_delay(config, attempt) * 1000)
+        routing_key = '{}.retry.{}'.format(queue, delay)
+
+        channel.queue_declare(
+            queue=routing_key,
+            durable=True,
+            arguments={
+                'x-message-ttl': delay,
+                'x-dead-letter-exchange': '',
+                'x-dead-letter-routing-key': queue,
+                # remove the queue if no retries use this delay for a while
+                'x-expires': delay + 60000,
+            },
+        )
+
+    channel.basic_publish(
+        exchange='',
+        routing_key=routing_key,
+        body=json.dumps(stamp_message({
+            'command': 'retry',
+            'execution_id': execution_id,
+            'pointer_id': pointer_id,
+            'attempt': attempt,
+        }, trace_id)),
+        properties=pika.BasicProperties(
+            delivery_mode=2,
+        ),
+    )
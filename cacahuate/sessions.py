@@ -0,0 +1,41 @@
+''' A shared requests session for the http calls made by request nodes. The
+session keeps a pool of connections per host, so consecutive calls to the
+same service reuse the connection instead of opening a new one '''
+from requests.adapters import HTTPAdapter
+import requests
+
+_SESSION = None
+
+
+def make_session(pool_connections=10, pool_maxsize=10):
+    ''' pool_connections is the number of hosts to keep pools for,
+    pool_maxsize the number of connections kept for each host '''
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+    )
+
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    return session
+
+
+def bind_session(config):
+    ''' sets up the shared session using the given config '''
+    global _SESSION
+
+    _SESSION = make_session(
+        config['REQUEST_POOL_CONNECTIONS'],
+        config['REQUEST_POOL_MAXSIZE'],
+    )
+
+
+def get_session():
+    global _SESSION
+
+    if _SESSION is None:
+        _SESSION = make_session()
+
+    return _SESSION
@@ -7,7 +7,27 @@ RABBIT_HOST = 'localhost'
 RABBIT_QUEUE = 'cacahuate_process'
 RABBIT_NOTIFY_EXCHANGE = 'charpe_notify'
 RABBIT_CONSUMER_TAG = 'cacahuate_consumer_1'
-RABBIT_NO_ACK = True
+RABBIT_NO_ACK = False
+
+# In how many queues the process messages are distributed, all the messages of
+# an execution go to the same queue. cacahuated starts a consumer process for
+# each queue in RABBIT_CONSUMED_SHARDS, None means all of them
+RABBIT_QUEUE_SHARDS = 1
+RABBIT_CONSUMED_SHARDS = None
+
+# How many messages the handler processes at the same time, messages of the
+# same execution are always processed one after the other
+HANDLER_WORKERS = 1
+
+# How many unacknowledged messages rabbit delivers ahead to the handler, None
+# means one per worker plus OFFLOAD_WORKERS and OFFLOAD_BACKLOG, offloaded
+# work keeps its message until it is done. Has no effect if RABBIT_NO_ACK is
+# set
+RABBIT_PREFETCH_COUNT = None
+
+# How many sync nodes (conditionals, requests, calls...) in a row the handler
+# executes right away before queueing the next one. 0 queues every sync node
+SYNC_CHAIN_LIMIT = 0
 
 # Default logging config
 LOGGING = {
@@ -50,12 +70,61 @@ LOGGING = {
 # Where to store xml files
 XML_PATH = os.path.join(base_dir, 'xml')
 
+# How many compiled process files to keep in memory
+XML_CACHE_SIZE = 128
+
 # Mongodb
 MONGO_URI = os.getenv('CACAHUATE_MONGO_URI', 'mongodb://localhost/cacahuate')
 MONGO_DBNAME = 'cacahuate'
 POINTER_COLLECTION = 'pointer'
 EXECUTION_COLLECTION = 'execution'
 
+# Compiled templates of names, descriptions and requests to keep in memory,
+# and where to store their bytecode (None disables it)
+TEMPLATE_CACHE_SIZE = 400
+TEMPLATE_BYTECODE_CACHE_DIR = None
+
+# Seconds each api process remembers validated credentials, and how many of
+# them it keeps. The cache is not shared and nothing tells it about tokens or
+# users deleted from redis, every api process keeps accepting them for up to
+# TOKEN_CACHE_TTL seconds. Keep it short, 0 disables the cache
+TOKEN_CACHE_TTL = 5
+TOKEN_CACHE_SIZE = 1024
+
+# Connection pool of request nodes: how many hosts to keep connections for and
+# how many connections per host
+REQUEST_POOL_CONNECTIONS = 10
+REQUEST_POOL_MAXSIZE = 10
+
+# Seconds to wait for request nodes to connect and to receive data, can be
+# overriden per node with the connect-timeout and read-timeout attributes
+REQUEST_CONNECT_TIMEOUT = 5
+REQUEST_READ_TIMEOUT = 30
+
+# How many times request nodes that can't connect, time out or get a 5xx
+# response are tried again, and the seconds to wait before the first retry.
+# The wait doubles with every retry up to REQUEST_RETRY_MAX_DELAY. Can be
+# overriden per node with the retries and retry-delay attributes
+REQUEST_RETRIES = 0
+REQUEST_RETRY_DELAY = 1
+REQUEST_RETRY_MAX_DELAY = 300
+
+# Threads that run slow sync nodes (requests) outside of the handler, which
+# keeps processing messages meanwhile. 0 runs them in the handler. At most
+# OFFLOAD_BACKLOG more nodes wait for a thread before the handler blocks
+OFFLOAD_WORKERS = 0
+OFFLOAD_BACKLOG = 100
+
+# Store in the pointer documents the time the step that finished them waited
+# in the queue and took to process
+POINTER_TIMINGS = False
+
+# Port where cacahuated serves its metrics in prometheus' text format, None
+# disables them. With several shards each consumer process uses the port plus
+# its shard's number
+METRICS_PORT = None
+METRICS_HOST = '127.0.0.1'
+
 # Defaults for pagination
 PAGINATION_LIMIT = 20
 PAGINATION_OFFSET = 0
@@ -67,6 +136,7 @@ TIMEZONE = 'UTC'
 COMMANDS = [
     'step',
     'cancel',
+    'retry',
 ]
 
 # For ephimeral objects, like executions and pointers
@@ -111,4 +181,5 @@ IMPERSONATE_PASSWORD = 'set me to passlib.hash.pbkdf2_sha256.hash("something")'
 INVALID_FILTERS = (
     'limit',
     'offset',
+    'cursor',
 )
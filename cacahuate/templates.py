@@ -0,0 +1,44 @@
+''' A shared jinja environment for the templates found in processes, like
+node names, descriptions and the parts of a request. Since the source of
+these templates is fixed per process version they are compiled once and
+kept in a bounded cache '''
+from jinja2 import Environment, FileSystemBytecodeCache, FunctionLoader
+
+_ENVIRONMENT = None
+
+
+def make_environment(cache_size=400, bytecode_cache_dir=None):
+    # the name of each template is its own source
+    loader = FunctionLoader(lambda source: source)
+
+    if bytecode_cache_dir is not None:
+        bytecode_cache = FileSystemBytecodeCache(bytecode_cache_dir)
+    else:
+        bytecode_cache = None
+
+    return Environment(
+        loader=loader,
+        cache_size=cache_size,
+        bytecode_cache=bytecode_cache,
+    )
+
+
+def bind_templates(config):
+    ''' sets up the shared environment using the given config '''
+    global _ENVIRONMENT
+
+    _ENVIRONMENT = make_environment(
+        config['TEMPLATE_CACHE_SIZE'],
+        config['TEMPLATE_BYTECODE_CACHE_DIR'],
+    )
+
+
+def get_template(source):
+    ''' returns the compiled template for the given source, can raise
+    jinja2.TemplateError '''
+    global _ENVIRONMENT
+
+    if _ENVIRONMENT is None:
+        _ENVIRONMENT = make_environment()
+
+    return _ENVIRONMENT.get_template(source)
@@ -0,0 +1,117 @@
+''' A short lived cache of the credentials validated by the api, so requests
+of the same user don't have to look up the user and the token in redis every
+time. Entries are kept for a few seconds and the cache is bounded, changes
+made to tokens through this module are seen right away by this process '''
+from collections import OrderedDict
+import threading
+import time
+
+from cacahuate.models import Token, User
+
+_CACHE = None
+
+
+class TokenCache:
+    ''' maps (identifier, token) to the user they belong to. Entries expire
+    after ttl seconds and the least recently used are dropped when there are
+    more than size of them '''
+
+    def __init__(self, size=1024, ttl=5):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, identifier, token):
+        key = (identifier, token)
+
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is None:
+                return None
+
+            user, expires_at = entry
+
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+
+                return None
+
+            self.entries.move_to_end(key)
+
+            return user
+
+    def add(self, identifier, token, user):
+        if self.size <= 0 or self.ttl <= 0:
+            return
+
+        with self.lock:
+            self.entries[(identifier, token)] = (
+                user, time.monotonic() + self.ttl,
+            )
+            self.entries.move_to_end((identifier, token))
+
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def forget(self, identifier):
+        ''' drops the entries of the given identifier '''
+        with self.lock:
+            for key in list(self.entries):
+                if key[0] == identifier:
+                    del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def bind_token_cache(config):
+    ''' sets up the cache using the given config '''
+    global _CACHE
+
+    _CACHE = TokenCache(config['TOKEN_CACHE_SIZE'], config['TOKEN_CACHE_TTL'])
+
+
+def get_token_cache():
+    global _CACHE
+
+    if _CACHE is None:
+        _CACHE = TokenCache()
+
+    return _CACHE
+
+
+def get_user(identifier, token):
+    ''' returns the user with the given identifier if token is one of its
+    tokens, None otherwise '''
+    cache = get_token_cache()
+    user = cache.get(identifier, token)
+
+    if user is not None:
+        return user
+
+    user = User.get_by('identifier', identifier)
+    token_obj = Token.get_by('token', token)
+
+    if (
+        user is None or token_obj is None or
+        token_obj.proxy.user.get().id != user.id
+    ):
+        return None
+
+    cache.add(identifier, token, user)
+
+    return user
+
+
+def create_token(user, token):
+    ''' gives the token to the user. Cached entries of the user are dropped
+    so requests don't use an older copy of it '''
+    token = Token(token=token).save()
+    token.proxy.user.set(user)
+
+    get_token_cache().forget(user.identifier)
+
+    return token
@@ -1,8 +1,12 @@
 from case_conversion import pascalcase
+from copy import deepcopy
 from importlib import import_module
 from coralillo.errors import ModelNotFoundError
 import os
 import sys
+import time
+import uuid
+import zlib
 
 from cacahuate.errors import MisconfiguredProvider
 from cacahuate.models import User
@@ -41,6 +45,63 @@ def user_import(module_key, class_sufix, import_maper, default_path, enabled):
     return cls
 
 
+def apply_updates(doc, updates):
+    ''' applies the fields of a mongo $set operation to a document that is
+    already in memory, so it doesn't have to be read again. Values are
+    copied like the database would do '''
+    for path, value in updates.items():
+        value = deepcopy(value)
+        keys = path.split('.')
+        target = doc
+
+        for key in keys[:-1]:
+            if isinstance(target, list):
+                target = target[int(key)]
+            else:
+                target = target.setdefault(key, {})
+
+        if isinstance(target, list):
+            target[int(keys[-1])] = value
+        else:
+            target[keys[-1]] = value
+
+
+def is_latest_pointer(execution_doc, pointer):
+    ''' tells if pointer is the one copied to the execution's document '''
+    latest = execution_doc.get('pointer') or {}
+
+    return latest.get('id') == pointer.id
+
+
+def get_queues(config):
+    ''' names of the queues the process messages are distributed in '''
+    if config['RABBIT_QUEUE_SHARDS'] <= 1:
+        return [config['RABBIT_QUEUE']]
+
+    return [
+        '{}.{}'.format(config['RABBIT_QUEUE'], shard)
+        for shard in range(config['RABBIT_QUEUE_SHARDS'])
+    ]
+
+
+def get_queue(config, execution_id):
+    ''' the queue for the messages of the given execution. All of them go to
+    the same queue so they are processed in order '''
+    queues = get_queues(config)
+
+    return queues[zlib.crc32(execution_id.encode()) % len(queues)]
+
+
+def stamp_message(message, trace_id=None):
+    ''' adds the time the message is queued at and the trace it belongs to.
+    Messages published while handling another one continue its trace, a new
+    one starts if trace_id is not given '''
+    message['enqueued_at'] = time.time()
+    message['trace_id'] = trace_id or uuid.uuid4().hex
+
+    return message
+
+
 def clear_username(string):
     ''' because mongo usernames have special requirements '''
     string = string.strip()
@@ -1,18 +1,20 @@
-from collections import deque
+from collections import OrderedDict
 from datetime import datetime
-from jinja2 import Template, TemplateError
+from jinja2 import TemplateError
 from typing import TextIO, Callable
-from xml.dom import pulldom
 from xml.dom.minidom import Element
+from xml.parsers.expat import ExpatError
 import xml.dom.minidom as minidom
-from xml.sax._exceptions import SAXParseException
 import json
 import os
 import pika
+import threading
 
 from cacahuate.errors import ProcessNotFound, ElementNotFound, MalformedProcess
 from cacahuate.jsontypes import SortedMap
 from cacahuate.models import Execution, Pointer
+from cacahuate.templates import get_template
+from cacahuate.utils import get_queue, stamp_message
 
 XML_ATTRIBUTES = {
     'public': lambda a: a == 'true',
@@ -33,6 +35,168 @@ NODES = (
     'call',
 )
 
+# compiled processes indexed by file path, least recently used first
+_PROCESS_CACHE = OrderedDict()
+_PROCESS_CACHE_LOCK = threading.Lock()
+
+# process catalogs indexed by the directory they describe
+_CATALOGS = dict()
+_CATALOGS_LOCK = threading.Lock()
+
+
+class ProcessElement:
+    ''' A node element of a compiled process along with its position in the
+    block structure '''
+
+    def __init__(self, element, depth):
+        self.element = element
+        # number of <block> elements containing this node
+        self.depth = depth
+        # position in the node list right after this node's descendants
+        self.end = None
+
+
+class CompiledProcess:
+    ''' The in-memory representation of a process file. The file is parsed
+    only once and its node elements are laid out in document order so they can
+    be walked without touching the disk again. '''
+
+    def __init__(self, file_path, mtime):
+        self.file_path = file_path
+        self.mtime = mtime
+
+        try:
+            self.dom = minidom.parse(file_path)
+        except ExpatError:
+            raise MalformedProcess('{} is not valid xml'.format(
+                os.path.basename(file_path)
+            ))
+
+        root = self.dom.documentElement
+        children = [
+            child for child in root.childNodes
+            if child.nodeType == child.ELEMENT_NODE
+        ]
+
+        if len(root.getElementsByTagName('process-info')) == 0:
+            raise MalformedProcess('This process lacks the process-info node')
+
+        if children[0].tagName != 'process-info':
+            raise MalformedProcess('process-info node must be the first node')
+
+        self.info_node = children[0]
+
+        # node elements in document order and their position in that order
+        self.elements = []
+        self.positions = dict()
+        # node elements by id, the first node with a given id wins
+        self.node_elements = dict()
+
+        self.add_elements(root, 0)
+
+        # the element that follows each node by id, entering its block if it
+        # has one, and the one that follows it if its block is skipped, as
+        # in a conditional that evaluates to false. None means end of process.
+        # As in a search by id the first node with a given id wins
+        self.successors = dict()
+        self.skip_successors = dict()
+
+        for position, entry in reversed(list(enumerate(self.elements))):
+            node_id = entry.element.getAttribute('id')
+
+            self.successors[node_id] = self.following(
+                position + 1, entry.depth
+            )
+            self.skip_successors[node_id] = self.following(
+                entry.end, entry.depth
+            )
+
+        # built nodes, filled lazily by make_node
+        self.nodes = dict()
+
+        # positions of the nodes that depend on each field, filled lazily by
+        # get_dependents
+        self.dependents = None
+
+    def add_elements(self, parent, depth):
+        for child in parent.childNodes:
+            if child.nodeType != child.ELEMENT_NODE:
+                continue
+
+            if child.tagName == 'block':
+                self.add_elements(child, depth + 1)
+            elif child.tagName in NODES:
+                entry = ProcessElement(child, depth)
+
+                self.positions[child] = len(self.elements)
+                self.node_elements.setdefault(child.getAttribute('id'), child)
+                self.elements.append(entry)
+                self.add_elements(child, depth)
+
+                entry.end = len(self.elements)
+            else:
+                self.add_elements(child, depth)
+
+    def get_dependents(self, field):
+        ''' positions, in document order, of the actions and validations
+        with a dependency on the given field, written as form.input '''
+        if self.dependents is None:
+            dependents = dict()
+
+            for position, entry in enumerate(self.elements):
+                if entry.element.tagName not in ('action', 'validation'):
+                    continue
+
+                for dep in entry.element.getElementsByTagName('dep'):
+                    positions = dependents.setdefault(get_text(dep), [])
+
+                    if not positions or positions[-1] != position:
+                        positions.append(position)
+
+            self.dependents = dependents
+
+        return self.dependents.get(field, [])
+
+    def following(self, position, depth):
+        ''' returns the element found at `position` for a walk that was at the
+        given block depth. When the walk leaves a block the elif and else
+        branches found right after it are skipped '''
+        while position < len(self.elements):
+            entry = self.elements[position]
+
+            if entry.depth >= depth or \
+                    entry.element.tagName not in ('elif', 'else'):
+                return entry.element
+
+            position = entry.end
+
+        return None
+
+
+def get_compiled(file_path, cache_size):
+    ''' Returns the compiled version of the given process file, parsing it
+    only if it is not in the cache or it changed since it was compiled '''
+    mtime = os.stat(file_path).st_mtime_ns
+
+    with _PROCESS_CACHE_LOCK:
+        process = _PROCESS_CACHE.get(file_path)
+
+        if process is not None and process.mtime == mtime:
+            _PROCESS_CACHE.move_to_end(file_path)
+
+            return process
+
+    process = CompiledProcess(file_path, mtime)
+
+    with _PROCESS_CACHE_LOCK:
+        _PROCESS_CACHE[file_path] = process
+        _PROCESS_CACHE.move_to_end(file_path)
+
+        while len(_PROCESS_CACHE) > cache_size:
+            _PROCESS_CACHE.popitem(last=False)
+
+    return process
+
 
 class Xml:
 
@@ -47,14 +211,15 @@ class Xml:
         self.versions = [self.version]
         self.filename = filename
         self.config = config
-
         try:
-            info_node = self.get_info_node()
-        except StopIteration:
-            raise MalformedProcess('This process lacks the process-info node')
+            self.process = get_compiled(
+                self.get_file_path(),
+                config['XML_CACHE_SIZE'],
+            )
+        except FileNotFoundError:
+            raise ProcessNotFound(filename)
 
-        if info_node.tagName != 'process-info':
-            raise MalformedProcess('process-info node must be the first node')
+        info_node = self.get_info_node()
 
         for attr, func in XML_ATTRIBUTES.items():
             try:
@@ -70,7 +235,7 @@ class Xml:
         return os.path.join(self.config['XML_PATH'], self.filename)
 
     def get_dom(self):
-        return minidom.parse(self.get_file_path())
+        return self.process.dom
 
     # Interpolate name
     def get_name(self, collected_forms=[]):
@@ -84,7 +249,7 @@ class Xml:
             context[form['ref']] = form_dict
 
         try:
-            return Template(self._name).render(**context)
+            return get_template(self._name).render(**context)
         except TemplateError:
             return self.filename
 
@@ -105,7 +270,7 @@ class Xml:
             context[form['ref']] = form_dict
 
         try:
-            return Template(self._description).render(**context)
+            return get_template(self._description).render(**context)
         except TemplateError:
             return self._description
 
@@ -132,25 +297,13 @@ class Xml:
         except ValueError:
             name, version = common_name, None
 
-        files = reversed(sorted(os.listdir(config['XML_PATH'])))
-
-        for filename in files:
-            try:
-                fname, fversion, _ = filename.split('.')
-            except ValueError:
-                # Process with malformed name, sorry
-                continue
-
-            if fname == name:
-                if version:
-                    if fversion == version:
-                        return Xml(config, filename)
-                else:
-                    return Xml(config, filename)
+        filename = get_catalog(config).find(name, version)
 
-        else:
+        if filename is None:
             raise ProcessNotFound(common_name)
 
+        return Xml(config, filename)
+
     def start(self, node, input, mongo, channel, user_identifier):
         # save the data
         execution = Execution(
@@ -165,9 +318,11 @@ class Xml:
         ).save()
         pointer.proxy.execution.set(execution)
 
-        # log to mongo
+        # log to mongo. The execution keeps a copy of its latest pointer
+        pointer_entry = node.pointer_entry(execution, pointer)
+
         collection = mongo[self.config['POINTER_COLLECTION']]
-        collection.insert_one(node.pointer_entry(execution, pointer))
+        collection.insert_one(dict(pointer_entry))
 
         collection = mongo[self.config['EXECUTION_COLLECTION']]
         collection.insert_one({
@@ -181,18 +336,22 @@ class Xml:
             'state': self.get_state(),
             'values': {},
             'actors': {},
+            'actor_list': [],
+            'form_index': {},
+            'pointer': pointer_entry,
         })
 
         # trigger rabbit
         channel.basic_publish(
             exchange='',
-            routing_key=self.config['RABBIT_QUEUE'],
-            body=json.dumps({
+            routing_key=get_queue(self.config, execution.id),
+            body=json.dumps(stamp_message({
                 'command': 'step',
+                'execution_id': execution.id,
                 'pointer_id': pointer.id,
                 'user_identifier': user_identifier,
                 'input': input,
-            }),
+            })),
             properties=pika.BasicProperties(
                 delivery_mode=2,
             ),
@@ -203,9 +362,10 @@ class Xml:
     def make_iterator(xmlself, iterables):
         class Iter():
 
-            def __init__(self, file_path):
-                self.parser = pulldom.parse(open(file_path))
-                self.block_stack = deque()
+            def __init__(self, process):
+                self.process = process
+                self.position = 0
+                self.depth = 0
 
             def find(self, testfunc: Callable[[Element], bool]) -> Element:
                 ''' Given an interator returned by the previous function, tries
@@ -218,71 +378,66 @@ class Xml:
                     'node matching the given condition was not found'
                 )
 
-            def get_next_condition(self):
-                for event, node in self.parser:
-                    if event != pulldom.START_ELEMENT:
-                        continue
-
-                    if node.tagName != 'condition':
-                        raise ElementNotFound(
-                            'Requested a condition but found {}'.format(
-                                node.tagName
-                            )
-                        )
-
-                    self.parser.expandNode(node)
-
-                    return get_text(node)
-
-                raise ElementNotFound('Condition not found')
-
             def next_skipping_elifelse(self):
-                old_stack = len(self.block_stack)
+                old_depth = self.depth
                 proposed_next = next(self)
-                new_stack = len(self.block_stack)
+                new_depth = self.depth
 
-                if new_stack < old_stack:
+                if new_depth < old_depth:
                     while proposed_next.tagName in ('elif', 'else'):
-                        self.parser.expandNode(proposed_next)
+                        self.expand(proposed_next)
                         proposed_next = next(self)
 
                 return proposed_next
 
             def expand(self, node):
-                self.parser.expandNode(node)
+                ''' skips the nodes contained in the given one '''
+                position = self.process.positions.get(node)
+
+                if position is not None:
+                    self.position = self.process.elements[position].end
 
             def __next__(self):
-                try:
-                    for event, node in self.parser:
-                        if event == pulldom.END_ELEMENT and \
-                                node.tagName == 'block':
-                            self.block_stack.pop()
-                        if event == pulldom.START_ELEMENT:
-                            if node.tagName == 'block':
-                                self.block_stack.append(1)
-                            elif node.tagName in iterables:
-                                return node
-                except SAXParseException:
-                    raise MalformedProcess
+                elements = self.process.elements
+
+                while self.position < len(elements):
+                    entry = elements[self.position]
+                    self.position += 1
+
+                    if entry.element.tagName in iterables:
+                        self.depth = entry.depth
+
+                        return entry.element
 
                 raise StopIteration
 
             def __iter__(self):
                 return self
 
-        return Iter(xmlself.get_file_path())
+        return Iter(xmlself.process)
 
     def get_info_node(self):
-        xmliter = self.make_iterator('process-info')
-        info_node = next(xmliter)
-        xmliter.parser.expandNode(info_node)
+        return self.process.info_node
+
+    def get_element(self, node_id) -> Element:
+        ''' Returns the element of the node with the given id '''
+        try:
+            return self.process.node_elements[node_id]
+        except KeyError:
+            raise ElementNotFound(
+                'node {} was not found in {}'.format(node_id, self.filename)
+            )
+
+    def get_node(self, node_id):
+        ''' Returns the built node with the given id '''
+        from cacahuate.node import make_node  # noqa
 
-        return info_node
+        return make_node(self.get_element(node_id), iter(self))
 
     def __iter__(self):
         ''' Returns an inerator over the nodes and edges of a process defined
-        by the xmlfile descriptor. Uses XMLPullParser so no memory is consumed
-        for this task. '''
+        by the xmlfile descriptor. The file is read from the compiled process
+        so no parsing is done for this task. '''
         return self.make_iterator(NODES)
 
     def get_state(self):
@@ -298,47 +453,147 @@ class Xml:
 
         return SortedMap(items, key='id').to_json()
 
-    @classmethod
-    def list(cls, config):
-        # Get all processes
-        files = reversed(sorted(os.listdir(config['XML_PATH'])))
+    def get_start_forms(self):
+        ''' Returns the forms of the first node of this process '''
+        try:
+            first_node = next(iter(self))
+        except StopIteration:
+            return []
+
+        return list(map(
+            form_to_dict,
+            first_node.getElementsByTagName('form'),
+        ))
+
+    def to_json(self):
+        return {
+            'id': self.id,
+            'version': self.version,
+            'author': self.author,
+            'date': self.date,
+            'name': self.name,
+            'description': self.description,
+            'versions': self.versions,
+        }
+
+
+class ProcessCatalog:
+    ''' Keeps track of the process files found in a directory and the data
+    needed to list them. Files are only read again if they were added or
+    changed since the last time the directory was scanned '''
+
+    def __init__(self, config):
+        self.config = config
+        self.path = config['XML_PATH']
+        self.lock = threading.Lock()
+
+        # filename -> (mtime, listing entry or None)
+        self.entries = dict()
+        # process id -> filenames of its versions, newest first
+        self.versions = dict()
+        self.process_list = []
+
+    def refresh(self):
+        ''' scans the directory and reloads the files that changed '''
+        found = dict()
+
+        with os.scandir(self.path) as files:
+            for dir_entry in files:
+                if dir_entry.is_file():
+                    found[dir_entry.name] = dir_entry.stat().st_mtime_ns
+
+        with self.lock:
+            changed = False
+
+            for filename in list(self.entries):
+                if filename not in found:
+                    del self.entries[filename]
+                    changed = True
 
-        # Load only the oldest processes
-        processes = []
+            for filename, mtime in found.items():
+                current = self.entries.get(filename)
 
-        for filename in files:
+                if current is not None and current[0] == mtime:
+                    continue
+
+                self.entries[filename] = (mtime, self.make_entry(filename))
+                changed = True
+
+            if changed:
+                self.rebuild()
+
+    def make_entry(self, filename):
+        ''' builds the json used to list this process, None if it should not
+        be listed '''
+        try:
+            xml = Xml(self.config, filename)
+        except ProcessNotFound:
+            # removed after the directory was scanned
+            return None
+        except MalformedProcess:
+            return None
+
+        if not xml.public:
+            return None
+
+        return {
+            **xml.to_json(),
+            'form_array': xml.get_start_forms(),
+        }
+
+    def rebuild(self):
+        versions = dict()
+        process_list = []
+
+        for filename in sorted(self.entries, reverse=True):
             try:
                 id, version, _ = filename.split('.')
             except ValueError:
+                # Process with malformed name, sorry
                 continue
 
-            try:
-                xml = cls.load(config, filename, direct=True)
-            except ProcessNotFound:
-                continue
-            except MalformedProcess:
-                continue
+            versions.setdefault(id, []).append(filename)
 
-            if not xml.public:
+            entry = self.entries[filename][1]
+
+            if entry is None:
                 continue
 
-            if len(processes) == 0 or processes[-1].id != id:
-                processes.append(xml)
+            if len(process_list) == 0 or process_list[-1]['id'] != id:
+                process_list.append({**entry, 'versions': [version]})
             else:
-                processes[-1].versions.append(version)
+                process_list[-1]['versions'].append(version)
 
-        return processes
+        self.versions = versions
+        self.process_list = process_list
 
-    def to_json(self):
-        return {
-            'id': self.id,
-            'version': self.version,
-            'author': self.author,
-            'date': self.date,
-            'name': self.name,
-            'description': self.description,
-            'versions': self.versions,
-        }
+    def find(self, name, version=None):
+        ''' returns the filename of the given version of a process or of its
+        latest version if None is given '''
+        self.refresh()
+
+        for filename in self.versions.get(name, []):
+            if version is None or filename.split('.')[1] == version:
+                return filename
+
+    def get_process_list(self):
+        ''' returns the json of the latest version of every public process,
+        listing its versions and the forms of its first node '''
+        self.refresh()
+
+        return self.process_list
+
+
+def get_catalog(config):
+    ''' returns the process catalog of the configured XML_PATH '''
+    with _CATALOGS_LOCK:
+        catalog = _CATALOGS.get(config['XML_PATH'])
+
+        if catalog is None:
+            catalog = ProcessCatalog(config)
+            _CATALOGS[config['XML_PATH']] = catalog
+
+    return catalog
 
 
 def get_node_info(node):
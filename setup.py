@@ -55,6 +55,7 @@ setup(
             'cacahuated = cacahuate.main:main',
             'xml_validate = cacahuate.main:xml_validate',
             'rng_path = cacahuate.main:rng_path',
+            'cacahuate_migrate = cacahuate.main:migrate',
         ],
     },
 
@@ -68,7 +69,7 @@ setup(
         'itacate',
         'lark-parser >= 0.6',
         'ldap3',
-        'pika',
+        'pika >= 0.12, < 1.0',
         'simplejson',
         'requests',
         'passlib',
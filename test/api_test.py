@@ -1,7 +1,9 @@
+from bson import json_util
 from datetime import datetime
 from flask import json
 from random import choice
 from string import ascii_letters
+import base64
 import pika
 
 from cacahuate.handler import Handler
@@ -11,7 +13,7 @@ from cacahuate.node import Form
 from cacahuate.jsontypes import SortedMap, Map
 
 from .utils import make_auth, make_pointer, make_user, make_date
-from .utils import assert_near_date
+from .utils import assert_near_date, unstamp
 
 EXECUTION_ID = '15asbs'
 
@@ -211,6 +213,7 @@ def test_continue_process(client, mocker, config):
 
     json_message = {
         'command': 'step',
+        'execution_id': ptr.execution,
         'pointer_id': ptr.id,
         'user_identifier': 'juan_manager',
         'input': [Form.state_json('mid_form', [
@@ -228,7 +231,7 @@ def test_continue_process(client, mocker, config):
 
     assert args['exchange'] == ''
     assert args['routing_key'] == config['RABBIT_QUEUE']
-    body = json.loads(args['body'])
+    body = unstamp(args['body'])
     assert body == json_message
 
     # makes a useful call for the handler
@@ -354,6 +357,7 @@ def test_start_process(client, mocker, config, mongo):
 
     json_message = {
         'command': 'step',
+        'execution_id': ptr.execution,
         'pointer_id': ptr.id,
         'user_identifier': 'juan',
         'input': [Form.state_json('start_form', [
@@ -371,7 +375,7 @@ def test_start_process(client, mocker, config, mongo):
 
     assert args['exchange'] == ''
     assert args['routing_key'] == config['RABBIT_QUEUE']
-    assert json.loads(args['body']) == json_message
+    assert unstamp(args['body']) == json_message
 
     handler = Handler(config)
 
@@ -390,9 +394,11 @@ def test_start_process(client, mocker, config, mongo):
     reg = next(mongo[config["EXECUTION_COLLECTION"]].find())
 
     assert_near_date(reg['started_at'])
+    assert_near_date(reg['pointer']['started_at'])
 
     del reg['started_at']
     del reg['_id']
+    del reg['pointer']['started_at']
 
     assert reg == {
         '_type': 'execution',
@@ -458,6 +464,33 @@ def test_start_process(client, mocker, config, mongo):
         },
         'values': {},
         'actors': {},
+        'form_index': {},
+        'actor_list': [],
+        'pointer': {
+            'id': ptr.id,
+            'node': {
+                'id': 'start_node',
+                'type': 'action',
+                'name': 'Primer paso',
+                'description': 'Resolver una tarea',
+            },
+            'process_id': 'simple.2018-02-19.xml',
+            'execution': {
+                '_type': 'execution',
+                'id': exc.id,
+                'name': exc.name,
+                'process_name': exc.process_name,
+                'description': exc.description,
+            },
+            'state': 'ongoing',
+            'finished_at': None,
+            'actors': {
+                '_type': ':map',
+                'items': {},
+            },
+            'notified_users': [],
+            'candidate_list': [],
+        },
     }
 
 
@@ -639,8 +672,9 @@ def test_validation_approval(client, mocker, config):
 
     assert args['exchange'] == ''
     assert args['routing_key'] == config['RABBIT_QUEUE']
-    assert json.loads(args['body']) == {
+    assert unstamp(args['body']) == {
         'command': 'step',
+        'execution_id': ptr.execution,
         'pointer_id': ptr.id,
         'user_identifier': 'juan',
         'input': [Form.state_json('approval_node', [
@@ -695,8 +729,9 @@ def test_validation_reject(client, mocker, config):
 
     assert args['exchange'] == ''
     assert args['routing_key'] == config['RABBIT_QUEUE']
-    assert json.loads(args['body']) == {
+    assert unstamp(args['body']) == {
         'command': 'step',
+        'execution_id': ptr.execution,
         'pointer_id': ptr.id,
         'user_identifier': 'juan',
         'input': [Form.state_json('approval_node', [
@@ -886,7 +921,7 @@ def test_patch_just_invalidate(client, mongo, config, mocker):
 
     assert args['exchange'] == ''
     assert args['routing_key'] == config['RABBIT_QUEUE']
-    body = json.loads(args['body'])
+    body = unstamp(args['body'])
     assert body == json_message
 
 
@@ -964,7 +999,7 @@ def test_patch_set_value(client, mongo, config, mocker):
 
     assert args['exchange'] == ''
     assert args['routing_key'] == config['RABBIT_QUEUE']
-    body = json.loads(args['body'])
+    body = unstamp(args['body'])
     assert body == json_message
 
 
@@ -1143,10 +1178,10 @@ def test_data_mix(mongo, client, config):
 
     # Execution collection
     mongo[config["EXECUTION_COLLECTION"]].insert_many([
-        exec_01_json.copy(),
-        exec_02_json.copy(),
-        exec_03_json.copy(),
-        exec_04_json.copy(),
+        {**exec_01_json, 'pointer': ptr_01_json.copy()},
+        {**exec_02_json, 'pointer': ptr_02_json.copy()},
+        {**exec_03_json, 'pointer': ptr_03_json.copy()},
+        {**exec_04_json, 'pointer': ptr_04_json.copy()},
     ])
 
     # clean pointers
@@ -1223,10 +1258,10 @@ def test_data_mix_pagination(mongo, client, config):
 
     # Execution collection
     mongo[config["EXECUTION_COLLECTION"]].insert_many([
-        exec_01_json.copy(),
-        exec_02_json.copy(),
-        exec_03_json.copy(),
-        exec_04_json.copy(),
+        {**exec_01_json, 'pointer': ptr_01_json.copy()},
+        {**exec_02_json, 'pointer': ptr_02_json.copy()},
+        {**exec_03_json, 'pointer': ptr_03_json.copy()},
+        {**exec_04_json, 'pointer': ptr_04_json.copy()},
     ])
 
     # clean pointers
@@ -1289,7 +1324,7 @@ def test_data_mix_pointer_unique(mongo, client, config):
 
     # Execution collection
     mongo[config["EXECUTION_COLLECTION"]].insert_many([
-        exec_01_json.copy(),
+        {**exec_01_json, 'pointer': ptr_01_json.copy()},
     ])
 
     # clean pointers
@@ -1387,8 +1422,8 @@ def test_data_mix_filter_pointer_key(mongo, client, config):
 
     # Execution collection
     mongo[config["EXECUTION_COLLECTION"]].insert_many([
-        exec_01_json.copy(),
-        exec_02_json.copy(),
+        {**exec_01_json, 'pointer': ptr_01_json.copy()},
+        {**exec_02_json, 'pointer': ptr_02_json.copy()},
     ])
 
     # clean pointers
@@ -1411,6 +1446,54 @@ def test_data_mix_filter_pointer_key(mongo, client, config):
     }
 
 
+def test_data_mix_filter_pointer_key_any_pointer(mongo, client, config):
+    started = {
+        'id': 'ptr_01',
+        'node_id': 'start_node',
+        'started_at': '2018-04-01T21:45:00+00:00',
+        'execution': {
+            'id': EXECUTION_ID,
+        },
+    }
+    latest = {
+        'id': 'ptr_02',
+        'node_id': 'mid_node',
+        'started_at': '2018-04-01T21:46:00+00:00',
+        'execution': {
+            'id': EXECUTION_ID,
+        },
+    }
+
+    mongo[config["POINTER_COLLECTION"]].insert_many([
+        started.copy(),
+        latest.copy(),
+    ])
+    mongo[config["EXECUTION_COLLECTION"]].insert_one({
+        'id': EXECUTION_ID,
+        'started_at': '2018-04-01T21:45:00+00:00',
+        'pointer': latest.copy(),
+    })
+
+    # the filter matches an older pointer, the latest one is shown
+    res = client.get('/v1/inbox?pointer.node_id=start_node')
+
+    assert res.status_code == 200
+    assert json.loads(res.data)['data'] == [{
+        'id': EXECUTION_ID,
+        'started_at': '2018-04-01T21:45:00+00:00',
+        'pointer': {
+            'id': 'ptr_02',
+            'node_id': 'mid_node',
+            'started_at': '2018-04-01T21:46:00+00:00',
+        },
+    }]
+
+    res = client.get('/v1/inbox?pointer.node_id=final_node')
+
+    assert res.status_code == 200
+    assert json.loads(res.data)['data'] == []
+
+
 def test_data_mix_filter_exclude_pointer_key(mongo, client, config):
     # Create pointers
 
@@ -1444,8 +1527,8 @@ def test_data_mix_filter_exclude_pointer_key(mongo, client, config):
 
     # Execution collection
     mongo[config["EXECUTION_COLLECTION"]].insert_many([
-        exec_01_json.copy(),
-        exec_02_json.copy(),
+        {**exec_01_json, 'pointer': ptr_01_json.copy()},
+        {**exec_02_json, 'pointer': ptr_02_json.copy()},
     ])
 
     # clean pointers
@@ -1504,8 +1587,8 @@ def test_data_mix_filter_include_pointer_key(mongo, client, config):
 
     # Execution collection
     mongo[config["EXECUTION_COLLECTION"]].insert_many([
-        exec_01_json.copy(),
-        exec_02_json.copy(),
+        {**exec_01_json, 'pointer': ptr_01_json.copy()},
+        {**exec_02_json, 'pointer': ptr_02_json.copy()},
     ])
 
     # clean pointers
@@ -1539,9 +1622,6 @@ def test_data_mix_filter_user_identifier(mongo, client, config):
     ptr_03 = make_pointer('exit_request.2018-03-20.xml', 'requester')
     ptr_04 = make_pointer('validation.2018-05-09.xml', 'approval_node')
 
-    # set some tasks to user
-    juan.proxy.tasks.set([ptr_02, ptr_03])
-
     ptr_01_json = ptr_01.to_json(include=['*', 'execution'])
     ptr_02_json = ptr_02.to_json(include=['*', 'execution'])
     ptr_03_json = ptr_03.to_json(include=['*', 'execution'])
@@ -1553,6 +1633,10 @@ def test_data_mix_filter_user_identifier(mongo, client, config):
     ptr_03_json['started_at'] = '2018-04-01T21:47:00+00:00'
     ptr_04_json['started_at'] = '2018-04-01T21:48:00+00:00'
 
+    # set some tasks to user
+    ptr_02_json['candidate_list'] = [juan.identifier]
+    ptr_03_json['candidate_list'] = [juan.identifier]
+
     # Pointer collection
     mongo[config["POINTER_COLLECTION"]].insert_many([
         ptr_01_json.copy(),
@@ -1568,9 +1652,6 @@ def test_data_mix_filter_user_identifier(mongo, client, config):
     exec_03 = ptr_03.proxy.execution.get()
     exec_04 = ptr_04.proxy.execution.get()
 
-    # set some activities to user
-    juan.proxy.activities.set([exec_01, exec_04])
-
     exec_01_json = exec_01.to_json()
     exec_02_json = exec_02.to_json()
     exec_03_json = exec_03.to_json()
@@ -1582,12 +1663,16 @@ def test_data_mix_filter_user_identifier(mongo, client, config):
     exec_03_json['started_at'] = '2018-04-01T21:47:00+00:00'
     exec_04_json['started_at'] = '2018-04-01T21:48:00+00:00'
 
+    # set some activities to user
+    exec_01_json['actor_list'] = [juan.identifier]
+    exec_04_json['actor_list'] = [juan.identifier]
+
     # Execution collection
     mongo[config["EXECUTION_COLLECTION"]].insert_many([
-        exec_01_json.copy(),
-        exec_02_json.copy(),
-        exec_03_json.copy(),
-        exec_04_json.copy(),
+        {**exec_01_json, 'pointer': ptr_01_json.copy()},
+        {**exec_02_json, 'pointer': ptr_02_json.copy()},
+        {**exec_03_json, 'pointer': ptr_03_json.copy()},
+        {**exec_04_json, 'pointer': ptr_04_json.copy()},
     ])
 
     # clean pointers
@@ -1649,7 +1734,7 @@ def test_data_mix_filter_include(mongo, client, config):
 
     # Execution collection
     mongo[config["EXECUTION_COLLECTION"]].insert_many([
-        exec_01_json.copy(),
+        {**exec_01_json, 'pointer': ptr_01_json.copy()},
     ])
 
     # clean pointers
@@ -1707,7 +1792,7 @@ def test_data_mix_filter_exclude(mongo, client, config):
 
     # Execution collection
     mongo[config["EXECUTION_COLLECTION"]].insert_many([
-        exec_01_json.copy(),
+        {**exec_01_json, 'pointer': ptr_01_json.copy()},
     ])
 
     # clean pointers
@@ -1764,7 +1849,7 @@ def test_data_mix_filter_include_exlcude(mongo, client, config):
 
     # Execution collection
     mongo[config["EXECUTION_COLLECTION"]].insert_many([
-        exec_01_json.copy(),
+        {**exec_01_json, 'pointer': ptr_01_json.copy()},
     ])
 
     # clean pointers
@@ -1791,46 +1876,36 @@ def test_data_mix_filter_include_exlcude(mongo, client, config):
 
 
 def test_logs_all(mongo, client, config):
-    mongo[config["POINTER_COLLECTION"]].insert_many([
-        {
-            'started_at': datetime(2018, 4, 1, 21, 45),
-            'finished_at': None,
-            'execution': {
-                'id': EXECUTION_ID,
-            },
-            'node': {
-                'id': 'first_node',
-            },
-        },
+    mongo[config["EXECUTION_COLLECTION"]].insert_many([
         {
-            'started_at': datetime(2018, 4, 1, 21, 46),
-            'finished_at': None,
-            'execution': {
-                'id': EXECUTION_ID,
-            },
-            'node': {
-                'id': 'mid_node',
+            'id': EXECUTION_ID,
+            'pointer': {
+                'started_at': datetime(2018, 4, 1, 21, 46),
+                'finished_at': None,
+                'execution': {
+                    'id': EXECUTION_ID,
+                },
+                'node': {
+                    'id': 'mid_node',
+                },
             },
         },
         {
-            'started_at': datetime(2018, 4, 1, 21, 45),
-            'finished_at': None,
-            'execution': {
-                'id': 'xxxxffff',
-            },
-            'node': {
-                'id': 'mid_node',
+            'id': 'xxxxffff',
+            'pointer': {
+                'started_at': datetime(2018, 4, 1, 21, 45),
+                'finished_at': None,
+                'execution': {
+                    'id': 'xxxxffff',
+                },
+                'node': {
+                    'id': 'mid_node',
+                },
             },
         },
         {
-            'started_at': datetime(2018, 4, 1, 21, 44),
-            'finished_at': None,
-            'execution': {
-                'id': EXECUTION_ID,
-            },
-            'node': {
-                'id': 'another_node',
-            },
+            'id': 'ffffxxxx',
+            'pointer': None,
         },
     ])
 
@@ -1873,8 +1948,6 @@ def test_logs_filter_user(mongo, client, config):
     ptr_03 = make_pointer('exit_request.2018-03-20.xml', 'requester')
     ptr_04 = make_pointer('validation.2018-05-09.xml', 'approval_node')
 
-    juan.proxy.tasks.set([ptr_01, ptr_02, ptr_04])
-
     ptr_01_json = ptr_01.to_json(include=['*', 'execution'])
     ptr_02_json = ptr_02.to_json(include=['*', 'execution'])
     ptr_03_json = ptr_03.to_json(include=['*', 'execution'])
@@ -1885,11 +1958,13 @@ def test_logs_filter_user(mongo, client, config):
     ptr_02_json['started_at'] = '2018-04-01T21:46:00+00:00'
     ptr_04_json['started_at'] = '2018-04-01T21:48:00+00:00'
 
-    mongo[config["POINTER_COLLECTION"]].insert_many([
-        ptr_01_json.copy(),
-        ptr_02_json.copy(),
-        ptr_03_json.copy(),
-        ptr_04_json.copy(),
+    # set some tasks to user
+    for ptr in [ptr_01_json, ptr_02_json, ptr_04_json]:
+        ptr['candidate_list'] = [juan.identifier]
+
+    mongo[config["EXECUTION_COLLECTION"]].insert_many([
+        {'id': ptr['execution']['id'], 'pointer': ptr.copy()}
+        for ptr in [ptr_01_json, ptr_02_json, ptr_03_json, ptr_04_json]
     ])
 
     res = client.get('/v1/log?user_identifier={}'.format(juan.identifier))
@@ -1912,11 +1987,12 @@ def test_logs_filter_user_invalid(mongo, client, config):
     ptr_03 = make_pointer('exit_request.2018-03-20.xml', 'requester')
     ptr_04 = make_pointer('validation.2018-05-09.xml', 'approval_node')
 
-    mongo[config["POINTER_COLLECTION"]].insert_many([
-        ptr_01.to_json(include=['*', 'execution']),
-        ptr_02.to_json(include=['*', 'execution']),
-        ptr_03.to_json(include=['*', 'execution']),
-        ptr_04.to_json(include=['*', 'execution']),
+    mongo[config["EXECUTION_COLLECTION"]].insert_many([
+        {
+            'id': ptr.proxy.execution.get().id,
+            'pointer': ptr.to_json(include=['*', 'execution']),
+        }
+        for ptr in [ptr_01, ptr_02, ptr_03, ptr_04]
     ])
 
     res = client.get('/v1/log?user_identifier=foo')
@@ -1977,14 +2053,17 @@ def test_logs_filter_key_valid(mongo, client, config):
 
 
 def test_logs_filter_key_invalid(mongo, client, config):
-    mongo[config["POINTER_COLLECTION"]].insert_one({
-        'started_at': datetime(2018, 4, 1, 21, 45),
-        'finished_at': None,
-        'execution': {
-            'id': EXECUTION_ID,
-        },
-        'node': {
-            'id': 'mid_node',
+    mongo[config["EXECUTION_COLLECTION"]].insert_one({
+        'id': EXECUTION_ID,
+        'pointer': {
+            'started_at': datetime(2018, 4, 1, 21, 45),
+            'finished_at': None,
+            'execution': {
+                'id': EXECUTION_ID,
+            },
+            'node': {
+                'id': 'mid_node',
+            },
         },
     })
 
@@ -2237,6 +2316,75 @@ def test_task_validation(client, mongo, config):
     }
 
 
+def test_task_validation_form_index(client, mongo, config):
+    ptr = make_pointer('validation.2018-05-09.xml', 'approval_node')
+    juan = make_user('juan', 'Juan')
+    juan.proxy.tasks.add(ptr)
+    execution = ptr.proxy.execution.get()
+
+    state = Xml.load(config, 'validation.2018-05-09').get_state()
+    node = state['items']['start_node']
+
+    node['state'] = 'valid'
+    node['actors']['items']['juan'] = {
+        '_type': 'actor',
+        'state': 'valid',
+        'user': {
+            '_type': 'user',
+            'identifier': 'juan',
+            'fullname': None,
+        },
+        'forms': [Form.state_json('work', [
+            {
+                '_type': 'field',
+                'state': 'valid',
+                'label': 'task',
+                'name': 'task',
+                'value': 'Get some milk and eggs',
+            },
+        ])],
+    }
+
+    # only the forms in the index are looked at, stale entries are skipped
+    mongo[config["EXECUTION_COLLECTION"]].insert_one({
+        '_type': 'execution',
+        'id': execution.id,
+        'state': state,
+        'form_index': {
+            'work': {
+                'start_node': {
+                    'juan': [0, 1],
+                    'pedro': [0],
+                },
+            },
+        },
+    })
+
+    res = client.get('/v1/task/{}'.format(ptr.id), headers=make_auth(juan))
+    body = json.loads(res.data)['data']
+
+    assert res.status_code == 200
+    assert body['fields'] == [
+        {
+            '_type': 'field',
+            'ref': 'start_node.juan.0:work.task',
+            'label': 'task',
+            'name': 'task',
+            'value': 'Get some milk and eggs',
+        },
+    ]
+
+    mongo[config["EXECUTION_COLLECTION"]].update_one({
+        'id': execution.id,
+    }, {
+        '$set': {'form_index': {}},
+    })
+
+    res = client.get('/v1/task/{}'.format(ptr.id), headers=make_auth(juan))
+
+    assert json.loads(res.data)['data']['fields'] == []
+
+
 def test_task_with_prev_work(client, config, mongo):
     ptr = make_pointer('validation-multiform.2018-05-22.xml', 'start_node')
     juan = make_user('juan', 'Juan')
@@ -2400,7 +2548,7 @@ def test_delete_process(config, client, mongo, mocker):
 
     assert args['exchange'] == ''
     assert args['routing_key'] == config['RABBIT_QUEUE']
-    assert json.loads(args['body']) == {
+    assert unstamp(args['body']) == {
         'execution_id': execution.id,
         'command': 'cancel',
     }
@@ -2519,8 +2667,6 @@ def test_execution_filter_user(mongo, client, config):
     exec_03 = ptr_03.proxy.execution.get()
     exec_04 = ptr_04.proxy.execution.get()
 
-    juan.proxy.activities.set([exec_01, exec_02, exec_04])
-
     exec_01_json = exec_01.to_json()
     exec_02_json = exec_02.to_json()
     exec_03_json = exec_03.to_json()
@@ -2531,6 +2677,10 @@ def test_execution_filter_user(mongo, client, config):
     exec_02_json['started_at'] = '2018-04-01T21:46:00+00:00'
     exec_04_json['started_at'] = '2018-04-01T21:48:00+00:00'
 
+    # set some activities to user
+    for item in [exec_01_json, exec_02_json, exec_04_json]:
+        item['actor_list'] = [juan.identifier]
+
     mongo[config["EXECUTION_COLLECTION"]].insert_many([
         exec_01_json.copy(),
         exec_02_json.copy(),
@@ -2552,6 +2702,46 @@ def test_execution_filter_user(mongo, client, config):
     }
 
 
+def test_execution_filter_user_finished(mongo, client, config):
+    juan = make_user('juan', 'Juan')
+    handler = Handler(config)
+
+    ptr_01 = make_pointer('simple.2018-02-19.xml', 'mid_node')
+    ptr_02 = make_pointer('simple.2018-02-19.xml', 'mid_node')
+
+    exec_01 = ptr_01.proxy.execution.get()
+    exec_02 = ptr_02.proxy.execution.get()
+
+    for execution in [exec_01, exec_02]:
+        mongo[config["EXECUTION_COLLECTION"]].insert_one({
+            'id': execution.id,
+            'status': 'ongoing',
+            'started_at': '2018-04-01T21:45:00+00:00',
+            'actor_list': [juan.identifier],
+        })
+
+    res = client.get(f'/v1/execution?user_identifier={juan.identifier}')
+
+    assert res.status_code == 200
+    assert len(json.loads(res.data)['data']) == 2
+
+    handler.finish_execution(exec_01)
+    handler.cancel_execution({
+        'execution_id': exec_02.id,
+    })
+
+    # finished and cancelled executions are not listed for their actors
+    res = client.get(f'/v1/execution?user_identifier={juan.identifier}')
+
+    assert res.status_code == 200
+    assert json.loads(res.data)['data'] == []
+
+    res = client.get(f'/v1/inbox?user_identifier={juan.identifier}')
+
+    assert res.status_code == 200
+    assert json.loads(res.data)['data'] == []
+
+
 def test_execution_filter_value_invalid(client, mongo, config):
 
     res = client.get('/v1/execution?one_key=foo')
@@ -3029,18 +3219,21 @@ def test_pagination_v1_log_all(client, mongo, config):
 
     def make_node_reg(exec_id, process_id, node_id, started_at, finished_at):
         return {
-            'started_at': started_at,
-            'finished_at': finished_at,
-            'execution': {
-                'id': exec_id,
-            },
-            'node': {
-                'id': node_id,
+            'id': exec_id,
+            'pointer': {
+                'started_at': started_at,
+                'finished_at': finished_at,
+                'execution': {
+                    'id': exec_id,
+                },
+                'node': {
+                    'id': node_id,
+                },
+                'process_id': process_id
             },
-            'process_id': process_id
         }
 
-    mongo[config["POINTER_COLLECTION"]].insert_many([
+    mongo[config["EXECUTION_COLLECTION"]].insert_many([
         make_node_reg(
             'aaaaaaaa',
             'simple.2018-02-19', 'mid_node',
@@ -3083,6 +3276,140 @@ def test_pagination_v1_log_all(client, mongo, config):
     assert len(json.loads(res.data)['data']) == 2
 
 
+def test_pagination_execution_cursor(client, mongo, config):
+    mongo[config["EXECUTION_COLLECTION"]].insert_many([
+        {'id': 'a', 'started_at': make_date(2018, 5, 20)},
+        {'id': 'b', 'started_at': make_date(2018, 5, 21)},
+        {'id': 'c', 'started_at': make_date(2018, 5, 21)},
+        {'id': 'd', 'started_at': make_date(2018, 5, 22)},
+        {'id': 'e', 'started_at': make_date(2018, 5, 23)},
+    ])
+
+    ids = []
+    cursor = ''
+
+    while cursor is not None:
+        res = client.get('/v1/execution?limit=2&cursor={}'.format(cursor))
+        assert res.status_code == 200
+
+        body = json.loads(res.data)
+        ids += [item['id'] for item in body['data']]
+        cursor = body['next']
+
+    assert ids == ['e', 'd', 'c', 'b', 'a']
+
+
+def test_pagination_v1_log_all_cursor(client, mongo, config):
+    mongo[config["EXECUTION_COLLECTION"]].insert_many([
+        {
+            'id': exec_id,
+            'pointer': {
+                'id': 'ptr_' + exec_id,
+                'started_at': make_date(2018, 5, day),
+            },
+        }
+        for day, exec_id in enumerate(['a', 'b', 'c'], 20)
+    ])
+
+    res = client.get('/v1/log?limit=2&cursor=')
+    body = json.loads(res.data)
+
+    assert [item['id'] for item in body['data']] == ['ptr_c', 'ptr_b']
+
+    res = client.get('/v1/log?limit=2&cursor={}'.format(body['next']))
+    body = json.loads(res.data)
+
+    assert [item['id'] for item in body['data']] == ['ptr_a']
+    assert body['next'] is None
+
+
+def test_pagination_inbox_cursor_include(client, mongo, config):
+    mongo[config["EXECUTION_COLLECTION"]].insert_many([
+        {'id': 'a', 'name': 'A', 'started_at': make_date(2018, 5, 20)},
+        {'id': 'b', 'name': 'B', 'started_at': make_date(2018, 5, 21)},
+    ])
+
+    res = client.get('/v1/inbox?include=name&limit=1&cursor=')
+    body = json.loads(res.data)
+
+    assert body['data'] == [{'name': 'B'}]
+
+    res = client.get('/v1/inbox?include=name&limit=1&cursor={}'.format(
+        body['next'],
+    ))
+
+    assert json.loads(res.data)['data'] == [{'name': 'A'}]
+
+
+def test_pagination_invalid_cursor(client):
+    res = client.get('/v1/execution?cursor=foo')
+
+    assert res.status_code == 400
+    assert json.loads(res.data) == {
+        'errors': [{
+            'detail': 'cursor is not valid',
+            'where': 'request.args.cursor',
+        }],
+    }
+
+
+def test_pagination_tampered_cursor(client, mongo, config):
+    mongo[config["EXECUTION_COLLECTION"]].insert_one({
+        'id': 'a', 'started_at': make_date(2018, 5, 20),
+    })
+
+    tampered = [
+        ({'$gt': ''}, 'a'),
+        (make_date(2018, 5, 20), {'$ne': None}),
+        ('2018-05-20', 'a'),
+        (make_date(2018, 5, 20), 1),
+    ]
+
+    for value, id in tampered:
+        cursor = base64.urlsafe_b64encode(
+            json_util.dumps([value, id]).encode()
+        ).decode()
+
+        res = client.get('/v1/execution?cursor={}'.format(cursor))
+
+        assert res.status_code == 400
+        assert json.loads(res.data) == {
+            'errors': [{
+                'detail': 'cursor is not valid',
+                'where': 'request.args.cursor',
+            }],
+        }
+
+
+def test_pagination_inbox_cursor_pointer_filter(client, mongo, config):
+    mongo[config["EXECUTION_COLLECTION"]].insert_many([
+        {'id': 'a', 'name': 'A', 'started_at': make_date(2018, 5, 20)},
+        {'id': 'b', 'name': 'B', 'started_at': make_date(2018, 5, 21)},
+        {'id': 'c', 'name': 'C', 'started_at': make_date(2018, 5, 22)},
+    ])
+    mongo[config["POINTER_COLLECTION"]].insert_many([
+        {'id': 'ptr_a', 'node_id': 'mid_node', 'execution': {'id': 'a'}},
+        {'id': 'ptr_b', 'node_id': 'start_node', 'execution': {'id': 'b'}},
+        {'id': 'ptr_c', 'node_id': 'mid_node', 'execution': {'id': 'c'}},
+    ])
+
+    names = []
+    cursor = ''
+
+    while cursor is not None:
+        res = client.get(
+            '/v1/inbox?pointer.node_id=mid_node&include=name&limit=1'
+            '&cursor={}'.format(cursor)
+        )
+        assert res.status_code == 200
+
+        body = json.loads(res.data)
+        names += body['data']
+        cursor = body['next']
+
+    assert names == [{'name': 'C'}, {'name': 'A'}]
+
+
 def test_name_with_if(client, mongo, config):
     xml = Xml.load(config, 'pollo')
     assert xml.name == 'pollo.2018-05-20.xml'
@@ -0,0 +1,52 @@
+from cacahuate.batch import WriteBatch
+
+
+def test_batch_writes(config, mongo):
+    batch = WriteBatch(mongo)
+    collection = batch[config['EXECUTION_COLLECTION']]
+
+    collection.insert_one({'id': 'foo', 'state': 'ongoing'})
+    collection.update_one({'id': 'foo'}, {'$set': {'state': 'finished'}})
+    batch[config['POINTER_COLLECTION']].insert_one({'id': 'bar'})
+
+    # nothing was sent yet
+    assert mongo[config['EXECUTION_COLLECTION']].count_documents({}) == 0
+    assert batch.round_trips == 0
+
+    # reading sends the pending writes first
+    doc = collection.find_one({'id': 'foo'})
+
+    assert doc['state'] == 'finished'
+    assert mongo[config['POINTER_COLLECTION']].count_documents({}) == 1
+    assert batch.round_trips == 3
+
+
+def test_batch_update_many(config, mongo):
+    mongo[config['POINTER_COLLECTION']].insert_many([
+        {'id': 'foo', 'state': 'ongoing'},
+        {'id': 'bar', 'state': 'ongoing'},
+    ])
+    batch = WriteBatch(mongo)
+
+    batch[config['POINTER_COLLECTION']].update_many({}, {
+        '$set': {'state': 'cancelled'},
+    })
+    batch.flush()
+
+    assert mongo[config['POINTER_COLLECTION']].count_documents({
+        'state': 'cancelled',
+    }) == 2
+    assert batch.round_trips == 1
+
+
+def test_batch_copies_documents(config, mongo):
+    batch = WriteBatch(mongo)
+    doc = {'id': 'foo', 'actors': {'juan': 'valid'}}
+
+    batch[config['EXECUTION_COLLECTION']].insert_one(doc)
+    doc['actors']['juan'] = 'invalid'
+    batch.flush()
+
+    assert mongo[config['EXECUTION_COLLECTION']].find_one()['actors'] == {
+        'juan': 'valid',
+    }
@@ -0,0 +1,60 @@
+import re
+
+from benchmarks.generator import write
+from benchmarks.replay import make_config, percentile, run
+from cacahuate.main import xml_validate
+
+
+def test_percentile():
+    values = [5, 1, 4, 2, 3]
+
+    assert percentile(values, 50) == 3
+    assert percentile(values, 99) == 5
+    assert percentile([], 50) is None
+
+
+def test_replay():
+    config = make_config()
+    processes = ['simple.2018-02-19.xml', 'request.2018-05-18.xml']
+
+    report = run(config, processes, executions=2, seed=1)
+    again = run(config, processes, executions=2, seed=1)
+
+    assert report['skipped'] == {}
+
+    for name in processes:
+        summary = report['processes'][name]
+
+        assert summary['executions'] == 2
+        assert summary['finished'] == 2
+        assert summary['errors'] == 0
+        assert summary['steps'] > 0
+        assert summary['mongo_per_step'] > 0
+
+        # the same seed replays the same work
+        for key in ('steps', 'mongo_per_step', 'redis_per_step',
+                    'rabbit_per_step'):
+            assert again['processes'][name][key] == summary[key]
+
+
+def test_generator(tmpdir):
+    filename = write(
+        str(tmpdir), 'synthetic', nodes=40, depth=2, forms=2, inputs=2,
+        dependency_density=.3, seed=2,
+    )
+
+    # exits if there are errors
+    xml_validate([filename])
+
+    with open(filename) as f:
+        assert len(re.findall(
+            r'<(action|validation|if|elif|else) ', f.read(),
+        )) == 40
+
+    report = run(
+        make_config(str(tmpdir)), executions=2, seed=2, reject_rate=.3,
+    )
+
+    assert report['skipped'] == {}
+    assert report['total']['errors'] == 0
+    assert report['total']['steps'] > 0
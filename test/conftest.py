@@ -61,8 +61,10 @@ def bind_models(config):
 def client():
     ''' makes and returns a testclient for the flask application '''
     from cacahuate.http.wsgi import app
+    from cacahuate.tokens import get_token_cache
 
     app.config.from_mapping(TESTING_SETTINGS)
+    get_token_cache().clear()
 
     return app.test_client()
 
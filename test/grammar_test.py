@@ -1,4 +1,5 @@
 from cacahuate.grammar import Condition, ConditionTransformer
+from cacahuate.grammar import compile_condition
 
 
 def test_condition():
@@ -118,3 +119,45 @@ def test_everything():
         '!!3<0 OR !(form.input == "0" AND ("da" != "de"))'
     )
     assert ConditionTransformer(values).transform(tree) is True
+
+
+def test_compiled_condition():
+    values = {
+        'form': {
+            'input': 'no',
+            'number': 3,
+        },
+    }
+
+    for string in [
+        'form.input == "no"',
+        'form.input != "no"',
+        'form.number > 2 && form.number <= 3',
+        '!!3<0 || !(form.input == "0" && ("da" != "de"))',
+        '!!3<0 OR !(form.input == "0" AND ("da" != "de"))',
+        '!form.number < 0',
+    ]:
+        tree = Condition().parse(string)
+        expected = ConditionTransformer(values).transform(tree)
+
+        assert compile_condition(string)(values) is expected
+
+
+def test_compiled_condition_short_circuits():
+    values = {
+        'set': {
+            'A': True,
+            'B': False,
+        },
+    }
+
+    # the right side would raise KeyError if evaluated
+    assert compile_condition('set.A || missing.input')(values) is True
+    assert compile_condition('set.B && missing.input')(values) is False
+
+    assert compile_condition('set.B || set.B || set.A')(values) is True
+    assert compile_condition('set.A && set.A && set.B')(values) is False
+
+
+def test_compiled_condition_is_cached():
+    assert compile_condition('set.A == 1') is compile_condition('set.A == 1')
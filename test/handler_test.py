@@ -4,11 +4,16 @@ import simplejson as json
 import requests
 
 from cacahuate.handler import Handler
+from cacahuate.metrics import COMMAND_SECONDS, MONGO_ROUND_TRIPS
+from cacahuate.metrics import QUEUE_WAIT_SECONDS
+from cacahuate.offload import get_offloader
 from cacahuate.models import Execution, Pointer, User
 from cacahuate.node import Action, Form
+from cacahuate.utils import stamp_message
 from cacahuate.xml import Xml
 
 from .utils import make_pointer, make_user, assert_near_date, random_string
+from .utils import unstamp
 
 
 def test_recover_step(config):
@@ -122,12 +127,16 @@ def test_wakeup(config, mongo):
         'items': {},
     }
     assert reg['notified_users'] == [manager.to_json()]
+    assert reg['candidate_list'] == [manager.identifier]
     assert reg['state'] == 'ongoing'
 
     # execution collection updated
+    pointer_reg = next(mongo[config["POINTER_COLLECTION"]].find())
+    del pointer_reg['_id']
     reg = next(mongo[config["EXECUTION_COLLECTION"]].find())
 
     assert reg['state']['items']['mid_node']['state'] == 'ongoing'
+    assert reg['pointer'] == pointer_reg
 
     # tasks where asigned
     assert manager.proxy.tasks.count() == 1
@@ -168,6 +177,12 @@ def test_teardown(config, mongo):
         'actors': {
             'start_node': 'juan',
         },
+        'form_index': {},
+        'pointer': {
+            'id': p_0.id,
+            'state': 'ongoing',
+            'finished_at': None,
+        },
     })
 
     mongo[config["POINTER_COLLECTION"]].insert_one({
@@ -330,6 +345,20 @@ def test_teardown(config, mongo):
         'mid_node': 'manager',
     }
 
+    assert reg['form_index'] == {
+        'mid_form': {
+            'mid_node': {
+                'manager': [0],
+            },
+        },
+    }
+
+    assert reg['actor_list'] == ['manager']
+
+    # the execution keeps the pointer of the next node
+    assert reg['pointer']['node']['id'] == 'final_node'
+    assert reg['pointer']['state'] == 'ongoing'
+
     assert manager in execution.proxy.actors
     assert execution in manager.proxy.activities
 
@@ -360,7 +389,7 @@ def test_finish_execution(config, mongo):
 def test_call_handler_delete_process(config, mongo):
     handler = Handler(config)
     channel = MagicMock()
-    method = {'delivery_tag': True}
+    method = MagicMock(delivery_tag=1)
     properties = ""
     pointer = make_pointer('simple.2018-02-19.xml', 'requester')
     execution_id = pointer.proxy.execution.get().id
@@ -371,9 +400,17 @@ def test_call_handler_delete_process(config, mongo):
         'started_at': datetime(2018, 4, 1, 21, 45),
         'finished_at': None,
         'status': 'ongoing',
-        'id': execution_id
+        'id': execution_id,
+        'pointer': {
+            'id': pointer.id,
+            'state': 'ongoing',
+            'candidate_list': ['juan'],
+        },
     })
 
+    handled = COMMAND_SECONDS.get_count(command='cancel')
+    round_trips = MONGO_ROUND_TRIPS.get(command='cancel')
+
     handler(channel, method, properties, body)
 
     reg = next(mongo[config["EXECUTION_COLLECTION"]].find())
@@ -381,10 +418,79 @@ def test_call_handler_delete_process(config, mongo):
     assert reg['id'] == execution_id
     assert reg['status'] == "cancelled"
     assert_near_date(reg['finished_at'])
+    assert reg['pointer'] == {
+        'id': pointer.id,
+        'state': 'cancelled',
+        'candidate_list': [],
+    }
 
     assert Execution.count() == 0
     assert Pointer.count() == 0
 
+    channel.basic_ack.assert_called_once_with(delivery_tag=1)
+
+    assert COMMAND_SECONDS.get_count(command='cancel') == handled + 1
+
+    # one bulk write for each collection
+    assert MONGO_ROUND_TRIPS.get(command='cancel') == round_trips + 2
+
+
+def test_pointer_timings(config, mongo):
+    config['POINTER_TIMINGS'] = True
+    handler = Handler(config)
+    user = make_user('juan', 'Juan')
+    ptr = make_pointer('validation.2018-05-09.xml', 'approval_node')
+    channel = MagicMock()
+
+    mongo[config["POINTER_COLLECTION"]].insert_one({
+        'id': ptr.id,
+        'execution': {
+            'id': ptr.proxy.execution.get().id,
+        },
+    })
+
+    mongo[config["EXECUTION_COLLECTION"]].insert_one({
+        '_type': 'execution',
+        'id': ptr.proxy.execution.get().id,
+        'state': Xml.load(config, 'validation.2018-05-09').get_state(),
+        'actors': {
+            'start_node': 'juan',
+        },
+    })
+
+    handled = QUEUE_WAIT_SECONDS.get_count(command='step')
+
+    handler.handle(stamp_message({
+        'command': 'step',
+        'pointer_id': ptr.id,
+        'user_identifier': user.identifier,
+        'input': [Form.state_json('approval_node', [
+            {
+                'name': 'response',
+                'value': 'accept',
+            },
+            {
+                'name': 'comment',
+                'value': 'I like it',
+            },
+            {
+                'name': 'inputs',
+                'value': [{
+                    'ref': 'start_node.juan.0.task',
+                }],
+            },
+        ])],
+    }, 'the_trace'), channel)
+
+    reg = next(mongo[config["POINTER_COLLECTION"]].find({'id': ptr.id}))
+
+    assert reg['timings']['trace_id'] == 'the_trace'
+    assert_near_date(reg['timings']['enqueued_at'])
+    assert reg['timings']['queue_wait'] >= 0
+    assert reg['timings']['processing'] >= 0
+
+    assert QUEUE_WAIT_SECONDS.get_count(command='step') == handled + 1
+
 
 def test_approve(config, mongo):
     ''' tests that a validation node can go forward on approval '''
@@ -578,6 +684,7 @@ def test_reject(config, mongo):
     }))
 
     del state['_id']
+    assert state.pop('pointer')['id'] == new_ptr.id
 
     assert state == {
         '_type': 'execution',
@@ -688,6 +795,7 @@ def test_reject(config, mongo):
         'actors': {
             'approval_node': 'juan',
         },
+        'actor_list': ['juan'],
     }
 
     # mongo has the data
@@ -885,6 +993,7 @@ def test_reject_with_dependencies(config, mongo):
     }))
 
     del state['_id']
+    assert state.pop('pointer')['state'] == 'finished'
     del state['finished_at']
 
     assert state == {
@@ -1077,6 +1186,7 @@ def test_reject_with_dependencies(config, mongo):
             'node4': 'juan',
             'node5': 'juan',
         },
+        'actor_list': [],
     }
 
 
@@ -1376,6 +1486,7 @@ def test_true_condition_node(config, mongo):
     args = channel.basic_publish.call_args[1]
     rabbit_call = {
         'command': 'step',
+        'execution_id': ptr.execution,
         'pointer_id': ptr.id,
         'input': [Form.state_json('condition1', [
             {
@@ -1388,7 +1499,7 @@ def test_true_condition_node(config, mongo):
         ])],
         'user_identifier': '__system__',
     }
-    assert json.loads(args['body']) == rabbit_call
+    assert unstamp(args['body']) == rabbit_call
 
     handler.call(rabbit_call, channel)
 
@@ -1435,6 +1546,7 @@ def test_false_condition_node(config, mongo):
     args = channel.basic_publish.call_args[1]
     rabbit_call = {
         'command': 'step',
+        'execution_id': ptr.execution,
         'pointer_id': ptr.id,
         'input': [Form.state_json('condition1', [
             {
@@ -1446,7 +1558,7 @@ def test_false_condition_node(config, mongo):
         ])],
         'user_identifier': '__system__',
     }
-    assert json.loads(args['body']) == rabbit_call
+    assert unstamp(args['body']) == rabbit_call
 
     handler.call(rabbit_call, channel)
 
@@ -1456,6 +1568,51 @@ def test_false_condition_node(config, mongo):
     assert ptr.node_id == 'condition2'
 
 
+def test_chained_sync_nodes(config, mongo):
+    ''' sync nodes are executed right away up to SYNC_CHAIN_LIMIT '''
+    # test setup
+    config['SYNC_CHAIN_LIMIT'] = 5
+    handler = Handler(config)
+    user = make_user('juan', 'Juan')
+    ptr = make_pointer('condition.2018-05-17.xml', 'start_node')
+    execution = ptr.proxy.execution.get()
+    channel = MagicMock()
+
+    mongo[config["EXECUTION_COLLECTION"]].insert_one({
+        '_type': 'execution',
+        'id': execution.id,
+        'state': Xml.load(config, 'condition').get_state(),
+    })
+
+    handler.call({
+        'command': 'step',
+        'pointer_id': ptr.id,
+        'user_identifier': user.identifier,
+        'input': [Form.state_json('mistery', [
+            {
+                'name': 'password',
+                'type': 'text',
+                'value': 'abrete sésamo',
+            },
+        ])],
+    }, channel)
+
+    # pointer moved through the condition without queueing it
+    assert Pointer.get(ptr.id) is None
+    ptr = Pointer.get_all()[0]
+    assert ptr.node_id == 'mistical_node'
+
+    for call in channel.basic_publish.call_args_list:
+        assert call[1]['exchange'] == config['RABBIT_NOTIFY_EXCHANGE']
+
+    reg = next(mongo[config["EXECUTION_COLLECTION"]].find())
+
+    assert reg['state']['items']['condition1']['state'] == 'valid'
+    assert reg['values']['condition1'] == {
+        'condition': True,
+    }
+
+
 def test_anidated_conditions(config, mongo):
     ''' conditional node won't be executed if its condition is false '''
     # test setup
@@ -1491,6 +1648,7 @@ def test_anidated_conditions(config, mongo):
     args = channel.basic_publish.call_args[1]
     rabbit_call = {
         'command': 'step',
+        'execution_id': ptr.execution,
         'pointer_id': ptr.id,
         'input': [Form.state_json('outer', [
             {
@@ -1502,7 +1660,7 @@ def test_anidated_conditions(config, mongo):
         ])],
         'user_identifier': '__system__',
     }
-    assert json.loads(args['body']) == rabbit_call
+    assert unstamp(args['body']) == rabbit_call
 
     handler.call(rabbit_call, channel)
 
@@ -1532,6 +1690,7 @@ def test_anidated_conditions(config, mongo):
     args = channel.basic_publish.call_args[1]
     rabbit_call = {
         'command': 'step',
+        'execution_id': ptr.execution,
         'pointer_id': ptr.id,
         'input': [Form.state_json('inner1', [
             {
@@ -1544,7 +1703,7 @@ def test_anidated_conditions(config, mongo):
         ])],
         'user_identifier': '__system__',
     }
-    assert json.loads(args['body']) == rabbit_call
+    assert unstamp(args['body']) == rabbit_call
 
     handler.call(rabbit_call, channel)
 
@@ -1606,6 +1765,7 @@ def test_ifelifelse_if(config, mongo):
     args = channel.basic_publish.call_args[1]
     rabbit_call = {
         'command': 'step',
+        'execution_id': ptr.execution,
         'pointer_id': ptr.id,
         'input': [Form.state_json('condition01', [
             {
@@ -1617,7 +1777,7 @@ def test_ifelifelse_if(config, mongo):
         ])],
         'user_identifier': '__system__',
     }
-    assert json.loads(args['body']) == rabbit_call
+    assert unstamp(args['body']) == rabbit_call
 
     channel = MagicMock()
     handler.call(rabbit_call, channel)
@@ -1687,6 +1847,7 @@ def test_ifelifelse_elif(config, mongo):
     args = channel.basic_publish.call_args[1]
     rabbit_call = {
         'command': 'step',
+        'execution_id': ptr.execution,
         'pointer_id': ptr.id,
         'input': [Form.state_json('condition01', [
             {
@@ -1699,7 +1860,7 @@ def test_ifelifelse_elif(config, mongo):
         ])],
         'user_identifier': '__system__',
     }
-    assert json.loads(args['body']) == rabbit_call
+    assert unstamp(args['body']) == rabbit_call
 
     channel = MagicMock()
     handler.call(rabbit_call, channel)
@@ -1714,6 +1875,7 @@ def test_ifelifelse_elif(config, mongo):
     args = channel.basic_publish.call_args[1]
     rabbit_call = {
         'command': 'step',
+        'execution_id': ptr.execution,
         'pointer_id': ptr.id,
         'input': [Form.state_json('elif01', [
             {
@@ -1726,7 +1888,7 @@ def test_ifelifelse_elif(config, mongo):
         ])],
         'user_identifier': '__system__',
     }
-    assert json.loads(args['body']) == rabbit_call
+    assert unstamp(args['body']) == rabbit_call
 
     channel = MagicMock()
     handler.call(rabbit_call, channel)
@@ -1796,6 +1958,7 @@ def test_ifelifelse_else(config, mongo):
     args = channel.basic_publish.call_args[1]
     rabbit_call = {
         'command': 'step',
+        'execution_id': ptr.execution,
         'pointer_id': ptr.id,
         'input': [Form.state_json('condition01', [
             {
@@ -1808,7 +1971,7 @@ def test_ifelifelse_else(config, mongo):
         ])],
         'user_identifier': '__system__',
     }
-    assert json.loads(args['body']) == rabbit_call
+    assert unstamp(args['body']) == rabbit_call
 
     channel = MagicMock()
     handler.call(rabbit_call, channel)
@@ -1823,6 +1986,7 @@ def test_ifelifelse_else(config, mongo):
     args = channel.basic_publish.call_args[1]
     rabbit_call = {
         'command': 'step',
+        'execution_id': ptr.execution,
         'pointer_id': ptr.id,
         'input': [Form.state_json('elif01', [
             {
@@ -1834,7 +1998,7 @@ def test_ifelifelse_else(config, mongo):
         ])],
         'user_identifier': '__system__',
     }
-    assert json.loads(args['body']) == rabbit_call
+    assert unstamp(args['body']) == rabbit_call
 
     channel = MagicMock()
     handler.call(rabbit_call, channel)
@@ -1849,6 +2013,7 @@ def test_ifelifelse_else(config, mongo):
     args = channel.basic_publish.call_args[1]
     rabbit_call = {
         'command': 'step',
+        'execution_id': ptr.execution,
         'pointer_id': ptr.id,
         'input': [Form.state_json('else01', [
             {
@@ -1860,7 +2025,7 @@ def test_ifelifelse_else(config, mongo):
         ])],
         'user_identifier': '__system__',
     }
-    assert json.loads(args['body']) == rabbit_call
+    assert unstamp(args['body']) == rabbit_call
 
     channel = MagicMock()
     handler.call(rabbit_call, channel)
@@ -1920,8 +2085,9 @@ def test_exit_interaction(config, mongo):
 
     assert args['exchange'] == ''
     assert args['routing_key'] == config['RABBIT_QUEUE']
-    assert json.loads(args['body']) == {
+    assert unstamp(args['body']) == {
         'command': 'step',
+        'execution_id': ptr.execution,
         'pointer_id': ptr.id,
         'user_identifier': '__system__',
         'input': [],
@@ -1944,6 +2110,7 @@ def test_exit_interaction(config, mongo):
     }))
 
     del state['_id']
+    assert state.pop('pointer')['state'] == 'finished'
     del state['finished_at']
 
     assert state == {
@@ -2026,6 +2193,7 @@ def test_exit_interaction(config, mongo):
             'exit': '__system__',
             'start_node': 'juan',
         },
+        'actor_list': [],
     }
 
 
@@ -2067,8 +2235,9 @@ def test_call_node(config, mongo):
 
     assert args['exchange'] == ''
     assert args['routing_key'] == config['RABBIT_QUEUE']
-    assert json.loads(args['body']) == {
+    assert unstamp(args['body']) == {
         'command': 'step',
+        'execution_id': new_ptr.execution,
         'pointer_id': new_ptr.id,
         'user_identifier': '__system__',
         'input': [Form.state_json('start_form', [
@@ -2089,8 +2258,9 @@ def test_call_node(config, mongo):
 
     assert args['exchange'] == ''
     assert args['routing_key'] == config['RABBIT_QUEUE']
-    assert json.loads(args['body']) == {
+    assert unstamp(args['body']) == {
         'command': 'step',
+        'execution_id': ptr.execution,
         'pointer_id': ptr.id,
         'user_identifier': '__system__',
         'input': [],
@@ -2131,9 +2301,10 @@ def test_handle_request_node(config, mocker, mongo):
     mock = MagicMock(return_value=ResponseMock())
 
     mocker.patch(
-        'requests.request',
+        'requests.Session.request',
         new=mock
     )
+    mocker.patch('cacahuate.node.time').monotonic.side_effect = [10, 10.25]
 
     handler = Handler(config)
     user = make_user('juan', 'Juan')
@@ -2165,8 +2336,8 @@ def test_handle_request_node(config, mocker, mongo):
     assert ptr.node_id == 'request_node'
 
     # assert requests is called
-    requests.request.assert_called_once()
-    args, kwargs = requests.request.call_args
+    requests.Session.request.assert_called_once()
+    args, kwargs = requests.Session.request.call_args
 
     assert args[0] == 'GET'
     assert args[1] == 'http://localhost/mirror?data=' + value
@@ -2176,6 +2347,7 @@ def test_handle_request_node(config, mocker, mongo):
         'content-type': 'application/json',
         'x-url-data': value,
     }
+    assert kwargs['timeout'] == (5, 2.5)
 
     # aditional rabbit call for new process
     args = channel.basic_publish.call_args_list[0][1]
@@ -2199,12 +2371,22 @@ def test_handle_request_node(config, mocker, mongo):
             'hidden': False,
             'label': 'Response',
         },
+        {
+            'name': 'elapsed',
+            'state': 'valid',
+            'type': 'float',
+            'value': 0.25,
+            'value_caption': '0.250',
+            'hidden': True,
+            'label': 'Elapsed seconds',
+        },
     ])]
 
     assert args['exchange'] == ''
     assert args['routing_key'] == config['RABBIT_QUEUE']
-    assert json.loads(args['body']) == {
+    assert unstamp(args['body']) == {
         'command': 'step',
+        'execution_id': ptr.execution,
         'pointer_id': ptr.id,
         'user_identifier': '__system__',
         'input': expected_inputs,
@@ -2248,6 +2430,210 @@ def test_handle_request_node(config, mocker, mongo):
     }
 
 
+def test_offload_request_node(config, mocker, mongo):
+    class ResponseMock:
+        status_code = 200
+        text = 'request response'
+
+    mocker.patch(
+        'requests.Session.request',
+        new=MagicMock(return_value=ResponseMock()),
+    )
+    mocker.patch('cacahuate.offload._OFFLOADER', None)
+    config['OFFLOAD_WORKERS'] = 2
+
+    handler = Handler(config)
+    user = make_user('juan', 'Juan')
+    ptr = make_pointer('request.2018-05-18.xml', 'start_node')
+    channel = MagicMock()
+    execution = ptr.proxy.execution.get()
+
+    mongo[config["EXECUTION_COLLECTION"]].insert_one({
+        '_type': 'execution',
+        'id': execution.id,
+        'state': Xml.load(config, 'request').get_state(),
+    })
+
+    offloaded = handler.handle({
+        'command': 'step',
+        'pointer_id': ptr.id,
+        'user_identifier': user.identifier,
+        'input': [Form.state_json('request', [
+            {
+                'name': 'data',
+                'value': 'foo',
+            },
+        ])],
+    }, channel, 1)
+
+    ptr = execution.proxy.pointers.get()[0]
+    assert ptr.node_id == 'request_node'
+
+    # the work is asked for with a message of its own, so it is not lost if
+    # the process dies before it is done
+    assert offloaded is False
+    channel.basic_publish.assert_called_once()
+    message = json.loads(channel.basic_publish.call_args[1]['body'])
+
+    assert message['command'] == 'retry'
+    assert message['pointer_id'] == ptr.id
+    assert message['attempt'] == 0
+
+    # the offloader publishes and acknowledges through the loop's channel
+    offloader = get_offloader(config)
+    offloader.channel = MagicMock()
+
+    assert handler.handle(message, channel, 2) is True
+
+    # wait for the request
+    offloader.shutdown()
+
+    # the handler didn't publish the next step, the offloader did
+    channel.basic_publish.assert_called_once()
+    channel.basic_ack.assert_not_called()
+
+    assert [call[0] for call in offloader.channel.method_calls] == [
+        'queue_declare', 'basic_publish', 'basic_ack',
+    ]
+    assert offloader.channel.basic_ack.call_args[1] == {'delivery_tag': 2}
+
+    publish = offloader.channel.basic_publish
+    message = json.loads(publish.call_args[1]['body'])
+
+    assert message['command'] == 'step'
+    assert message['pointer_id'] == ptr.id
+    assert message['execution_id'] == execution.id
+    assert message['input'][0]['inputs']['items']['status_code'][
+        'value'
+    ] == 200
+
+
+def test_retry_request_node(config, mocker, mongo):
+    class ResponseMock:
+        status_code = 200
+        text = 'request response'
+
+    mock = mocker.patch(
+        'requests.Session.request',
+        new=MagicMock(side_effect=requests.exceptions.ConnectionError()),
+    )
+    config['REQUEST_RETRIES'] = 2
+
+    handler = Handler(config)
+    user = make_user('juan', 'Juan')
+    ptr = make_pointer('request.2018-05-18.xml', 'start_node')
+    channel = MagicMock()
+    execution = ptr.proxy.execution.get()
+
+    mongo[config["EXECUTION_COLLECTION"]].insert_one({
+        '_type': 'execution',
+        'id': execution.id,
+        'state': Xml.load(config, 'request').get_state(),
+    })
+
+    handler.call({
+        'command': 'step',
+        'pointer_id': ptr.id,
+        'user_identifier': user.identifier,
+        'input': [Form.state_json('request', [
+            {
+                'name': 'data',
+                'value': 'foo',
+            },
+        ])],
+    }, channel)
+
+    ptr = execution.proxy.pointers.get()[0]
+    assert ptr.node_id == 'request_node'
+
+    # a retry is scheduled instead of moving on
+    channel.queue_declare.assert_called_once_with(
+        queue='cacahuate_process.retry.1000',
+        durable=True,
+        arguments={
+            'x-message-ttl': 1000,
+            'x-dead-letter-exchange': '',
+            'x-dead-letter-routing-key': 'cacahuate_process',
+            'x-expires': 61000,
+        },
+    )
+    args = channel.basic_publish.call_args[1]
+    message = json.loads(args['body'])
+    trace_id = message['trace_id']
+
+    assert args['routing_key'] == 'cacahuate_process.retry.1000'
+    assert unstamp(args['body']) == {
+        'command': 'retry',
+        'execution_id': execution.id,
+        'pointer_id': ptr.id,
+        'attempt': 1,
+    }
+
+    # second failure waits twice as much
+    channel = MagicMock()
+    handler.handle(message, channel)
+
+    args = channel.basic_publish.call_args[1]
+    message = json.loads(args['body'])
+
+    assert args['routing_key'] == 'cacahuate_process.retry.2000'
+    assert message['attempt'] == 2
+    assert message['trace_id'] == trace_id
+
+    # third time is the charm
+    mock.side_effect = None
+    mock.return_value = ResponseMock()
+    channel = MagicMock()
+    handler.handle(message, channel)
+
+    assert Pointer.get(ptr.id) is not None
+    args = channel.basic_publish.call_args[1]
+    message = json.loads(args['body'])
+
+    assert args['routing_key'] == config['RABBIT_QUEUE']
+    assert message['command'] == 'step'
+    assert message['pointer_id'] == ptr.id
+    assert message['trace_id'] == trace_id
+    assert message['input'][0]['inputs']['items']['status_code'][
+        'value'
+    ] == 200
+
+
+def test_retries_exhausted(config, mocker, mongo):
+    mocker.patch(
+        'requests.Session.request',
+        new=MagicMock(side_effect=requests.exceptions.ConnectionError()),
+    )
+    config['REQUEST_RETRIES'] = 2
+
+    handler = Handler(config)
+    ptr = make_pointer('request.2018-05-18.xml', 'request_node')
+    execution = ptr.proxy.execution.get()
+    channel = MagicMock()
+
+    mongo[config["EXECUTION_COLLECTION"]].insert_one({
+        '_type': 'execution',
+        'id': execution.id,
+        'state': Xml.load(config, 'request').get_state(),
+        'values': {},
+    })
+
+    handler.handle({
+        'command': 'retry',
+        'execution_id': execution.id,
+        'pointer_id': ptr.id,
+        'attempt': 2,
+    }, channel)
+
+    # the failure is recorded and the execution moves on
+    message = json.loads(channel.basic_publish.call_args[1]['body'])
+
+    assert message['command'] == 'step'
+    assert message['input'][0]['inputs']['items']['status_code'][
+        'value'
+    ] == 0
+
+
 def test_invalidate_all_nodes(config, mongo):
     handler = Handler(config)
     user = make_user('juan', 'Juan')
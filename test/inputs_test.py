@@ -6,7 +6,7 @@ import pytest
 from cacahuate.models import Execution
 from cacahuate.node import Form
 
-from .utils import make_auth, make_user, assert_near_date
+from .utils import make_auth, make_user, assert_near_date, unstamp
 
 
 def test_all_inputs(client, config, mongo, mocker):
@@ -147,7 +147,7 @@ def test_all_inputs(client, config, mongo, mocker):
 
     assert args['exchange'] == ''
     assert args['routing_key'] == config['RABBIT_QUEUE']
-    body = json.loads(args['body'])
+    body = unstamp(args['body'])
     assert body['input'][0]['inputs']['items'] == json_message
 
 
@@ -685,6 +685,7 @@ def test_hidden_input(client, mocker, config, mongo):
 
     json_message = {
         'command': 'step',
+        'execution_id': ptr.execution,
         'pointer_id': ptr.id,
         'user_identifier': 'juan',
         'input': [Form.state_json('start_form', [
@@ -700,7 +701,7 @@ def test_hidden_input(client, mocker, config, mongo):
         ])],
     }
 
-    assert json.loads(args['body']) == json_message
+    assert unstamp(args['body']) == json_message
 
 
 def test_link_input_none(client):
@@ -1,7 +1,175 @@
-from cacahuate.loop import Loop
+from pika.adapters.blocking_connection import BlockingChannel
+from pika.adapters.blocking_connection import BlockingConnection
+from unittest.mock import MagicMock, create_autospec
+import simplejson as json
+import threading
+
+from cacahuate.loop import Loop, WorkerPool
 
 
 def test_import(config):
     loop = Loop(config)
 
     assert loop
+
+
+def test_shard_loop_consumes(config, mocker):
+    config['RABBIT_QUEUE_SHARDS'] = 2
+    config['HANDLER_WORKERS'] = 2
+
+    # the specs fail if the calls don't match the installed pika
+    connection = create_autospec(BlockingConnection, instance=True)
+    channel = create_autospec(BlockingChannel, instance=True)
+    connection.channel.return_value = channel
+    mocker.patch('pika.BlockingConnection', return_value=connection)
+
+    Loop(config, 1).start()
+
+    channel.queue_declare.assert_called_once_with(
+        queue='cacahuate_process.1',
+        durable=True,
+    )
+    channel.basic_qos.assert_called_once_with(prefetch_count=2)
+
+    args, kwargs = channel.basic_consume.call_args
+
+    assert isinstance(args[0], WorkerPool)
+    assert kwargs == {
+        'queue': 'cacahuate_process.1',
+        'consumer_tag': 'cacahuate_consumer_1.1',
+        'no_ack': False,
+        'exclusive': True,
+    }
+    channel.start_consuming.assert_called_once()
+
+
+def test_worker_pool(config, mocker):
+    config['HANDLER_WORKERS'] = 4
+    handled = []
+    lock = threading.Lock()
+
+    def handle(self, message, channel, delivery_tag=None):
+        with lock:
+            handled.append((message['execution_id'], message['n']))
+
+    mocker.patch('cacahuate.handler.Handler.handle', handle)
+    mocker.patch('pika.BlockingConnection')
+
+    connection = MagicMock()
+    connection.add_callback_threadsafe.side_effect = lambda f: f()
+    channel = MagicMock()
+    pool = WorkerPool(config, connection, channel)
+
+    for tag, (execution_id, n) in enumerate([
+        ('a', 0), ('b', 0), ('a', 1), ('a', 2), ('b', 1),
+    ]):
+        pool(channel, MagicMock(delivery_tag=tag), None, json.dumps({
+            'command': 'step',
+            'execution_id': execution_id,
+            'n': n,
+        }))
+
+    pool.shutdown()
+
+    # messages of the same execution keep their order
+    assert [n for e, n in handled if e == 'a'] == [0, 1, 2]
+    assert [n for e, n in handled if e == 'b'] == [0, 1]
+
+    # all of them were acknowledged
+    assert sorted(
+        call[1]['delivery_tag'] for call in channel.basic_ack.call_args_list
+    ) == [0, 1, 2, 3, 4]
+    assert pool.lanes == {}
+
+
+def test_worker_pool_runs_executions_concurrently(config, mocker):
+    config['HANDLER_WORKERS'] = 2
+    # both messages must be in the handler at the same time to pass it
+    barrier = threading.Barrier(2, timeout=5)
+    passed = []
+
+    def handle(self, message, channel, delivery_tag=None):
+        barrier.wait()
+        passed.append(message['execution_id'])
+
+    mocker.patch('cacahuate.handler.Handler.handle', handle)
+
+    connection = MagicMock()
+    connection.add_callback_threadsafe.side_effect = lambda f: f()
+    channel = MagicMock()
+    pool = WorkerPool(config, connection, channel)
+
+    for tag, execution_id in enumerate(['a', 'b']):
+        pool(channel, MagicMock(delivery_tag=tag), None, json.dumps({
+            'command': 'step',
+            'execution_id': execution_id,
+        }))
+
+    pool.shutdown()
+
+    assert sorted(passed) == ['a', 'b']
+
+
+def test_worker_pool_publishes_through_consumer(config, mocker):
+    config['HANDLER_WORKERS'] = 2
+
+    def handle(self, message, channel, delivery_tag=None):
+        channel.basic_publish(exchange='', routing_key='q', body='next')
+
+    mocker.patch('cacahuate.handler.Handler.handle', handle)
+    blocking_connection = mocker.patch('pika.BlockingConnection')
+
+    # callbacks wait for the connection's thread
+    callbacks = []
+    connection = MagicMock()
+    connection.add_callback_threadsafe.side_effect = callbacks.append
+    channel = MagicMock()
+    pool = WorkerPool(config, connection, channel)
+
+    pool(channel, MagicMock(delivery_tag=7), None, json.dumps({
+        'command': 'step',
+        'execution_id': 'a',
+    }))
+    pool.shutdown()
+
+    # workers don't open connections of their own, which the broker would
+    # close once they are idle for longer than the heartbeat
+    blocking_connection.assert_not_called()
+    channel.basic_publish.assert_not_called()
+
+    for callback in callbacks:
+        callback()
+
+    # the message is published before it is acknowledged
+    assert [call[0] for call in channel.method_calls] == [
+        'basic_publish', 'basic_ack',
+    ]
+    assert channel.basic_ack.call_args[1] == {'delivery_tag': 7}
+
+
+def test_worker_pool_leaves_offloaded_messages(config, mocker):
+    config['HANDLER_WORKERS'] = 2
+
+    def handle(self, message, channel, delivery_tag=None):
+        # the offloader acknowledges it once the work is done
+        return message['offloaded']
+
+    mocker.patch('cacahuate.handler.Handler.handle', handle)
+
+    connection = MagicMock()
+    connection.add_callback_threadsafe.side_effect = lambda f: f()
+    channel = MagicMock()
+    pool = WorkerPool(config, connection, channel)
+
+    for tag, offloaded in enumerate([True, False]):
+        pool(channel, MagicMock(delivery_tag=tag), None, json.dumps({
+            'command': 'retry',
+            'execution_id': 'a',
+            'offloaded': offloaded,
+        }))
+
+    pool.shutdown()
+
+    assert [
+        call[1]['delivery_tag'] for call in channel.basic_ack.call_args_list
+    ] == [1]
@@ -0,0 +1,81 @@
+from unittest.mock import MagicMock
+from urllib.request import urlopen
+
+from cacahuate.metrics import Counter, Histogram, CountingChannel
+from cacahuate.metrics import RABBIT_OPERATIONS, REGISTRY, expose
+from cacahuate.metrics import start_server
+
+
+def test_counter():
+    counter = Counter('test_counter_total', 'A counter', ['command'])
+
+    try:
+        counter.inc(command='step')
+        counter.inc(2, command='step')
+        counter.inc(command='cancel')
+
+        assert counter.get(command='step') == 3
+        assert counter.get(command='patch') == 0
+
+        text = expose()
+
+        assert '# TYPE test_counter_total counter' in text
+        assert 'test_counter_total{command="step"} 3' in text
+        assert 'test_counter_total{command="cancel"} 1' in text
+    finally:
+        REGISTRY.remove(counter)
+
+
+def test_histogram():
+    histogram = Histogram(
+        'test_seconds', 'A histogram', ['phase'], buckets=(.1, 1),
+    )
+
+    try:
+        histogram.observe(.05, phase='work')
+        histogram.observe(.5, phase='work')
+        histogram.observe(5, phase='work')
+
+        with histogram.time(phase='wakeup'):
+            pass
+
+        assert histogram.get_count(phase='work') == 3
+        assert histogram.get_count(phase='wakeup') == 1
+
+        text = expose()
+
+        assert 'test_seconds_bucket{phase="work",le="0.1"} 1' in text
+        assert 'test_seconds_bucket{phase="work",le="1"} 2' in text
+        assert 'test_seconds_bucket{phase="work",le="+Inf"} 3' in text
+        assert 'test_seconds_sum{phase="work"} 5.55' in text
+        assert 'test_seconds_count{phase="work"} 3' in text
+    finally:
+        REGISTRY.remove(histogram)
+
+
+def test_counting_channel():
+    channel = MagicMock()
+    counting = CountingChannel(channel)
+    before = RABBIT_OPERATIONS.get(operation='basic_publish')
+
+    counting.basic_publish(exchange='', routing_key='q', body='{}')
+    counting.basic_ack(delivery_tag=1)
+
+    channel.basic_publish.assert_called_once_with(
+        exchange='', routing_key='q', body='{}',
+    )
+    channel.basic_ack.assert_called_once_with(delivery_tag=1)
+    assert RABBIT_OPERATIONS.get(operation='basic_publish') == before + 1
+
+
+def test_server():
+    server = start_server(0)
+
+    try:
+        port = server.server_address[1]
+        text = urlopen('http://127.0.0.1:{}/metrics'.format(port)).read()
+
+        assert b'# TYPE cacahuate_command_seconds histogram' in text
+    finally:
+        server.shutdown()
+        server.server_close()
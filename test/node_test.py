@@ -49,9 +49,10 @@ def test_request_node(config, mocker):
     mock = MagicMock(return_value=ResponseMock())
 
     mocker.patch(
-        'requests.request',
+        'requests.Session.request',
         new=mock
     )
+    mocker.patch('cacahuate.node.time').monotonic.side_effect = [10, 10.25]
 
     xml = Xml.load(config, 'request.2018-05-18')
     xmliter = iter(xml)
@@ -64,10 +65,10 @@ def test_request_node(config, mocker):
         'request': {
             'data': '123456',
         },
-    })
+    }, node.get_timeout(config))
 
-    requests.request.assert_called_once()
-    args = requests.request.call_args
+    requests.Session.request.assert_called_once()
+    args = requests.Session.request.call_args
 
     method, url = args[0]
     data = args[1]['data']
@@ -80,12 +81,35 @@ def test_request_node(config, mocker):
         'x-url-data': '123456',
     }
     assert data == '{"data":"123456"}'
+    assert args[1]['timeout'] == (5, 2.5)
     assert response == {
         'status_code': 200,
         'response': 'request response',
+        'transient': False,
+        'elapsed': 0.25,
     }
 
 
+def test_request_node_zero_timeout(config):
+    xml = Xml.load(config, 'request.2018-05-18')
+    xmliter = iter(xml)
+
+    next(xmliter)
+    node = make_node(next(xmliter), xmliter)
+
+    assert node.get_timeout(config) == (
+        config['REQUEST_CONNECT_TIMEOUT'], 2.5,
+    )
+
+    # an explicit 0 is not the same as no value
+    node.connect_timeout = 0
+    node.read_timeout = 0
+    node.retry_delay = 0
+
+    assert node.get_timeout(config) == (0, 0)
+    assert node.get_retry_delay(config, 1) == 0
+
+
 def test_form_state_json():
     assert Form.state_json('ref', []) == {
         '_type': 'form',
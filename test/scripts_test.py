@@ -1,6 +1,9 @@
+import os
 import pytest
+import signal
 
-from cacahuate.main import _validate_file
+from cacahuate.indexes import copy_user_lists, create_indexes
+from cacahuate.main import _validate_file, migrate, supervise
 from cacahuate.errors import MalformedProcess
 
 
@@ -94,3 +97,84 @@ def test_xml_validation_undefined_form_by_scope():
     assert str(cm.value) == \
         'xml/condition_undefined_form_by_scope.2018-07-10.xml:44 variable ' \
         'used in if is not defined \'task.answer\''
+
+
+def test_supervise_restarts_consumers(config, tmpdir, mocker):
+    mocker.patch('time.sleep')
+    starts = tmpdir.join('starts')
+    starts.write('')
+
+    class ExitingLoop:
+
+        def __init__(self, config, shard):
+            self.shard = shard
+
+        def start(self):
+            with open(str(starts), 'a') as f:
+                f.write('{}\n'.format(self.shard))
+
+            if len(starts.read().split()) >= 3:
+                # one of the consumers was started again, stop the test
+                os.kill(os.getppid(), signal.SIGTERM)
+
+    handler = signal.getsignal(signal.SIGTERM)
+
+    supervise(config, [0, 1], ExitingLoop)
+
+    shards = starts.read().split()
+
+    assert sorted(set(shards)) == ['0', '1']
+    assert len(shards) >= 3
+
+    # the handlers of the supervisor are gone
+    assert signal.getsignal(signal.SIGTERM) is handler
+
+
+def test_create_indexes_closes_client(config, mocker):
+    client = mocker.patch('cacahuate.indexes.MongoClient')
+
+    create_indexes(config)
+
+    # consumers are forked after this
+    client.return_value.close.assert_called_once()
+
+
+def test_migrate_fills_old_executions(mocker):
+    copy_pointers = mocker.patch('cacahuate.main.copy_latest_pointers')
+    copy_lists = mocker.patch('cacahuate.main.copy_user_lists')
+    mocker.patch('cacahuate.main.create_indexes')
+
+    migrate()
+
+    copy_pointers.assert_called_once()
+    copy_lists.assert_called_once()
+
+
+def test_copy_user_lists_fills_pointers(config, mongo):
+    mongo[config["POINTER_COLLECTION"]].insert_many([{
+        'id': 'ptr_01',
+        'state': 'ongoing',
+        'notified_users': [{'identifier': 'juan'}, {'identifier': 'luis'}],
+    }, {
+        'id': 'ptr_02',
+        'state': 'finished',
+        'notified_users': [{'identifier': 'juan'}],
+    }, {
+        'id': 'ptr_03',
+        'state': 'ongoing',
+        'notified_users': [],
+        'candidate_list': ['pedro'],
+    }])
+
+    copy_user_lists(config)
+
+    lists = {
+        ptr['id']: ptr['candidate_list']
+        for ptr in mongo[config["POINTER_COLLECTION"]].find()
+    }
+
+    assert lists == {
+        'ptr_01': ['juan', 'luis'],
+        'ptr_02': [],
+        'ptr_03': ['pedro'],
+    }
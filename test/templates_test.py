@@ -0,0 +1,19 @@
+import os
+
+from cacahuate.templates import get_template, make_environment
+
+
+def test_templates_are_compiled_once():
+    template = get_template('Hello {{ form.name }}')
+
+    assert template.render(form={'name': 'world'}) == 'Hello world'
+    assert get_template('Hello {{ form.name }}') is template
+
+
+def test_bytecode_cache(tmpdir):
+    env = make_environment(bytecode_cache_dir=str(tmpdir))
+
+    template = env.get_template('{{ a }} and {{ b }}')
+
+    assert template.render(a=1, b=2) == '1 and 2'
+    assert len(os.listdir(str(tmpdir))) == 1
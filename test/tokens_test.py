@@ -0,0 +1,71 @@
+from unittest.mock import patch
+
+from cacahuate.models import User
+from cacahuate.tokens import TokenCache, create_token, get_token_cache
+from cacahuate.tokens import get_user
+
+from .utils import make_user
+
+
+def test_cache_expires():
+    cache = TokenCache(ttl=10)
+
+    with patch('cacahuate.tokens.time.monotonic', return_value=100):
+        cache.add('juan', 'abc', 'user')
+
+        assert cache.get('juan', 'abc') == 'user'
+
+    with patch('cacahuate.tokens.time.monotonic', return_value=110):
+        assert cache.get('juan', 'abc') is None
+
+    assert len(cache.entries) == 0
+
+
+def test_cache_is_bounded():
+    cache = TokenCache(size=2)
+
+    cache.add('juan', 'a', 'juan')
+    cache.add('pedro', 'b', 'pedro')
+    cache.get('juan', 'a')
+    cache.add('luis', 'c', 'luis')
+
+    assert cache.get('juan', 'a') == 'juan'
+    assert cache.get('pedro', 'b') is None
+    assert cache.get('luis', 'c') == 'luis'
+
+
+def test_cache_disabled():
+    cache = TokenCache(ttl=0)
+
+    cache.add('juan', 'a', 'juan')
+
+    assert cache.get('juan', 'a') is None
+
+
+def test_get_user_is_cached():
+    get_token_cache().clear()
+    juan = make_user('juan', 'Juan')
+    token = juan.proxy.tokens.get()[0].token
+
+    assert get_user('juan', token) == juan
+    assert get_user('juan', 'wrong') is None
+    assert get_user('pedro', token) is None
+
+    with patch.object(User, 'get_by') as get_by:
+        assert get_user('juan', token) == juan
+
+    get_by.assert_not_called()
+
+
+def test_create_token():
+    get_token_cache().clear()
+    juan = make_user('juan', 'Juan')
+    old_token = juan.proxy.tokens.get()[0].token
+
+    assert get_user('juan', old_token) == juan
+
+    token = create_token(juan, 'new_token')
+
+    assert len(get_token_cache().entries) == 0
+    assert get_user('juan', token.token) == juan
+    assert get_user('juan', old_token) == juan
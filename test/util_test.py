@@ -1,4 +1,5 @@
-from cacahuate.utils import clear_username
+from cacahuate.utils import apply_updates, clear_username, get_queue
+from cacahuate.utils import get_queues, stamp_message
 
 
 def test_clear_email():
@@ -7,3 +8,72 @@ def test_clear_email():
     assert clear_username('foo@var.com.mx') == 'foo'
     assert clear_username('foo.var@var.com.mx') == 'foovar'
     assert clear_username('$foo') == 'foo'
+
+
+def test_apply_updates():
+    doc = {
+        'state': {
+            'items': {
+                'node': {
+                    'state': 'valid',
+                    'actors': {
+                        'items': {
+                            'juan': {
+                                'forms': [
+                                    {'state': 'valid'},
+                                ],
+                            },
+                        },
+                    },
+                },
+            },
+        },
+    }
+
+    apply_updates(doc, {
+        'state.items.node.state': 'invalid',
+        'state.items.node.actors.items.juan.forms.0.state': 'invalid',
+        'values.form.input': 'new',
+    })
+
+    assert doc['state']['items']['node']['state'] == 'invalid'
+    assert doc['state']['items']['node']['actors']['items']['juan'][
+        'forms'
+    ][0]['state'] == 'invalid'
+    assert doc['values'] == {
+        'form': {
+            'input': 'new',
+        },
+    }
+
+
+def test_get_queue(config):
+    assert get_queues(config) == ['cacahuate_process']
+    assert get_queue(config, 'foo') == 'cacahuate_process'
+
+    config['RABBIT_QUEUE_SHARDS'] = 4
+
+    queues = get_queues(config)
+
+    assert queues == [
+        'cacahuate_process.0',
+        'cacahuate_process.1',
+        'cacahuate_process.2',
+        'cacahuate_process.3',
+    ]
+
+    # an execution always goes to the same queue
+    assert get_queue(config, 'foo') == get_queue(config, 'foo')
+    assert get_queue(config, 'foo') in queues
+    assert len(set(
+        get_queue(config, 'execution{}'.format(i)) for i in range(100)
+    )) == 4
+
+
+def test_stamp_message():
+    message = stamp_message({'command': 'step'})
+
+    assert isinstance(message['enqueued_at'], float)
+    assert len(message['trace_id']) == 32
+    assert stamp_message({}, message['trace_id'])['trace_id'] == \
+        message['trace_id']
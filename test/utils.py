@@ -3,6 +3,7 @@ from cacahuate.models import Execution, Pointer, User, Token
 from random import choice
 from string import ascii_letters
 from datetime import datetime
+import json
 
 
 def random_string(length=6):
@@ -50,3 +51,13 @@ def make_date(year=2018, month=5, day=4, hour=0, minute=0, second=0):
 
 def assert_near_date(date, seconds=2):
     assert (date - datetime.now()).total_seconds() < seconds
+
+
+def unstamp(body):
+    ''' the queued message without its enqueue time and trace id '''
+    message = json.loads(body)
+
+    assert type(message.pop('enqueued_at')) == float
+    assert message.pop('trace_id')
+
+    return message
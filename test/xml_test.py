@@ -1,9 +1,12 @@
 import os
 import pytest
+import shutil
 
-from cacahuate.errors import ProcessNotFound
+from cacahuate.errors import ProcessNotFound, ElementNotFound
 from xml.dom.minidom import parse
-from cacahuate.xml import Xml, form_to_dict, get_element_by
+from cacahuate.node import make_node
+from cacahuate.xml import Xml, ProcessCatalog, form_to_dict, get_catalog
+from cacahuate.xml import get_element_by
 
 
 def test_load_not_found(config):
@@ -250,3 +253,124 @@ def test_get_element_by(config):
 
     assert input is not None
     assert input.getAttribute('name') == 'reason'
+
+
+def test_compiled_process_is_cached(config):
+    xml = Xml.load(config, 'simple')
+
+    assert Xml.load(config, 'simple').process is xml.process
+
+
+def test_compiled_process_reloads_changed_file(config, tmpdir):
+    shutil.copy(
+        os.path.join(config['XML_PATH'], 'simple.2018-02-19.xml'),
+        str(tmpdir),
+    )
+    config['XML_PATH'] = str(tmpdir)
+
+    xml = Xml.load(config, 'simple')
+    path = xml.get_file_path()
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    assert Xml.load(config, 'simple').process is not xml.process
+
+
+def test_make_node_returns_copies(config):
+    xmliter = iter(Xml.load(config, 'simple'))
+    element = next(xmliter)
+
+    node = make_node(element, xmliter)
+    node.name = 'changed'
+
+    assert make_node(element, xmliter).name != 'changed'
+
+
+def test_successor_tables(config):
+    process = Xml.load(config, 'anidated-conditions').process
+
+    def successor_id(table, node_id):
+        element = table[node_id]
+
+        return element.getAttribute('id') if element is not None else None
+
+    assert successor_id(process.successors, 'a') == 'outer'
+    assert successor_id(process.successors, 'outer') == 'b'
+    assert successor_id(process.skip_successors, 'outer') == 'g'
+    assert successor_id(process.skip_successors, 'inner2') == 'e'
+    assert successor_id(process.successors, 'd') == 'e'
+    assert successor_id(process.successors, 'e') == 'f'
+    assert successor_id(process.successors, 'g') is None
+
+
+def test_successor_tables_skip_elifelse(config):
+    process = Xml.load(config, 'else').process
+
+    assert process.successors['action01'] is None
+    assert process.successors['action02'] is None
+    assert process.skip_successors['condition01'].getAttribute('id') == \
+        'elif01'
+    assert process.successors['else01'].getAttribute('id') == 'action03'
+
+
+def test_get_dependents(config):
+    process = Xml.load(config, 'validation-reloaded').process
+
+    def ids(field):
+        return [
+            process.elements[position].element.getAttribute('id')
+            for position in process.get_dependents(field)
+        ]
+
+    assert ids('form1.task') == ['node2', 'node4']
+    assert ids('form2.task') == []
+
+
+def test_get_node_by_id(config):
+    xml = Xml.load(config, 'exit_request')
+
+    element = xml.get_element('requester')
+
+    assert element.tagName == 'action'
+    assert element.getAttribute('id') == 'requester'
+
+    node = xml.get_node('requester')
+    form = node.forms_by_ref['exit_form']
+
+    assert form.inputs_by_name['reason'].name == 'reason'
+
+    with pytest.raises(ElementNotFound):
+        xml.get_node('nonexistent')
+
+
+def test_catalog_picks_up_new_versions(config, tmpdir):
+    shutil.copy(
+        os.path.join(config['XML_PATH'], 'simple.2018-02-19.xml'),
+        str(tmpdir),
+    )
+    config['XML_PATH'] = str(tmpdir)
+
+    assert Xml.load(config, 'simple').filename == 'simple.2018-02-19.xml'
+    assert get_catalog(config).get_process_list()[0]['versions'] == [
+        '2018-02-19',
+    ]
+
+    shutil.copy(
+        os.path.join(str(tmpdir), 'simple.2018-02-19.xml'),
+        os.path.join(str(tmpdir), 'simple.2018-03-01.xml'),
+    )
+
+    assert Xml.load(config, 'simple').filename == 'simple.2018-03-01.xml'
+    assert get_catalog(config).get_process_list()[0]['versions'] == [
+        '2018-03-01',
+        '2018-02-19',
+    ]
+
+
+def test_catalog_skips_removed_files(config):
+    catalog = ProcessCatalog(config)
+
+    with pytest.raises(ProcessNotFound):
+        Xml(config, 'removed.2018-02-19.xml')
+
+    assert catalog.make_entry('removed.2018-02-19.xml') is None